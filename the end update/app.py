@@ -1,12 +1,20 @@
-from flask import Flask, render_template, request, redirect, session, url_for, jsonify
-import pandas as pd
+from flask import Flask, render_template, request, redirect, session, url_for, jsonify, g, Response
 from pathlib import Path
-from supabase import create_client
 from dotenv import load_dotenv
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import ast
+import logging
 import os
+import random
+import time
+
+from data_snapshot import SOURCE_FILES, SNAPSHOT_DIR
+from reference_data import ReferenceDataManager
+from write_queue import VERSION_COLUMN, SupabaseWriteQueue
+from result_cache import RecommendationCache, profile_key
+from retrieval import RETRIEVAL_MODES
+from universities import SCHOOL_LEVELS
+from weight_tuning import DEFAULT_PROFILE, ComponentScores, WeightProfiles, merge_weights
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, process_rss_bytes, span
+from supabase_pool import SUPABASE_BUSY_ERRORS, create_pooled_client
 
 # === Flask app initialization ===
 BASE_DIR = Path(__file__).parent
@@ -20,33 +28,115 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY", "devsecret")
 app.secret_key = SECRET_KEY
-
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+REFERENCE_DATA_POLL_SECONDS = float(os.getenv("REFERENCE_DATA_POLL_SECONDS", "5"))
+
+# === Logging ===
+# Payload và chi tiết top-10 ghi ở mức DEBUG; chi tiết top-10 chỉ ghi cho một phần
+# request (TOP10_LOG_SAMPLE_RATE) để không làm chậm đường chấm điểm.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("universitychoose")
+TOP10_LOG_SAMPLE_RATE = float(os.getenv("TOP10_LOG_SAMPLE_RATE", "0.01"))
+
+# Một client/pool kết nối cho cả process, dùng chung giữa các thread (xem supabase_pool.py)
 supabase = None
 if SUPABASE_URL and SUPABASE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase = create_pooled_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Ghi UserProfile / Top10Major ở nền (xem write_queue.py); spool giữ các dòng chưa ghi
+WRITE_QUEUE_SPOOL_DIR = os.getenv("WRITE_QUEUE_SPOOL_DIR", str(BASE_DIR / "data/spool"))
+# Cột thứ tự ghi giữa các worker (cần chạy write_queue.ORDERING_MIGRATION_SQL); để trống để tắt
+WRITE_QUEUE_VERSION_COLUMN = os.getenv("WRITE_QUEUE_VERSION_COLUMN", VERSION_COLUMN) or None
+write_queue = None
+if supabase:
+    # Timeout / mất kết nối chỉ backoff; lỗi khác lặp lại -> thử từng dòng rồi dead-letter
+    write_queue = SupabaseWriteQueue(supabase, WRITE_QUEUE_SPOOL_DIR, transient_errors=SUPABASE_BUSY_ERRORS,
+                                     version_column=WRITE_QUEUE_VERSION_COLUMN)
+    write_queue.start()
+
+# === Reference data ===
+# Các file Excel (SOURCE_FILES) được biên dịch một lần thành snapshot nhị phân
+# (xem data_snapshot.py); worker chỉ memory-map snapshot nên khởi động tức thì.
+# ReferenceDataManager nạp lại snapshot ở nền khi file nguồn đổi; mỗi request lấy
+# `reference_data.current()` một lần (engine, chỉ mục ngành, lựa chọn /home).
+reference_data = ReferenceDataManager(SOURCE_FILES, SNAPSHOT_DIR, poll_seconds=REFERENCE_DATA_POLL_SECONDS)
+reference_data.start()
+logger.info("Dữ liệu tham chiếu %s: RSS %s MB trước khi nạp, %s MB sau",
+            reference_data.current().version,
+            reference_data.rebuilds[-1].get("rss_mb_before"), reference_data.rebuilds[-1].get("rss_mb_after"))
+
+# Truy hồi top-k (xem retrieval.py): "exact" chấm cả bảng ngành, "approximate" cắt tỉa
+# MaxScore rồi chỉ chấm các ngành còn có thể lọt top-k. Hệ số ngưỡng 1 cho đúng top-k
+# như "exact"; > 1 chấm ít ngành hơn nhưng có thể bỏ sót (đo bằng /admin/retrieval/evaluate)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "exact")
+RETRIEVAL_THRESHOLD_FACTOR = float(os.getenv("RETRIEVAL_THRESHOLD_FACTOR", "1.0"))
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    raise ValueError(f"RETRIEVAL_MODE phải là một trong {RETRIEVAL_MODES}")
+
+# Cache top-10 theo hồ sơ đã chuẩn hoá; tự xoá khi dữ liệu tham chiếu đổi phiên bản
+def current_reference_version():
+    return reference_data.current().version
+
+recommendation_cache = RecommendationCache(
+    maxsize=int(os.getenv("RESULT_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+    current_version=current_reference_version,
+)
 
-# === File paths ===
-file_path_backend = str(BASE_DIR / "data/Sorted_Ngành_Nghề.xlsx")  # Backend data Excel file
-file_path_frontend = str(BASE_DIR / "data/Book1.xlsx")             # Frontend data Excel file
-file_path_family = str(BASE_DIR / "data/FamilyFactor.xlsx")
-file_path_forecasting = str(BASE_DIR / "data/generate/bang_xep_hang_nganh_nghe_AAGR_2025_2028.xlsx")
+# Chấm lại theo bộ trọng số khác (xem weight_tuning.py): ma trận thành phần điểm của
+# mỗi hồ sơ được cache, profile trọng số đặt tên đọc từ WEIGHT_PROFILES_PATH
+weight_profiles = WeightProfiles(os.getenv("WEIGHT_PROFILES_PATH", str(BASE_DIR / "data/weight_profiles.json")))
+component_cache = RecommendationCache(
+    maxsize=int(os.getenv("WHAT_IF_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+    current_version=current_reference_version,
+)
 
-# === Load datasets ===
-data_backend = pd.read_excel(file_path_backend)
-data_frontend = pd.read_excel(file_path_frontend)
-family_data = pd.read_excel(file_path_family)
-forecasting_data = pd.read_excel(file_path_forecasting)
+# === Metrics ===
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or "unknown",
+            method=request.method,
+            status=str(response.status_code),
+        )
+    return response
+
+def collect_runtime_metrics():
+    """Gauge/counter đọc lúc scrape: write_queue, cache kết quả, dữ liệu tham chiếu."""
+    samples = []
+    if write_queue:
+        queue = write_queue.metrics()
+        samples += [
+            ("universitychoose_write_queue_depth", "gauge", "Số dòng đang chờ ghi Supabase.", queue["depth"], None),
+            ("universitychoose_write_queue_lag_seconds", "gauge", "Tuổi dòng chờ lâu nhất.", queue["lag_seconds"], None),
+            ("universitychoose_write_queue_written_total", "counter", "Số dòng đã ghi.", queue["written"], None),
+            ("universitychoose_write_queue_failures_total", "counter", "Số lần ghi lỗi.", queue["failures"], None),
+            ("universitychoose_write_queue_dead_lettered_total", "counter", "Số dòng chuyển sang dead-letter.",
+             queue["dead_lettered"], None),
+        ]
+    cache = recommendation_cache.stats()
+    samples += [
+        ("universitychoose_result_cache_hits_total", "counter", "Số lần trúng cache top-10.", cache["hits"], None),
+        ("universitychoose_result_cache_misses_total", "counter", "Số lần trượt cache top-10.", cache["misses"], None),
+        ("universitychoose_result_cache_size", "gauge", "Số hồ sơ trong cache top-10.", cache["size"], None),
+        ("universitychoose_process_resident_memory_bytes", "gauge", "RSS của worker.", process_rss_bytes(), None),
+        ("universitychoose_reference_data_info", "gauge", "Phiên bản dữ liệu tham chiếu đang dùng.", 1,
+         {"version": reference_data.current().version}),
+    ]
+    return samples
+
+REGISTRY.register_collector(collect_runtime_metrics)
 
 # === Helpers ===
-def clean_brackets(column):
-    cleaned_data = []
-    for entry in column:
-        try:
-            cleaned_data.append(" ".join(ast.literal_eval(entry)))
-        except (ValueError, SyntaxError):
-            cleaned_data.append(str(entry).replace("[", "").replace("]", ""))
-    return cleaned_data
-
 def clean_commas(input_data):
     """Tách chuỗi dựa trên dấu phẩy và làm sạch khoảng trắng."""
     if not isinstance(input_data, str):
@@ -70,51 +160,119 @@ def yn_to_bool(v):
         return False
     return False
 
-# === Ensure required columns exist on backend data ===
-for col in ['Khả năng và Điểm mạnh', 'Sở thích và Đam mê', 'MBTI', 'Tổ hợp môn']:
-    if col not in data_backend.columns:
-        print(f"Warning: Column '{col}' is missing in the backend data. Adding empty placeholder.")
-        data_backend[col] = ""
-
-# === Clean specific columns for TF-IDF ===
-data_backend['MAIN STRENGTHS'] = clean_brackets(data_backend['MAIN STRENGTHS'])
-data_backend['Khả năng và Điểm mạnh'] = clean_brackets(data_backend['Khả năng và Điểm mạnh'])
-data_backend['MAIN INTERESTEDS'] = clean_brackets(data_backend['MAIN INTERESTEDS'])
-data_backend['Sở thích và Đam mê'] = clean_brackets(data_backend['Sở thích và Đam mê'])
-
-# === Combine relevant columns for TF-IDF processing ===
-data_backend['Combined'] = (
-    data_backend['MBTI'].fillna("") + " " +
-    data_backend['Tổ hợp môn'].fillna("") + " " +
-    data_backend['MAIN STRENGTHS'].fillna("") + " " +
-    data_backend['Khả năng và Điểm mạnh'].fillna("") + " " +
-    data_backend['MAIN INTERESTEDS'].fillna("") + " " +
-    data_backend['Sở thích và Đam mê'].fillna("")
-)
+def parse_profile(data):
+    """Chuẩn hoá payload FE thành hồ sơ học sinh dùng cho ScoringEngine."""
+    financial_influence_raw = data.get('financial_influence')   # "yes"/"no" | "Có"/"Không"
+    family_has_industry_raw = data.get('family_has_industry')   # "yes"/"no" | "Có"/"Không"
 
-# === Vectorize the combined data using TF-IDF ===
-tfidf_vectorizer = TfidfVectorizer()
-tfidf_matrix = tfidf_vectorizer.fit_transform(data_backend['Combined'])
+    financial_influence_bool = yn_to_bool(financial_influence_raw)
+    family_has_industry_bool = yn_to_bool(family_has_industry_raw)
 
-# === Clean forecasting columns and build CAGR lookup ===
-forecasting_data.columns = forecasting_data.columns.str.strip()
-cagr_dict = forecasting_data.set_index('nganh_nghe')['AAGR (%)'].to_dict()
+    family_advice = (data.get('family_advice') or '').strip()
+    if not family_advice:
+        family_advice = "Có" if family_has_industry_bool else "Không"
 
-# === Console logger for Top 10 details ===
+    family_industry_select = (data.get('family_industry_select') or '').strip()
+    if not family_has_industry_bool:
+        family_industry_select = ""
+
+    return {
+        'mbti': (data.get('mbti') or '').strip().upper(),
+        'subjects': [s.strip().upper() for s in (data.get('subjects') or [])],
+        'mainstrengths': set(data.get('mainstrengths') or []),
+        'strengths': set(data.get('strengths') or []),
+        'maininterests': set(data.get('maininterests') or []),
+        'interests': set(data.get('interests') or []),
+        'financial_influence': financial_influence_bool,
+        'family_advice': family_advice,
+        'family_industry_select': family_industry_select,
+    }
+
+PROFILE_TEXT_FIELDS = ('mbti', 'family_advice', 'family_industry_select')
+PROFILE_LIST_FIELDS = ('subjects', 'mainstrengths', 'strengths', 'maininterests', 'interests')
+
+def profile_payload_error(data):
+    """Lỗi kiểu dữ liệu của một payload hồ sơ (để parse_profile không ném exception); None nếu hợp lệ."""
+    if not isinstance(data, dict):
+        return "hồ sơ phải là object"
+    for field in PROFILE_TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"'{field}' phải là chuỗi"
+    for field in PROFILE_LIST_FIELDS:
+        value = data.get(field)
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            return f"'{field}' phải là danh sách chuỗi"
+    chat_id = data.get('chat_id')
+    if chat_id is not None and (isinstance(chat_id, bool) or not isinstance(chat_id, (str, int))):
+        return "'chat_id' phải là chuỗi hoặc số nguyên"
+    return None
+
+def build_user_profile_fields(profile):
+    """Các cột UserProfile ghi lên Supabase từ hồ sơ đã chuẩn hoá."""
+    return {
+        "MBTI": profile['mbti'],
+        "SUBJECT": ", ".join(profile['subjects']),
+        "STRENGTHS": ", ".join(sorted(set(list(profile['mainstrengths']) + list(profile['strengths'])))),
+        "INTERESTEDS": ", ".join(sorted(set(list(profile['maininterests']) + list(profile['interests'])))),
+        "family_advice": profile['family_advice'],
+        "family_industry": profile['family_industry_select'],
+        "financial_influence": profile['financial_influence']  # bool trong DB
+    }
+
+def format_top_10(top_10_suggestions):
+    """Dạng FE cần hiển thị: [{"career", "score": "62.77%"}]."""
+    return [
+        {"career": career, "score": f"{details['final_score'] * 100:.2f}%"}
+        for career, details in top_10_suggestions
+    ]
+
+def with_universities(final_output, universities):
+    """Gắn trường đào tạo (tra dict theo ngành, O(1)) vào từng ngành của top-10."""
+    return [{**item, **universities.for_major(item["career"])} for item in final_output]
+
+def build_top10_payload(chat_id, final_output):
+    """Dòng Top10Major theo định dạng "Top_i" -> "Tên ngành: 62.77%"."""
+    # Nếu bảng Top10Major.chat_id là int8, ta thử cast
+    chat_id_numeric = None
+    try:
+        chat_id_numeric = int(chat_id)
+    except Exception:
+        pass  # Nếu không cast được, có thể bảng dùng varchar. Tuỳ schema của bạn.
+
+    top_payload = {"chat_id": chat_id_numeric if chat_id_numeric is not None else chat_id}
+    for i, item in enumerate(final_output[:10], start=1):
+        top_payload[f"Top_{i}"] = f"{item['career']}: {item['score']}"
+    return top_payload
+
+def recommend_profiles(profiles, k=10, snapshot=None):
+    """Top-k cho từng hồ sơ; hồ sơ đã gặp lấy từ cache, phần còn lại chấm điểm một lô."""
+    snapshot = snapshot or reference_data.current()
+    keys = [profile_key(p, k) for p in profiles]
+    results = [recommendation_cache.get(snapshot.version, key) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        scored = snapshot.retriever.recommend_batch(
+            [profiles[i] for i in missing], k=k, mode=RETRIEVAL_MODE, threshold_factor=RETRIEVAL_THRESHOLD_FACTOR
+        )
+        for i, top_k in zip(missing, scored):
+            recommendation_cache.put(snapshot.version, keys[i], top_k)
+            results[i] = top_k
+    return results
+
+# === Logger for Top 10 details (lấy mẫu) ===
 def log_top_10_career_details(top_10_suggestions):
-    print("\n🏆 TOP 10 NGÀNH NGHỀ ĐƯỢC ĐỀ XUẤT 🏆")
-    print("="*70)
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= TOP10_LOG_SAMPLE_RATE:
+        return
+    lines = ["TOP 10 NGÀNH NGHỀ ĐƯỢC ĐỀ XUẤT"]
     for idx, (career, details) in enumerate(top_10_suggestions, start=1):
-        print(f"#{idx} - 📚 Ngành: {career}")
-        print(f"🔹 MBTI Score: {details['mbti_score']:.2f}")
-        print(f"🔹 Subjects Score: {details['subjects_score']:.2f}")
-        print(f"🔹 Strengths Score: {details['strengths_score']:.2f}")
-        print(f"🔹 Interests Score: {details['interests_score']:.2f}")
-        print(f"🔹 PF Score (Tổng điểm cá nhân): {details['PF_score']:.2f}")
-        print(f"🔹 Family Score (Điểm gia đình): {details['family_score']:.2f}")
-        print(f"🔹 Social Factor Score (Điểm xã hội): {details['social_factor_score']:.2f}")
-        print(f"🏆 Final Score (Tổng điểm cuối cùng): {details['final_score']:.2f}")
-        print("="*70)
+        lines.append(
+            f"#{idx} {career}: MBTI {details['mbti_score']:.2f} | Subjects {details['subjects_score']:.2f}"
+            f" | Strengths {details['strengths_score']:.2f} | Interests {details['interests_score']:.2f}"
+            f" | PF {details['PF_score']:.2f} | Family {details['family_score']:.2f}"
+            f" | Social {details['social_factor_score']:.2f} | Final {details['final_score']:.2f}"
+        )
+    logger.debug("\n".join(lines))
 
 # ================== SAVE endpoint ==================
 @app.route('/save', methods=['POST'])
@@ -123,7 +281,7 @@ def save_route():
         return jsonify({"error": "Invalid content type"}), 415
 
     data = request.get_json() or {}
-    print("📥 Payload nhận được từ FE:", data)   # LOG PAYLOAD
+    logger.debug("Payload nhận được từ FE: %s", data)
 
     # Cho phép FE gửi save_only để chỉ lưu (không tính gợi ý)
     is_save_only = bool(
@@ -132,201 +290,209 @@ def save_route():
 
     # --- chat_id from session ---
     chat_id = session.get("username")
-    print("👤 chat_id từ session:", chat_id)     # LOG CHAT_ID
+    logger.debug("chat_id từ session: %s", chat_id)
     if not chat_id:
         return jsonify({"error": "Chưa đăng nhập (thiếu session username)."}), 401
 
     # --- Read selections ---
-    financial_influence_raw = data.get('financial_influence')   # "yes"/"no" | "Có"/"Không"
-    family_has_industry_raw = data.get('family_has_industry')   # "yes"/"no" | "Có"/"Không"
-
-    financial_influence_bool = yn_to_bool(financial_influence_raw)
-    family_has_industry_bool = yn_to_bool(family_has_industry_raw)
-
-    family_advice = (data.get('family_advice') or '').strip()
-    if not family_advice:
-        family_advice = "Có" if family_has_industry_bool else "Không"
-
-    family_industry_select = (data.get('family_industry_select') or '').strip()
-    if not family_has_industry_bool:
-        family_industry_select = ""
+    with span("parse"):
+        profile = parse_profile(data)
 
-    mbti = (data.get('mbti') or '').strip().upper()
-    subjects = [s.strip().upper() for s in (data.get('subjects') or [])]
-    mainstrengths = set(data.get('mainstrengths') or [])
-    strengths     = set(data.get('strengths') or [])
-    maininterests = set(data.get('maininterests') or [])
-    interests     = set(data.get('interests') or [])
-
-    # --- Update/Insert UserProfile ---
-    if supabase:
-        update_fields = {
-            "MBTI": mbti,
-            "SUBJECT": ", ".join(subjects),
-            "STRENGTHS": ", ".join(sorted(set(list(mainstrengths) + list(strengths)))),
-            "INTERESTEDS": ", ".join(sorted(set(list(maininterests) + list(interests)))),
-            "family_advice": family_advice,
-            "family_industry": family_industry_select,
-            "financial_influence": financial_influence_bool  # bool trong DB
-        }
+    # --- Update/Insert UserProfile (ghi nền qua write_queue) ---
+    if write_queue:
         try:
-            print("[DEBUG] save_route chat_id =", chat_id)
-            # 1) UPDATE theo chat_id
-            res_upd = supabase.table("UserProfile").update(update_fields).eq("chat_id", chat_id).execute()
-            updated_rows = getattr(res_upd, "data", []) or []
-            print("[DEBUG] UPDATE UserProfile rows:", updated_rows)
-
-            # 2) Nếu chưa có dòng nào -> UPSERT (insert theo chat_id)
-            if not updated_rows:
-                payload = {"chat_id": chat_id, **update_fields}
-                res = supabase.table("UserProfile").upsert(payload, on_conflict="chat_id").execute()
-                print("[DEBUG] UPSERT UserProfile:", getattr(res, "data", None))
-
+            with span("enqueue", table="UserProfile"):
+                write_queue.enqueue("UserProfile", {"chat_id": chat_id, **build_user_profile_fields(profile)})
             if is_save_only:
-                return jsonify({
-                    "ok": True,
-                    "message": "Đã lưu hồ sơ.",
-                    "updated": updated_rows
-                }), 200
-
-        except Exception as e:
-            import traceback
-            print("[ERROR] update/insert UserProfile:", e)
-            traceback.print_exc()
+                return jsonify({"ok": True, "message": "Đã lưu hồ sơ.", "queued": True}), 200
+        except Exception:
+            logger.exception("enqueue UserProfile")
             if is_save_only:
                 return jsonify({"ok": False, "error": "Không thể lưu hồ sơ."}), 500
     else:
-        print("[WARN] Supabase chưa cấu hình, bỏ qua update UserProfile.")
+        logger.warning("Supabase chưa cấu hình, bỏ qua update UserProfile.")
         if is_save_only:
             return jsonify({"ok": False, "error": "Supabase chưa cấu hình."}), 500
 
     # --- Scoring (khi không save_only) ---
-    mainstrengths_vector = tfidf_vectorizer.transform([" ".join(mainstrengths)]) if mainstrengths else None
-    strengths_vector     = tfidf_vectorizer.transform([" ".join(strengths)]) if strengths else None
-    maininterests_vector = tfidf_vectorizer.transform([" ".join(maininterests)]) if maininterests else None
-    interests_vector     = tfidf_vectorizer.transform([" ".join(interests)]) if interests else None
-
-    high_tuition_careers = family_data['Top học phí'].dropna().unique()
-
-    suggestions = []
-    for i in range(len(data_backend)):
-        row = data_backend.iloc[i]
-
-        backend_mbtis = {m.strip().upper() for m in str(row['MBTI']).split(',')}
-        mbti_score = 1.0 if mbti and mbti in backend_mbtis else 0.0
-
-        backend_subjects = {subject.strip().upper() for subject in str(row['Tổ hợp môn']).split(',')}
-        subjects_score = 1.0 if any(sub in backend_subjects for sub in subjects) else 0.0
-
-        main_strengths_score = cosine_similarity(
-            mainstrengths_vector, tfidf_vectorizer.transform([row['MAIN STRENGTHS']])
-        ).flatten()[0] if mainstrengths_vector is not None else 0.0
+    snapshot = reference_data.current()
+    top_10_suggestions = recommend_profiles([profile], k=10, snapshot=snapshot)[0]
+    log_top_10_career_details(top_10_suggestions)
 
-        remaining_strengths_score = cosine_similarity(
-            strengths_vector, tfidf_vectorizer.transform([row['Khả năng và Điểm mạnh']])
-        ).flatten()[0] if strengths_vector is not None else 0.0
+    # Dạng FE cần hiển thị
+    final_output = format_top_10(top_10_suggestions)
 
-        strengths_score = main_strengths_score * 0.35 + remaining_strengths_score * 0.65
+    # --- Ghi vào Top10Major theo định dạng "Tên ngành: 62.77%" ---
+    if write_queue:
+        try:
+            with span("enqueue", table="Top10Major"):
+                write_queue.enqueue("Top10Major", build_top10_payload(chat_id, final_output))
+        except Exception:
+            logger.exception("enqueue Top10Major")
+
+    return jsonify(with_universities(final_output, snapshot.universities)), 200
+
+
+# ================== BATCH RECOMMEND endpoint ==================
+# Giới hạn số hồ sơ mỗi request (một lần chấm điểm là ma trận hồ sơ × ngành)
+MAX_BATCH_PROFILES = int(os.getenv("MAX_BATCH_PROFILES", "500"))
+
+def recommend_batch(profiles_data, k=10):
+    """Chấm điểm nhiều hồ sơ (payload dạng FE, đã qua profile_payload_error) trong một lần
+    nhân ma trận hồ sơ × ngành.
+
+    Trả về list cùng thứ tự đầu vào: {"chat_id", "top_10" (dạng FE), "details" (điểm thành phần)}.
+    """
+    with span("parse"):
+        profiles = [parse_profile(p) for p in profiles_data]
+    results = []
+    for data, top_k in zip(profiles_data, recommend_profiles(profiles, k=k)):
+        results.append({
+            "chat_id": data.get("chat_id"),
+            "top_10": format_top_10(top_k),
+            "details": [{"career": career, **details} for career, details in top_k],
+        })
+    return profiles, results
+
+def save_batch_results(profiles, results):
+    """Đưa UserProfile và Top10Major của cả lớp vào write_queue (upsert theo lô ở nền)."""
+    saved = 0
+    for profile, result in zip(profiles, results):
+        chat_id = result["chat_id"]
+        if not chat_id:
+            continue
+        # chat_id trùng -> write_queue chỉ giữ hồ sơ cuối
+        write_queue.enqueue("UserProfile", {"chat_id": chat_id, **build_user_profile_fields(profile)})
+        write_queue.enqueue("Top10Major", build_top10_payload(chat_id, result["top_10"]))
+        saved += 1
+    return saved
+
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch_route():
+    if request.content_type != 'application/json':
+        return jsonify({"error": "Invalid content type"}), 415
+    if not session.get("username"):
+        return jsonify({"error": "Chưa đăng nhập (thiếu session username)."}), 401
 
-        main_interests_score = cosine_similarity(
-            maininterests_vector, tfidf_vectorizer.transform([row['MAIN INTERESTEDS']])
-        ).flatten()[0] if maininterests_vector is not None else 0.0
+    data = request.get_json()
+    profiles_data = data.get("profiles") if isinstance(data, dict) else None
+    if not isinstance(profiles_data, list):
+        return jsonify({"error": "Payload cần có 'profiles' là danh sách hồ sơ."}), 400
+    if len(profiles_data) > MAX_BATCH_PROFILES:
+        return jsonify({"error": f"Tối đa {MAX_BATCH_PROFILES} hồ sơ mỗi request."}), 400
+    invalid = [
+        {"index": i, "error": error}
+        for i, error in enumerate(map(profile_payload_error, profiles_data)) if error
+    ]
+    if invalid:
+        return jsonify({"error": "Hồ sơ không hợp lệ.", "invalid": invalid}), 400
+
+    # Ghi đè UserProfile/Top10Major của chat_id bất kỳ -> chỉ admin (X-Admin-Token), và phải yêu cầu rõ
+    save = data.get("save") is True
+    if save and not is_admin_request():
+        return jsonify({"error": "Chỉ admin được lưu kết quả batch (save=true)."}), 403
+
+    profiles, results = recommend_batch(profiles_data, k=10)
+
+    saved = 0
+    if write_queue and save:
+        try:
+            saved = save_batch_results(profiles, results)
+            logger.debug("Batch enqueue UserProfile/Top10Major: %d hồ sơ", saved)
+        except Exception:
+            logger.exception("batch enqueue")
 
-        remaining_interests_score = cosine_similarity(
-            interests_vector, tfidf_vectorizer.transform([row['Sở thích và Đam mê']])
-        ).flatten()[0] if interests_vector is not None else 0.0
+    return jsonify({"count": len(results), "saved": saved, "results": results}), 200
 
-        interests_score = main_interests_score * 0.35 + remaining_interests_score * 0.65
 
-        PF_score = (
-            mbti_score * 0.2391 +
-            subjects_score * 0.2457 +
-            strengths_score * 0.2609 +
-            interests_score * 0.2543
-        )
+# ================== WHAT-IF endpoint ==================
+WHAT_IF_MAX_K = 50
 
-        family_score = 0.5456
-        if financial_influence_bool and row['Ngành'] in high_tuition_careers:
-            family_score -= 0.2
-
-        if family_advice == 'Có' and row['Lĩnh vực'] == family_industry_select:
-            family_score += 0.4544
-        elif family_advice == 'Có, nhưng không nhiều' and row['Lĩnh vực'] == family_industry_select:
-            family_score += 0.303
-        elif family_advice == 'Không' and row['Lĩnh vực'] == family_industry_select:
-            family_score += 0.2
-
-        cagr = cagr_dict.get(row['Ngành'], 0)
-        social_factor_score = 1 + (cagr / 100) if cagr > 0 else 0
-
-        final_score = PF_score * 0.5702 + family_score * 0.2936 + social_factor_score * 0.1362
-
-        suggestions.append((row['Ngành'], {
-            'mbti_score': mbti_score,
-            'subjects_score': subjects_score,
-            'strengths_score': strengths_score,
-            'interests_score': interests_score,
-            'PF_score': PF_score,
-            'family_score': family_score,
-            'social_factor_score': social_factor_score,
-            'final_score': final_score
-        }))
-
-    top_10_suggestions = sorted(suggestions, key=lambda x: x[1]['final_score'], reverse=True)[:10]
-    log_top_10_career_details(top_10_suggestions)
-
-    # Dạng FE cần hiển thị
-    final_output = []
-    for career, details in top_10_suggestions:
-        final_output.append({
-            "career": career,
-            "score": f"{details['final_score'] * 100:.2f}%"
-        })
+@app.route('/recommend/weight-profiles', methods=['GET'])
+def weight_profiles_route():
+    if not session.get("username"):
+        return jsonify({"error": "Chưa đăng nhập (thiếu session username)."}), 401
+    try:
+        return jsonify({"profiles": weight_profiles.all()}), 200
+    except ValueError:
+        logger.exception("weight profiles")
+        return jsonify({"error": "File profile trọng số không hợp lệ."}), 500
+
+@app.route('/recommend/what-if', methods=['POST'])
+def what_if_route():
+    """Top-k của một hồ sơ (payload như /save) theo một hay nhiều bộ trọng số.
+
+    Body thêm: "weight_profiles": [tên, ...] (mặc định ["default"]), "weights": trọng số
+    ghi đè (thêm kết quả "custom" = profile đầu tiên + ghi đè), "k" (mặc định 10).
+    Không ghi Supabase.
+    """
+    if request.content_type != 'application/json':
+        return jsonify({"error": "Invalid content type"}), 415
+    if not session.get("username"):
+        return jsonify({"error": "Chưa đăng nhập (thiếu session username)."}), 401
 
-    # --- Ghi vào Top10Major theo định dạng "Tên ngành: 62.77%" ---
-    if supabase:
+    data = request.get_json()   # [] hay null cũng bị từ chối, không coi là hồ sơ rỗng
+    error = profile_payload_error(data)
+    if error:
+        return jsonify({"error": f"Hồ sơ không hợp lệ: {error}."}), 400
+    names = data.get("weight_profiles") or [DEFAULT_PROFILE]
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        return jsonify({"error": "'weight_profiles' phải là danh sách tên."}), 400
+    try:
+        k = int(data.get("k", 10))
+    except (TypeError, ValueError):
+        k = 0
+    if not 1 <= k <= WHAT_IF_MAX_K:
+        return jsonify({"error": f"k phải là số nguyên từ 1 tới {WHAT_IF_MAX_K}."}), 400
+
+    try:
+        profiles = weight_profiles.all()
+    except ValueError:
+        logger.exception("weight profiles")
+        return jsonify({"error": "File profile trọng số không hợp lệ."}), 500
+    unknown = [n for n in names if n not in profiles]
+    if unknown:
+        return jsonify({"error": f"Không có profile trọng số: {unknown}", "profiles": sorted(profiles)}), 400
+    selected = [(name, profiles[name]) for name in names]
+    if data.get("weights") is not None:
+        if not isinstance(data["weights"], dict):
+            return jsonify({"error": "'weights' phải là object."}), 400
         try:
-            # Nếu bảng Top10Major.chat_id là int8, ta thử cast
-            chat_id_numeric = None
-            try:
-                chat_id_numeric = int(chat_id)
-            except Exception:
-                pass  # Nếu không cast được, có thể bảng dùng varchar. Tuỳ schema của bạn.
-
-            # Xây payload "Top_i" -> "Career: 62.77%"
-            top_payload = {"chat_id": chat_id_numeric if chat_id_numeric is not None else chat_id}
-            for i, item in enumerate(final_output[:10], start=1):
-                top_payload[f"Top_{i}"] = f"{item['career']}: {item['score']}"
-
-            res_top = supabase.table("Top10Major").upsert(top_payload, on_conflict="chat_id").execute()
-            print("[DEBUG] UPSERT Top10Major:", getattr(res_top, "data", None))
-        except Exception as e:
-            import traceback
-            print("[ERROR] update Top10Major:", e)
-            traceback.print_exc()
-
-    return jsonify(final_output), 200
+            selected.append(("custom", merge_weights(data["weights"], base=selected[0][1])))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    with span("parse"):
+        profile = parse_profile(data)
+    snapshot = reference_data.current()
+    key = profile_key(profile, k=0)       # ma trận thành phần không phụ thuộc k
+    components = component_cache.get(snapshot.version, key)
+    cached = components is not None
+    if not cached:
+        components = ComponentScores.compute(snapshot.engine, profile)
+        component_cache.put(snapshot.version, key, components)
+
+    results = []
+    for name, weights in selected:
+        top_k = components.rescore(weights, k)
+        results.append({
+            "weight_profile": name,
+            "weights": weights,
+            "top_10": with_universities(format_top_10(top_k), snapshot.universities),
+            "details": [{"career": career, **details} for career, details in top_k],
+        })
+    return jsonify({"cached": cached, "results": results}), 200
 
 
 # ================== Routes ==================
 @app.route("/home")
 def home():
-    mbti_options = sorted(data_frontend['MBTI'].dropna().unique())
-    subject_combination_options = sorted(data_frontend['Tổ hợp môn'].dropna().unique())
-    strengths_options = sorted(data_frontend['Khả năng và Điểm mạnh'].dropna().unique())
-    interests_options = sorted(data_frontend['Sở thích và Đam mê'].dropna().unique())
-    field_options = sorted(data_frontend['Lĩnh vực'].dropna().unique())
-
     if "username" not in session:
         return redirect(url_for("login"))
     return render_template(
         "home.html",
         username=session["username"],
-        mbti_options=mbti_options,
-        subject_combination_options=subject_combination_options,
-        strengths_options=strengths_options,
-        interests_options=interests_options,
-        fields=field_options
+        **reference_data.current().options
     )
 
 @app.route("/", methods=["GET", "POST"])
@@ -339,9 +505,13 @@ def login():
             return render_template("login.html", message="❌ Supabase chưa cấu hình (check .env).")
 
         try:
-            res = supabase.table("Account").select("chat_id,password").eq("chat_id", username).execute()
+            with span("account_query"):
+                res = supabase.table("Account").select("chat_id,password").eq("chat_id", username).execute()
+        except SUPABASE_BUSY_ERRORS as e:
+            logger.warning("query Account quá tải/timeout: %s", e)
+            return render_template("login.html", message="Hệ thống đang bận, vui lòng thử lại sau giây lát."), 503
         except Exception as e:
-            print("[ERROR] query Account:", e)
+            logger.error("query Account: %s", e)
             res = None
 
         found = None
@@ -359,7 +529,101 @@ def login():
 
     return render_template("login.html")
 
+# ================== Universities ==================
+UNIVERSITIES_MAX_PER_PAGE = 100
+
+@app.route("/universities", methods=["GET"])
+def universities_route():
+    """Trường theo ngành: ?major=...(lặp được)&level=university|college&q=...&page=1&per_page=20"""
+    universities = reference_data.current().universities
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = int(request.args.get("per_page", 20))
+    except ValueError:
+        return jsonify({"error": "page và per_page phải là số nguyên."}), 400
+    if page < 1 or not 1 <= per_page <= UNIVERSITIES_MAX_PER_PAGE:
+        return jsonify({"error": f"page >= 1, 1 <= per_page <= {UNIVERSITIES_MAX_PER_PAGE}."}), 400
+
+    level = request.args.get("level") or None
+    if level and level not in SCHOOL_LEVELS:
+        return jsonify({"error": f"level phải là một trong {list(SCHOOL_LEVELS)}."}), 400
+
+    result = universities.query(
+        majors=[m.strip() for m in request.args.getlist("major") if m.strip()],
+        level=level,
+        q=(request.args.get("q") or "").strip() or None,
+        page=page,
+        per_page=per_page,
+    )
+    return jsonify(result), 200
+
+# ================== Metrics ==================
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    """Định dạng text của Prometheus; histogram phase + HTTP và số liệu nền."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+# ================== Admin ==================
+def is_admin_request():
+    return bool(ADMIN_TOKEN) and request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+
+@app.route("/admin/reference-data", methods=["GET"])
+def reference_data_status():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(reference_data.status()), 200
+
+@app.route("/admin/reference-data/reload", methods=["POST"])
+def reference_data_reload():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    changed = reference_data.reload("admin")
+    return jsonify({"changed": changed, **reference_data.status()}), 200
+
+@app.route("/admin/recommendation-cache", methods=["GET"])
+def recommendation_cache_status():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(recommendation_cache.stats()), 200
+
+@app.route("/admin/retrieval/evaluate", methods=["POST"])
+def retrieval_evaluate():
+    """Recall@k của chế độ approximate so với chấm cả bảng, trên các hồ sơ (payload FE) gửi lên."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    data = request.get_json(silent=True)
+    profiles_data = data.get("profiles") if isinstance(data, dict) else None
+    if not isinstance(profiles_data, list):
+        return jsonify({"error": "Payload cần có 'profiles' là danh sách hồ sơ."}), 400
+    invalid = [
+        {"index": i, "error": error}
+        for i, error in enumerate(map(profile_payload_error, profiles_data)) if error
+    ]
+    if invalid:
+        return jsonify({"error": "Hồ sơ không hợp lệ.", "invalid": invalid}), 400
+    try:
+        k = int(data.get("k", 10))
+        threshold_factor = float(data.get("threshold_factor", RETRIEVAL_THRESHOLD_FACTOR))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'k' và 'threshold_factor' phải là số."}), 400
+    if k < 1 or threshold_factor < 1:
+        return jsonify({"error": "'k' và 'threshold_factor' phải >= 1."}), 400
+    report = reference_data.current().retriever.evaluate(
+        [parse_profile(p) for p in profiles_data], k=k, threshold_factor=threshold_factor
+    )
+    return jsonify({"mode": RETRIEVAL_MODE, **report}), 200
+
+@app.route("/admin/write-queue", methods=["GET"])
+def write_queue_status():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    if not write_queue:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **write_queue.metrics()}), 200
+
 # === Entrypoint ===
+# Chỉ dùng khi phát triển; chạy production qua gunicorn (xem gunicorn.conf.py):
+#   gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
     print("Starting Flask app...")
-    app.run(debug=True)
+    app.run(debug=os.getenv("FLASK_DEBUG", "1") == "1")
@@ -0,0 +1,130 @@
+"""Ghi file đầu ra của forecasting.py, bỏ qua file có nội dung không đổi.
+
+Mỗi thư mục đầu ra có `.artifacts.json`: tên file -> (hash nội dung nguồn, hash
+byte của file đã ghi). Lần chạy sau:
+
+- bảng: hash nội dung DataFrame (giá trị + tên cột + kiểu) trùng và file trên
+  đĩa vẫn đúng byte đã ghi -> không ghi lại. Không so byte file .xlsx vì
+  openpyxl nhúng thời điểm tạo vào mỗi lần ghi;
+- biểu đồ: hash của khung dữ liệu đã pivot + tham số vẽ trùng -> không vẽ lại.
+
+File được ghi vào bộ nhớ rồi thay thế nguyên tử (tempfile + os.replace), như
+forecast_cache.py.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+MANIFEST_NAME = ".artifacts.json"
+TABLE_FORMATS = ("xlsx", "parquet", "json")
+
+
+def frame_hash(df, *extra):
+    """Hash ổn định của nội dung DataFrame (không phụ thuộc định dạng file)."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        [[str(c) for c in df.columns], [str(t) for t in df.dtypes], [str(e) for e in extra]],
+        ensure_ascii=False,
+    ).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _file_mode():
+    """Quyền như file tạo bằng open() (mkstemp mặc định 0600)."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _bytes_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return _bytes_hash(f.read())
+    except OSError:
+        return None
+
+
+def _table_bytes(df, fmt):
+    buffer = io.BytesIO()
+    if fmt == "xlsx":
+        df.to_excel(buffer, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(buffer, index=False)
+    elif fmt == "json":
+        buffer.write(df.to_json(orient="records", force_ascii=False, indent=1).encode("utf-8"))
+    else:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt} (chỉ nhận {', '.join(TABLE_FORMATS)})")
+    return buffer.getvalue()
+
+
+class ArtifactWriter:
+    """Ghi bảng / biểu đồ vào `out_dir`, đếm file đã ghi và đã bỏ qua."""
+
+    def __init__(self, out_dir):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.out_dir / MANIFEST_NAME
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.written = []
+        self.skipped = []
+
+    def _unchanged(self, path, content_hash):
+        entry = self.manifest.get(path.name)
+        return (
+            entry is not None and entry["content"] == content_hash
+            and _file_hash(path) == entry["file"]
+        )
+
+    def _write(self, path, data, content_hash):
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=path.suffix, dir=self.out_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, _file_mode())
+        os.replace(tmp, path)
+        self.manifest[path.name] = {"content": content_hash, "file": _bytes_hash(data)}
+        self.written.append(str(path))
+
+    def write_table(self, stem, df, formats=("xlsx",)):
+        """`<stem>.<fmt>` cho từng định dạng; trả về đường dẫn theo định dạng."""
+        content_hash = frame_hash(df)
+        paths = {}
+        for fmt in formats:
+            path = paths[fmt] = self.out_dir / f"{stem}.{fmt}"
+            if self._unchanged(path, content_hash):
+                self.skipped.append(str(path))
+                continue
+            self._write(path, _table_bytes(df, fmt), content_hash)
+        return paths
+
+    def write_chart(self, name, data, render, **params):
+        """Gọi `render(data, **params)` (trả về byte ảnh) chỉ khi `data` / `params` đổi."""
+        path = self.out_dir / name
+        content_hash = frame_hash(data, *sorted(params.items()))
+        if self._unchanged(path, content_hash):
+            self.skipped.append(str(path))
+            return path
+        self._write(path, render(data, **params), content_hash)
+        return path
+
+    def save(self):
+        """Ghi manifest (chỉ khi có file mới được ghi)."""
+        if not self.written:
+            return
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=self.out_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
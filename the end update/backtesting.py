@@ -0,0 +1,234 @@
+"""Backtest rolling-origin và chọn mô hình dự báo cho từng ngành.
+
+    python backtesting.py [--workers N] [--min-train 3] [--horizon 4] [--metric mae]
+
+Với mỗi ngành, mỗi mốc cắt t (min_train <= t < số năm), mô hình fit trên các năm
+trước t và dự báo tối đa `horizon` năm tiếp theo; sai số gộp trên mọi (mốc, năm)
+cho MAE / RMSE / MAPE. Lưới ngành × mô hình × mốc chạy song song trên `workers`
+process; thời gian fit + dự báo của từng ô được ghi cạnh sai số.
+
+Prophet được chấm đúng như forecast_industry của forecasting.py dùng: cùng
+PROPHET_PARAMS, giá trị "năm Y" là dự báo tại ngày 31/12/Y.
+
+Mỗi ngành ghi hai lựa chọn: `best_model` (sai số thấp nhất, mọi mô hình) và
+`selected_model` = mô hình fit nhanh nhất trong các mô hình có sai số không quá
+(1 + tolerance) × sai số tốt nhất. `selected_model` không bao giờ là mô hình phẳng
+(FLAT_MODELS, vd. naive): dự báo phẳng cho AAGR = 0 bất kể xu hướng, nên nó chỉ
+là mốc so sánh. Bảng lựa chọn (.json) dùng được cho
+`forecasting.py --model-selection`.
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ArtifactWriter
+from forecast_models import BASELINE_MODELS, FLAT_MODELS
+from forecasting import PROPHET_PARAMS, parse_formats
+from ingestion import DEFAULT_CHUNKSIZE, SeriesSpool
+
+METRICS = ("mae", "rmse", "mape")
+
+
+# === Mô hình ===
+def prophet_model(years, y, target_years):
+    """Prophet(PROPHET_PARAMS); năm Y lấy dự báo tại 31/12/Y như forecast_industry."""
+    from prophet import Prophet
+
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    model = Prophet(**PROPHET_PARAMS)
+    model.fit(pd.DataFrame({"ds": pd.to_datetime([str(year) for year in years], format="%Y"), "y": y}))
+    future = pd.DataFrame({"ds": pd.to_datetime([f"{year}-12-31" for year in target_years])})
+    return model.predict(future)["yhat"].to_numpy()
+
+
+MODELS = {"prophet": prophet_model, **BASELINE_MODELS}
+
+
+# === Backtest ===
+def rolling_origins(n_points, min_train, horizon):
+    """[(số điểm huấn luyện, chỉ số các điểm kiểm tra)] của mọi mốc cắt."""
+    return [
+        (t, np.arange(t, min(t + horizon, n_points)))
+        for t in range(max(min_train, 1), n_points)
+    ]
+
+
+def evaluate_fold(task):
+    """Fit một mô hình trên một mốc cắt; chạy được trong process con.
+
+    Trả về (các dòng điểm kiểm tra, lỗi | None) thay vì ném exception.
+    """
+    nganh, model_name, years, y, n_train, test = task
+    started = time.perf_counter()
+    try:
+        predicted = MODELS[model_name](years[:n_train], y[:n_train], years[test])
+    except Exception as e:
+        return [], f"{nganh} / {model_name} / {years[n_train]}: {e}"
+    fit_seconds = time.perf_counter() - started
+    return [
+        {
+            "nganh_nghe": nganh,
+            "model": model_name,
+            "origin": int(years[n_train]),
+            "horizon": int(years[i] - years[n_train - 1]),
+            "year": int(years[i]),
+            "actual": float(y[i]),
+            "predicted": float(p),
+            "fit_seconds": fit_seconds,
+        }
+        for i, p in zip(test, predicted)
+    ], None
+
+
+def build_tasks(series, models, min_train, horizon):
+    """Lưới ngành × mô hình × mốc cắt từ chuỗi (ngành, DataFrame ds/y); y thiếu bị bỏ."""
+    tasks, skipped = [], []
+    for nganh, nganh_data in series:
+        nganh_data = nganh_data.dropna(subset=["y"])
+        years = nganh_data["ds"].dt.year.to_numpy()
+        y = nganh_data["y"].to_numpy(dtype=float)
+        origins = rolling_origins(len(y), min_train, horizon)
+        if not origins:
+            skipped.append(nganh)
+            continue
+        tasks.extend((nganh, model, years, y, n_train, test) for model in models for n_train, test in origins)
+    return tasks, skipped
+
+
+def run_backtest(tasks, workers=1):
+    """(DataFrame điểm kiểm tra, danh sách lỗi) của mọi ô trong lưới."""
+    if workers <= 1 or len(tasks) <= 1:
+        return _collect(map(evaluate_fold, tasks))
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _collect(executor.map(evaluate_fold, tasks, chunksize=chunksize))
+
+
+def _collect(outcomes):
+    rows, errors = [], []
+    for fold_rows, error in outcomes:
+        rows.extend(fold_rows)
+        if error:
+            errors.append(error)
+    return pd.DataFrame(rows), errors
+
+
+def summarize(points):
+    """Sai số và thời gian fit trung bình mỗi mốc theo (ngành, mô hình)."""
+    err = points["predicted"] - points["actual"]
+    points = points.assign(
+        abs_error=err.abs(),
+        sq_error=err ** 2,
+        ape=(err.abs() / points["actual"].abs()).where(points["actual"] != 0) * 100,
+    )
+    grouped = points.groupby(["nganh_nghe", "model"], sort=False)
+    fits = points.drop_duplicates(["nganh_nghe", "model", "origin"]).groupby(["nganh_nghe", "model"], sort=False)
+    return pd.DataFrame({
+        "mae": grouped["abs_error"].mean(),
+        "rmse": np.sqrt(grouped["sq_error"].mean()),
+        "mape": grouped["ape"].mean(),
+        "n_points": grouped.size(),
+        "n_folds": fits.size(),
+        "fit_seconds": fits["fit_seconds"].mean(),
+    }).reset_index()
+
+
+def select_models(summary, metric="mae", tolerance=0.05):
+    """Mỗi ngành: mô hình tốt nhất theo `metric` và mô hình nhanh nhất trong ngưỡng `tolerance`.
+
+    Ngưỡng và lựa chọn chỉ xét các mô hình không phẳng; ngành chỉ có kết quả của
+    mô hình phẳng không có dòng nào (forecasting.py dùng Prophet cho ngành đó).
+    """
+    rows = []
+    for nganh, group in summary.groupby("nganh_nghe", sort=False):
+        group = group.dropna(subset=[metric])
+        candidates = group[~group["model"].isin(FLAT_MODELS)]
+        if candidates.empty:
+            continue
+        best = group.loc[group[metric].idxmin()]
+        best_candidate = candidates[metric].min()
+        eligible = candidates[candidates[metric] <= best_candidate * (1 + tolerance)]
+        selected = eligible.loc[eligible["fit_seconds"].idxmin()]
+        prophet = group[group["model"] == "prophet"]
+        rows.append({
+            "nganh_nghe": nganh,
+            "best_model": best["model"],
+            f"best_{metric}": best[metric],
+            "selected_model": selected["model"],
+            f"selected_{metric}": selected[metric],
+            "selected_fit_seconds": selected["fit_seconds"],
+            f"prophet_{metric}": prophet[metric].iloc[0] if len(prophet) else np.nan,
+            "prophet_fit_seconds": prophet["fit_seconds"].iloc[0] if len(prophet) else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+def parse_models(value):
+    models = tuple(m.strip() for m in value.split(",") if m.strip())
+    unknown = [m for m in models if m not in MODELS]
+    if unknown or not models:
+        raise argparse.ArgumentTypeError(f"mô hình phải thuộc {', '.join(MODELS)}, nhận {value!r}")
+    return models
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest rolling-origin và chọn mô hình dự báo theo ngành")
+    parser.add_argument("--input", default="./data/Rounded_Top_20_Industries_VN_2019_2024.xlsx",
+                        help="file số liệu tuyển dụng (.xlsx / .csv / .parquet, dạng rộng hoặc dài)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="số dòng đọc mỗi khối")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="số process chạy lưới ngành × mô hình × mốc (mặc định: số CPU)")
+    parser.add_argument("--models", type=parse_models, default=tuple(MODELS),
+                        help=f"các mô hình so sánh, phân tách bởi dấu phẩy (mặc định: {','.join(MODELS)})")
+    parser.add_argument("--min-train", type=int, default=3, help="số năm huấn luyện tối thiểu của mốc đầu tiên")
+    parser.add_argument("--horizon", type=int, default=4, help="số năm dự báo tối đa mỗi mốc (2025–2028 = 4)")
+    parser.add_argument("--metric", choices=METRICS, default="mae", help="sai số dùng để chọn mô hình")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="chấp nhận mô hình nhanh hơn nếu sai số <= (1 + tolerance) × tốt nhất")
+    parser.add_argument("--formats", type=parse_formats, default=("xlsx", "json"),
+                        help="định dạng bảng đầu ra: xlsx,parquet,json (mặc định: xlsx,json)")
+    parser.add_argument("--out-dir", default="./data/generate", help="thư mục ghi kết quả")
+    args = parser.parse_args(argv)
+
+    with SeriesSpool() as spool:
+        spool.ingest(args.input, chunksize=args.chunksize)
+        tasks, skipped = build_tasks(spool.series(), args.models, args.min_train, args.horizon)
+    if skipped:
+        print(f"⚠️ Không đủ dữ liệu để backtest: {', '.join(map(str, skipped))}")
+    print(f"Backtest {len(tasks)} ô (ngành × mô hình × mốc) trên {args.workers} process...")
+
+    started = time.perf_counter()
+    points, errors = run_backtest(tasks, workers=args.workers)
+    for error in errors:
+        print(f"Lỗi backtest {error}")
+    if points.empty:
+        raise ValueError("Không có kết quả backtest hợp lệ.")
+    print(f"Xong sau {time.perf_counter() - started:.1f}s")
+
+    summary = summarize(points)
+    selection = select_models(summary, args.metric, args.tolerance)
+
+    writer = ArtifactWriter(args.out_dir)
+    writer.write_table("backtest_diem_kiem_tra", points, args.formats)
+    writer.write_table("backtest_tong_hop", summary, args.formats)
+    selection_files = writer.write_table("backtest_chon_mo_hinh", selection, args.formats)
+    writer.save()
+
+    overall = summary.groupby("model", sort=False).agg(
+        mae=("mae", "mean"), mape=("mape", "mean"), fit_seconds=("fit_seconds", "mean"))
+    print("Trung bình theo mô hình (mọi ngành):")
+    print(overall.to_string(float_format=lambda v: f"{v:.4g}"))
+    print("Mô hình được chọn:", selection["selected_model"].value_counts().to_dict())
+    if selection["prophet_fit_seconds"].notna().any():
+        saved = (selection["prophet_fit_seconds"] - selection["selected_fit_seconds"]).sum()
+        print(f"Thời gian fit tiết kiệm mỗi lần dự báo (ước lượng): {saved:.2f}s")
+    print(f"Bảng chọn mô hình: {', '.join(map(str, selection_files.values()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Benchmark đường gợi ý ngành (app.py) và hậu xử lý dự báo (forecasting.py).
+
+Dữ liệu ngành / hồ sơ học sinh được sinh giả lập (benchmarks.synthetic) và
+Supabase được thay bằng stub trong process, nên chạy được offline:
+
+    python -m benchmarks --sizes 1000,10000,100000 --output bench.json
+"""
@@ -0,0 +1,259 @@
+"""Chạy benchmark và ghi kết quả JSON.
+
+    python -m benchmarks --sizes 1000,10000 --output bench.json
+    python -m benchmarks --compare bench_old.json bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Không kết nối Supabase thật, không chạy thread theo dõi file khi import app
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_KEY"] = ""
+os.environ.setdefault("REFERENCE_DATA_POLL_SECONDS", "0")
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from benchmarks import synthetic
+from benchmarks.supabase_stub import SupabaseStub
+
+DEFAULT_SIZES = "1000,10000"
+
+
+# === Đo ===
+def timed(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def peak_memory_mb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 2**20, 3)
+
+def summarize(scenario, size, samples, items_per_call=1, peak_mb=None):
+    ms = np.asarray(samples) * 1000
+    total = float(np.sum(samples))
+    return {
+        "scenario": scenario,
+        "size": size,
+        "calls": len(samples),
+        "items_per_call": items_per_call,
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "throughput_per_s": round(len(samples) * items_per_call / total, 2) if total else None,
+        "peak_mem_mb": peak_mb,
+    }
+
+def run_scenario(results, scenario, size, fn, repeat, items_per_call=1, warmup=1):
+    samples = timed(fn, repeat, warmup)
+    result = summarize(scenario, size, samples, items_per_call, peak_memory_mb(fn))
+    results.append(result)
+    print(f"  {scenario:<24} p50 {result['p50_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms  "
+          f"{result['throughput_per_s'] or 0:>12.1f}/s  peak {result['peak_mem_mb']} MB")
+
+
+# === Kịch bản ===
+def bench_size(size, args, workdir):
+    import data_snapshot
+    from data_snapshot import ReferenceSnapshot, clean_brackets, compile_frames, write_snapshot
+    from scoring import TEXT_COLUMNS
+
+    results = []
+    frames = synthetic.reference_frames(size, seed=args.seed)
+
+    # --- Khởi động: làm sạch cột, biên dịch snapshot, mở snapshot ---
+    def clean_columns():
+        for col in TEXT_COLUMNS.values():
+            clean_brackets(frames[0][col])
+
+    def compile_all():
+        return compile_frames(*(frame.copy() for frame in frames))
+
+    run_scenario(results, "startup/clean_brackets", size, clean_columns, args.startup_repeat)
+    run_scenario(results, "startup/compile", size, compile_all, args.startup_repeat)
+
+    arrays, manifest = compile_all()
+    manifest.update({"version": f"bench-{size}", "format_version": data_snapshot.FORMAT_VERSION})
+    snapshot_path = write_snapshot(arrays, manifest, workdir / "snapshot")
+    run_scenario(results, "startup/snapshot_load", size, lambda: ReferenceSnapshot(snapshot_path),
+                 args.startup_repeat * 3)
+    snapshot = ReferenceSnapshot(snapshot_path)
+
+    # --- Chấm điểm trực tiếp trên engine ---
+    import app
+    payloads = synthetic.student_payloads(args.requests, seed=args.seed, options=snapshot.options)
+    profiles = [app.parse_profile(p) for p in payloads]
+    engine = snapshot.engine
+
+    single = iter(range(10**9))
+    run_scenario(results, "scoring/single", size,
+                 lambda: engine.recommend(profiles[next(single) % len(profiles)]), args.requests)
+    batch = profiles[:args.batch_size]
+    run_scenario(results, "scoring/batch", size, lambda: engine.recommend_batch(batch),
+                 max(3, args.requests // args.batch_size), items_per_call=len(batch))
+
+    # --- Truy hồi top-k MaxScore (retrieval.py), kèm recall@10 so với chấm cả bảng ---
+    retriever = snapshot.retriever
+    run_scenario(results, "scoring/approximate", size,
+                 lambda: retriever.recommend_batch([profiles[next(single) % len(profiles)]], mode="approximate",
+                                                   threshold_factor=args.threshold_factor), args.requests)
+    results[-1].update(retriever.evaluate(profiles[:args.recall_profiles], threshold_factor=args.threshold_factor))
+    print(f"  {'':<24} recall@10 {results[-1]['recall_at_k']}  (min {results[-1]['min_recall_at_k']})  "
+          f"chấm {results[-1]['scored_careers_mean']}/{size} ngành")
+
+    # --- Toàn bộ request /save qua Flask, Supabase giả lập ---
+    from write_queue import SupabaseWriteQueue
+
+    stub = SupabaseStub(latency_ms=args.supabase_latency_ms)
+    app.supabase = stub
+    app.write_queue = SupabaseWriteQueue(stub, workdir / "spool")
+    app.write_queue.start()
+    app.reference_data.install(snapshot)
+    app.app.secret_key = app.app.secret_key or "benchmark"
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "1"
+
+    def post_save():
+        payload = payloads[next(single) % len(payloads)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.post("/save", json=payload)
+        assert response.status_code == 200, response.data
+
+    cache_size = app.recommendation_cache.maxsize
+    app.recommendation_cache.maxsize = 0
+    run_scenario(results, "request/save", size, post_save, args.requests)
+    app.recommendation_cache.maxsize = cache_size
+    app.recommendation_cache.clear()
+    run_scenario(results, "request/save_cached", size, post_save, args.requests, warmup=len(payloads))
+
+    def post_batch():
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.post("/recommend/batch", json={"profiles": payloads[:args.batch_size], "save": False})
+        assert response.status_code == 200, response.data
+
+    app.recommendation_cache.maxsize = 0
+    run_scenario(results, "request/batch", size, post_batch,
+                 max(3, args.requests // args.batch_size), items_per_call=min(args.batch_size, len(payloads)))
+    app.recommendation_cache.maxsize = cache_size
+    app.write_queue.stop()
+
+    # --- Hậu xử lý dự báo (forecasting.py) trên `size` ngành ---
+    import forecasting
+
+    forecast_df = synthetic.forecast_frame(size, seed=args.seed)
+    history = synthetic.history_frame(size, seed=args.seed)
+    last_values = history.groupby("nganh_nghe", sort=False)["y"].last()
+
+    def postprocess():
+        table = forecasting.build_forecast_table(forecast_df, last_values)
+        forecasting.build_annual_demand(table)
+        forecasting.build_aagr_ranking(table)
+
+    run_scenario(results, "forecast/postprocess", size, postprocess, args.startup_repeat)
+    return results
+
+
+# === So sánh hai lần chạy ===
+def compare(old_path, new_path, threshold):
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"{'scenario':<24} {'size':>8} {'p50 old':>10} {'p50 new':>10} {'p95 Δ':>8}")
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        before, after = old[key], new[key]
+        change = (after["p95_ms"] / before["p95_ms"] - 1) if before["p95_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  <-- chậm hơn"
+        print(f"{key[0]:<24} {key[1]:>8} {before['p50_ms']:>10.3f} {after['p50_ms']:>10.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="số dòng bảng ngành giả lập, cách nhau bởi dấu phẩy")
+    parser.add_argument("--requests", type=int, default=200, help="số request cho mỗi kịch bản chấm điểm")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--startup-repeat", type=int, default=3)
+    parser.add_argument("--supabase-latency-ms", type=float, default=0.0,
+                        help="độ trễ giả lập cho mỗi lệnh Supabase")
+    parser.add_argument("--threshold-factor", type=float, default=1.0,
+                        help="hệ số ngưỡng MaxScore của chế độ approximate (1 = cùng top-k với exact)")
+    parser.add_argument("--recall-profiles", type=int, default=100, help="số hồ sơ dùng đo recall@10")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="so sánh hai file kết quả thay vì chạy benchmark")
+    parser.add_argument("--threshold", type=float, default=0.2, help="ngưỡng p95 chậm hơn bị coi là hồi quy")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        print(f"{regressions} kịch bản chậm hơn ngưỡng {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    from pathlib import Path
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            print(f"== {size} ngành ==")
+            workdir = Path(tmp) / str(size)
+            workdir.mkdir()
+            results.extend(bench_size(size, args, workdir))
+
+    report = {"environment": environment(), "config": vars(args), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Supabase giả lập trong process để benchmark chạy offline.
+
+Chỉ hỗ trợ phần API app.py dùng: table().select/update/upsert/eq().execute().
+Upsert bỏ qua dòng có `saved_at` cũ hơn bản đang lưu, như trigger thứ tự ghi trên Supabase.
+"""
+import threading
+import time
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, stub, table):
+        self.stub = stub
+        self.table = table
+        self.op = None
+        self.payload = None
+        self.filters = []
+
+    def select(self, columns="*"):
+        self.op = "select"
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.op, self.payload = "upsert", payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def execute(self):
+        return self.stub._execute(self)
+
+
+class SupabaseStub:
+    """Lưu dữ liệu theo bảng (khoá chat_id), có thể giả lập độ trễ mạng."""
+
+    def __init__(self, latency_ms=0.0, accounts=None):
+        self.latency = latency_ms / 1000.0
+        self.tables = {"Account": {}, "UserProfile": {}, "Top10Major": {}}
+        self.calls = 0
+        self._lock = threading.Lock()
+        for chat_id, password in (accounts or {}).items():
+            self.tables["Account"][str(chat_id)] = {"chat_id": str(chat_id), "password": password}
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def _execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            rows = self.tables.setdefault(query.table, {})
+            if query.op == "upsert":
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                for row in payload:
+                    stored = rows.setdefault(str(row["chat_id"]), {})
+                    # Như trigger keep_newest_saved_at (write_queue.ORDERING_MIGRATION_SQL)
+                    if row.get("saved_at") is not None and stored.get("saved_at") is not None \
+                            and row["saved_at"] < stored["saved_at"]:
+                        continue
+                    stored.update(row)
+                return _Response(payload)
+
+            matched = [
+                row for row in rows.values()
+                if all(str(row.get(col)) == str(val) for col, val in query.filters)
+            ]
+            if query.op == "update":
+                for row in matched:
+                    row.update(query.payload)
+            return _Response([dict(row) for row in matched])
@@ -0,0 +1,133 @@
+"""Sinh bảng ngành, hồ sơ học sinh và dự báo giả lập cùng định dạng dữ liệu thật."""
+import numpy as np
+import pandas as pd
+
+from career_index import MBTI_CODES
+
+SUBJECT_CODES = [f"{block}{i:02d}" for block in "ABCD" for i in range(20)]
+FIELDS = [
+    "Healthcare", "Economics", "Law", "Information Technology", "Engineering",
+    "Education", "Arts", "Agriculture", "Tourism", "Media",
+]
+STRENGTHS = [
+    "Logical thinking, sharpness, and good analytical skills", "Creativity and innovation skills",
+    "Communication, presentation, and negotiation skills", "Good memory", "Patience and perseverance",
+    "Dynamism and responsibility", "Good problem-solving skills", "Leadership and teamwork skills",
+    "Good listening and observation skills", "Ability to work under high pressure",
+    "Always careful and meticulous", "Foreign language skills", "Health care skills",
+    "Technical and mechanical skills", "Artistic and aesthetic sense", "Numerical and financial skills",
+]
+INTERESTS = [
+    "Communication, presentation, working with people", "Document drafting", "Research, data analysis",
+    "Medicine and human health", "Technology and computers", "Design and drawing", "Travel and culture",
+    "Business and trading", "Nature and environment", "Law and justice", "Teaching and training",
+    "Music and performance", "Building and machinery", "Cooking and food",
+]
+
+
+def _pick(rng, items, low, high):
+    return list(rng.choice(items, size=rng.integers(low, high + 1), replace=False))
+
+
+def _bracketed(values):
+    """Định dạng như file Excel thật: "[a], [b]"."""
+    return ", ".join(f"[{v}]" for v in values)
+
+
+def career_table(n_rows, seed=0):
+    """Bảng ngành n_rows dòng với đủ cột của Sorted_Ngành_Nghề.xlsx."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_rows):
+        rows.append({
+            "STT": i + 1,
+            "Ngành": f"Career {i:06d}",
+            "MBTI": ", ".join(_pick(rng, MBTI_CODES, 2, 8)),
+            "Tổ hợp môn": ", ".join(_pick(rng, SUBJECT_CODES, 2, 6)),
+            "MAIN STRENGTHS": _bracketed(_pick(rng, STRENGTHS, 1, 2)),
+            "Khả năng và Điểm mạnh": _bracketed(_pick(rng, STRENGTHS, 3, 8)),
+            "MAIN INTERESTEDS": _bracketed(_pick(rng, INTERESTS, 1, 2)),
+            "Sở thích và Đam mê": _bracketed(_pick(rng, INTERESTS, 2, 5)),
+            "Lĩnh vực": FIELDS[i % len(FIELDS)],
+        })
+    return pd.DataFrame(rows)
+
+
+def reference_frames(n_rows, seed=0):
+    """(data_backend, data_frontend, family_data, forecasting_data) cho compile_frames."""
+    rng = np.random.default_rng(seed)
+    data_backend = career_table(n_rows, seed)
+    careers = data_backend["Ngành"]
+
+    n_options = max(len(STRENGTHS), len(INTERESTS), len(MBTI_CODES), len(FIELDS))
+    data_frontend = pd.DataFrame({
+        "Khả năng và Điểm mạnh": pd.Series(STRENGTHS),
+        "Sở thích và Đam mê": pd.Series(INTERESTS),
+        "Tổ hợp môn": pd.Series(SUBJECT_CODES[:n_options]),
+        "MBTI": pd.Series(MBTI_CODES),
+        "Lĩnh vực": pd.Series(FIELDS),
+    })
+    family_data = pd.DataFrame({
+        "Top nghề nghiệp": careers.sample(min(20, n_rows), random_state=seed).to_numpy(),
+        "Top học phí": careers.sample(min(20, n_rows), random_state=seed + 1).to_numpy(),
+    })
+    n_forecast = max(1, n_rows // 5)
+    forecasting_data = pd.DataFrame({
+        "nganh_nghe": careers.iloc[:n_forecast].to_numpy(),
+        "2025": rng.integers(1_000, 90_000, n_forecast),
+        "2028": rng.integers(1_000, 90_000, n_forecast),
+        "AAGR (%)": np.round(rng.normal(5, 8, n_forecast), 2),
+    })
+    return data_backend, data_frontend, family_data, forecasting_data
+
+
+def student_payloads(n, seed=0, options=None):
+    """n payload /save giống FE gửi lên."""
+    rng = np.random.default_rng(seed)
+    options = options or {}
+    mbtis = options.get("mbti_options", list(MBTI_CODES))
+    subjects = options.get("subject_combination_options", SUBJECT_CODES)
+    strengths = options.get("strengths_options", STRENGTHS)
+    interests = options.get("interests_options", INTERESTS)
+    fields = options.get("fields", FIELDS)
+
+    payloads = []
+    for _ in range(n):
+        has_industry = bool(rng.integers(0, 2))
+        payloads.append({
+            "mbti": str(rng.choice(mbtis)),
+            "subjects": [str(s) for s in _pick(rng, subjects, 1, 3)],
+            "mainstrengths": [str(s) for s in _pick(rng, strengths, 0, 2)],
+            "strengths": [str(s) for s in _pick(rng, strengths, 1, 5)],
+            "maininterests": [str(s) for s in _pick(rng, interests, 0, 2)],
+            "interests": [str(s) for s in _pick(rng, interests, 1, 5)],
+            "financial_influence": str(rng.choice(["yes", "no"])),
+            "family_has_industry": "yes" if has_industry else "no",
+            "family_advice": str(rng.choice(["", "Có", "Có, nhưng không nhiều", "Không"])),
+            "family_industry_select": str(rng.choice(fields)) if has_industry else "",
+        })
+    return payloads
+
+
+def forecast_frame(n_industries, seed=0):
+    """forecast_df (ds, yhat, nganh_nghe) như đầu ra Prophet 2025–2028 của forecasting.py."""
+    rng = np.random.default_rng(seed)
+    years = [2025, 2026, 2027, 2028]
+    names = np.repeat([f"Industry {i:06d}" for i in range(n_industries)], len(years))
+    return pd.DataFrame({
+        "ds": pd.to_datetime([f"{y}-12-31" for y in years] * n_industries),
+        "yhat": rng.uniform(1_000, 90_000, n_industries * len(years)),
+        "nganh_nghe": names,
+    })
+
+
+def history_frame(n_industries, seed=0):
+    """Lịch sử dạng dài (nganh_nghe, nam, ds, y) 2019–2024 như ingestion.melt_chunk."""
+    rng = np.random.default_rng(seed)
+    years = list(range(2019, 2025))
+    return pd.DataFrame({
+        "nganh_nghe": np.repeat([f"Industry {i:06d}" for i in range(n_industries)], len(years)),
+        "nam": years * n_industries,
+        "ds": pd.to_datetime([f"{y}-01-01" for y in years] * n_industries),
+        "y": rng.integers(1_000, 90_000, n_industries * len(years)),
+    })
@@ -0,0 +1,131 @@
+import numpy as np
+
+MBTI_CODES = (
+    'ISTJ', 'ISFJ', 'INFJ', 'INTJ', 'ISTP', 'ISFP', 'INFP', 'INTP',
+    'ESTP', 'ESFP', 'ENFP', 'ENTP', 'ESTJ', 'ESFJ', 'ENFJ', 'ENTJ',
+)
+
+
+def split_tokens(value):
+    """Tách 'A, b' thành {'A', 'B'} giống hệt cách save_route cũ so khớp MBTI / tổ hợp môn."""
+    return {token.strip().upper() for token in str(value).split(',')}
+
+
+class TokenBitmaskIndex:
+    """Bitmask token của từng ngành, đóng gói thành uint8 (số ngành × số byte).
+
+    Bit j của dòng i bật khi ngành i có token j. Truy vấn "có token nào trong
+    tập" là một phép AND trên toàn bộ ngành, không quét lại DataFrame.
+    """
+
+    def __init__(self, tokens, masks):
+        self.vocabulary = {token: j for j, token in enumerate(tokens)}
+        self.masks = masks
+
+    @classmethod
+    def from_column(cls, column, vocabulary=()):
+        """Dựng chỉ mục từ một cột 'A, B, C'; `vocabulary` cố định thứ tự các bit đầu."""
+        token_sets = [split_tokens(value) for value in column]
+        tokens = list(vocabulary)
+        tokens += sorted(set().union(*token_sets) - set(tokens)) if token_sets else []
+        positions = {token: j for j, token in enumerate(tokens)}
+
+        bits = np.zeros((len(token_sets), len(tokens)), dtype=bool)
+        for i, row_tokens in enumerate(token_sets):
+            bits[i, [positions[t] for t in row_tokens]] = True
+        return cls(tokens, np.packbits(bits, axis=1, bitorder='little'))
+
+    @property
+    def tokens(self):
+        return list(self.vocabulary)
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __contains__(self, token):
+        return token in self.vocabulary
+
+    def query_mask(self, tokens):
+        """Bitmask đóng gói của tập token; token lạ bị bỏ qua (không ngành nào có)."""
+        bits = np.zeros(len(self.vocabulary), dtype=bool)
+        bits[[self.vocabulary[t] for t in tokens if t in self.vocabulary]] = True
+        return np.packbits(bits, bitorder='little')
+
+    def match_any(self, tokens, rows=None):
+        """Mảng bool: ngành có ít nhất một token trong `tokens`.
+
+        Hồ sơ chỉ chọn vài token nên thử thẳng từng bit (một cột byte mỗi token)
+        thay vì AND cả dòng mask. `rows`: chỉ xét các ngành này, theo đúng thứ tự đó.
+        """
+        masks = self.masks if rows is None else self.masks[rows]
+        result = np.zeros(len(masks), dtype=bool)
+        for j in sorted({self.vocabulary[t] for t in tokens if t in self.vocabulary}):
+            result |= (masks[:, j >> 3] & np.uint8(1 << (j & 7))) != 0
+        return result
+
+    def rows_with(self, token):
+        """Chỉ số (tăng dần) các ngành có `token`."""
+        if token not in self.vocabulary:
+            return np.zeros(0, dtype=np.intp)
+        j = self.vocabulary[token]
+        return np.flatnonzero(self.masks[:, j >> 3] & np.uint8(1 << (j & 7)))
+
+    def match_all(self, tokens):
+        """Mảng bool: ngành có đủ mọi token trong `tokens`."""
+        tokens = list(tokens)
+        if any(t not in self.vocabulary for t in tokens):
+            return np.zeros(len(self), dtype=bool)
+        query = self.query_mask(tokens)
+        return ((self.masks & query) == query).all(axis=1)
+
+    def match_any_batch(self, tokens_list, rows=None):
+        """Ma trận bool (số truy vấn × số ngành) cho nhiều tập token cùng lúc."""
+        if not tokens_list:
+            return np.zeros((0, len(self) if rows is None else len(rows)), dtype=bool)
+        return np.stack([self.match_any(tokens, rows) for tokens in tokens_list])
+
+
+class CareerIndex:
+    """Chỉ mục MBTI / tổ hợp môn của bảng ngành, dựng một lần lúc khởi động.
+
+    Dùng chung cho chấm điểm và cho các bộ lọc khác, ví dụ
+    `career_index.filter(subjects=['A00'])` -> các ngành nhận khối A00.
+    """
+
+    def __init__(self, careers, mbti, subjects):
+        self.careers = careers
+        self.mbti = mbti
+        self.subjects = subjects
+
+    @classmethod
+    def from_dataframe(cls, data_backend):
+        return cls(
+            data_backend['Ngành'].to_numpy(dtype=object),
+            TokenBitmaskIndex.from_column(data_backend['MBTI'], vocabulary=MBTI_CODES),
+            TokenBitmaskIndex.from_column(data_backend['Tổ hợp môn']),
+        )
+
+    def __len__(self):
+        return len(self.careers)
+
+    def mbti_match(self, mbtis, rows=None):
+        """Ma trận bool (số hồ sơ × số ngành); MBTI rỗng không khớp ngành nào."""
+        return self.mbti.match_any_batch([[mbti] if mbti else [] for mbti in mbtis], rows)
+
+    def subjects_match(self, subjects_list, rows=None):
+        """Ma trận bool (số hồ sơ × số ngành): ngành nhận ít nhất một tổ hợp đã chọn."""
+        return self.subjects.match_any_batch(subjects_list, rows)
+
+    def filter(self, mbti=None, subjects=None, require_all_subjects=False):
+        """Mảng bool các ngành thoả mọi điều kiện được truyền vào."""
+        mask = np.ones(len(self), dtype=bool)
+        if mbti:
+            mask &= self.mbti.match_any([mbti.strip().upper()])
+        if subjects:
+            subjects = [s.strip().upper() for s in subjects]
+            mask &= self.subjects.match_all(subjects) if require_all_subjects else self.subjects.match_any(subjects)
+        return mask
+
+    def careers_where(self, **conditions):
+        """Tên các ngành thoả `filter(**conditions)`, giữ thứ tự dòng."""
+        return list(self.careers[self.filter(**conditions)])
@@ -0,0 +1,58 @@
+"""Cột chuỗi lưu dạng mã (categorical) cho bảng ngành trong snapshot.
+
+Thay vì mảng chuỗi Unicode độ rộng cố định (4 byte × độ dài tên dài nhất cho mỗi
+dòng) hoặc mảng object Python, mỗi cột là `codes` (int32, memory-map được) +
+danh sách giá trị duy nhất. Khi bảng là "ngành × trường", tên ngành / lĩnh vực
+lặp lại rất nhiều nên chỉ còn 4 byte mỗi dòng; so sánh lĩnh vực là so sánh số
+nguyên thay vì so chuỗi object.
+"""
+import numpy as np
+
+
+class CodedColumn:
+    """Cột chuỗi = mã từng dòng + bảng giá trị; hành xử như mảng chuỗi chỉ đọc."""
+
+    def __init__(self, codes, categories, lookup=None):
+        self.codes = codes
+        self.categories = categories      # mảng chuỗi (memory-map từ snapshot) hoặc list
+        self._lookup = lookup             # giá trị -> mã, dựng khi cần tra ngược
+
+    @classmethod
+    def from_values(cls, values):
+        """Mã theo thứ tự xuất hiện đầu tiên (như pandas.factorize)."""
+        lookup, categories = {}, []
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(categories)
+                categories.append(value)
+            codes[i] = code
+        return cls(codes, np.array(categories, dtype=object), lookup)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return str(self.categories[self.codes[key]])
+        return CodedColumn(self.codes[key], self.categories, self._lookup)
+
+    def __iter__(self):
+        return (str(self.categories[code]) for code in self.codes)
+
+    def tolist(self):
+        return [str(value) for value in np.asarray(self.categories)[np.asarray(self.codes)]]
+
+    @property
+    def lookup(self):
+        if self._lookup is None:
+            self._lookup = {str(value): j for j, value in enumerate(self.categories)}
+        return self._lookup
+
+    def code_of(self, value):
+        """Mã của `value`; -1 nếu không có dòng nào mang giá trị đó."""
+        return self.lookup.get(value, -1)
+
+    def codes_of(self, values):
+        return np.array([self.code_of(value) for value in values], dtype=np.int32)
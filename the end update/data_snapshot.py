@@ -0,0 +1,377 @@
+"""Biên dịch dữ liệu tham chiếu (Excel) thành snapshot nhị phân cho app.py.
+
+Snapshot là một thư mục `data/snapshot/<version>/` gồm các file .npy (mở bằng
+memory-map nên mọi worker dùng chung page cache) và `manifest.json`.
+`<version>` là hash của định dạng snapshot + nội dung các file nguồn, nên chỉ
+biên dịch lại khi một file Excel thay đổi.
+
+Chạy tay:  python data_snapshot.py [--force]
+"""
+import argparse
+import ast
+import ctypes
+import gc
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có khoá file, mỗi process tự biên dịch như trước
+    fcntl = None
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from career_index import CareerIndex, TokenBitmaskIndex
+from career_store import CodedColumn
+from ingestion import read_table
+from retrieval import CareerRetriever
+from scoring import ScoringEngine, TEXT_COLUMNS
+from universities import UniversityDirectory, compile_universities
+
+BASE_DIR = Path(__file__).parent
+SNAPSHOT_DIR = BASE_DIR / "data/snapshot"
+FORMAT_VERSION = 4
+
+logger = logging.getLogger("universitychoose.data_snapshot")
+
+
+def newest_output(stem, formats=("parquet", "json", "xlsx")):
+    """File mới nhất trong các định dạng forecasting.py đã ghi cho `stem`.
+
+    Parquet / JSON đọc được không cần openpyxl; lấy file mới nhất để một lần
+    chạy chỉ ghi .xlsx không bị che bởi file Parquet cũ hơn.
+    """
+    existing = [path for path in (stem.with_suffix(f".{fmt}") for fmt in formats) if path.exists()]
+    if not existing:
+        return stem.with_suffix(".xlsx")
+    return max(existing, key=lambda path: path.stat().st_mtime)
+
+
+class NewestOutput:
+    """Nguồn là file mới nhất của `stem` (newest_output), chọn lại mỗi lần resolve_sources.
+
+    Không cố định lúc import: forecasting.py ghi định dạng khác sau khi app đã
+    chạy thì lần kiểm tra sau của ReferenceDataManager thấy ngay file mới.
+    """
+
+    def __init__(self, stem, formats=("parquet", "json", "xlsx")):
+        self.stem = Path(stem)
+        self.formats = formats
+
+    def current(self):
+        return newest_output(self.stem, self.formats)
+
+    def __repr__(self):
+        return f"NewestOutput({str(self.stem)!r}, {self.formats!r})"
+
+
+def resolve_sources(sources):
+    """{tên: đường dẫn file} tại thời điểm gọi; nguồn NewestOutput được chọn lại."""
+    return {
+        name: path.current() if isinstance(path, NewestOutput) else path
+        for name, path in sources.items()
+    }
+
+
+SOURCE_FILES = {
+    "backend": BASE_DIR / "data/Sorted_Ngành_Nghề.xlsx",
+    "frontend": BASE_DIR / "data/Book1.xlsx",
+    "family": BASE_DIR / "data/FamilyFactor.xlsx",
+    "forecasting": NewestOutput(BASE_DIR / "data/generate/bang_xep_hang_nganh_nghe_AAGR_2025_2028"),
+    "universities": BASE_DIR / "data/Truong_theo_nganh.xlsx",
+}
+
+# Cột Book1.xlsx -> tên danh sách lựa chọn ở trang /home
+OPTION_COLUMNS = {
+    "mbti_options": "MBTI",
+    "subject_combination_options": "Tổ hợp môn",
+    "strengths_options": "Khả năng và Điểm mạnh",
+    "interests_options": "Sở thích và Đam mê",
+    "fields": "Lĩnh vực",
+}
+
+# Cột chuỗi của engine lưu dạng mã: <tên>_codes (int32) + <tên>_names (giá trị duy nhất).
+# Các cột chỉ dùng để fit (MBTI, tổ hợp môn, văn bản đã làm sạch) không vào snapshot.
+CODED_COLUMNS = ("careers", "fields")
+
+
+# === Helpers ===
+def clean_brackets(column):
+    cleaned_data = []
+    for entry in column:
+        try:
+            cleaned_data.append(" ".join(ast.literal_eval(entry)))
+        except (ValueError, SyntaxError):
+            cleaned_data.append(str(entry).replace("[", "").replace("]", ""))
+    return cleaned_data
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def snapshot_version(source_hashes):
+    """Phiên bản snapshot = hash(định dạng + hash từng file nguồn)."""
+    payload = json.dumps({"format": FORMAT_VERSION, "sources": source_hashes}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# === Compile ===
+def prepare_backend(data_backend):
+    """Làm sạch bảng ngành và fit TF-IDF như app.py vẫn làm lúc import."""
+    for col in ['Khả năng và Điểm mạnh', 'Sở thích và Đam mê', 'MBTI', 'Tổ hợp môn']:
+        if col not in data_backend.columns:
+            print(f"Warning: Column '{col}' is missing in the backend data. Adding empty placeholder.")
+            data_backend[col] = ""
+
+    for col in TEXT_COLUMNS.values():
+        data_backend[col] = clean_brackets(data_backend[col])
+
+    combined = (
+        data_backend['MBTI'].fillna("") + " " +
+        data_backend['Tổ hợp môn'].fillna("") + " " +
+        data_backend['MAIN STRENGTHS'].fillna("") + " " +
+        data_backend['Khả năng và Điểm mạnh'].fillna("") + " " +
+        data_backend['MAIN INTERESTEDS'].fillna("") + " " +
+        data_backend['Sở thích và Đam mê'].fillna("")
+    )
+    tfidf_vectorizer = TfidfVectorizer()
+    tfidf_vectorizer.fit(combined)
+    return data_backend, tfidf_vectorizer
+
+def load_cagr_dict(forecasting_data):
+    forecasting_data.columns = forecasting_data.columns.str.strip()
+    return forecasting_data.set_index('nganh_nghe')['AAGR (%)'].to_dict()
+
+def compile_snapshot(sources=SOURCE_FILES):
+    """Đọc các file nguồn (Excel / CSV / Parquet), trả về (arrays, manifest) sẵn sàng ghi ra đĩa."""
+    sources = resolve_sources(sources)
+    return compile_frames(
+        read_table(sources["backend"]),
+        read_table(sources["frontend"]),
+        read_table(sources["family"]),
+        read_table(sources["forecasting"]),
+        read_table(sources["universities"]) if "universities" in sources else None,
+    )
+
+def compile_frames(data_backend, data_frontend, family_data, forecasting_data, universities_data=None):
+    """Như compile_snapshot nhưng nhận DataFrame đã đọc sẵn (vd. dữ liệu benchmark)."""
+    data_backend, tfidf_vectorizer = prepare_backend(data_backend)
+    cagr_dict = load_cagr_dict(forecasting_data)
+
+    high_tuition_careers = family_data['Top học phí'].dropna().unique()
+    engine = ScoringEngine.from_dataframe(data_backend, tfidf_vectorizer, high_tuition_careers, cagr_dict)
+
+    arrays = {}
+    for name in CODED_COLUMNS:
+        column = getattr(engine, name)
+        arrays[f"{name}_codes"] = column.codes
+        arrays[f"{name}_names"] = np.array([str(value) for value in column.categories], dtype=str)
+    arrays["idf"] = tfidf_vectorizer.idf_
+    for key, csr in engine.postings.items():
+        arrays[f"postings_{key}_data"] = csr.data
+        arrays[f"postings_{key}_indices"] = csr.indices
+        arrays[f"postings_{key}_indptr"] = csr.indptr
+    arrays["mbti_masks"] = engine.index.mbti.masks
+    arrays["subject_masks"] = engine.index.subjects.masks
+    arrays["high_tuition"] = engine.high_tuition
+    arrays["social_factor_score"] = engine.social_factor_score
+
+    university_manifest = {}
+    if universities_data is not None:
+        university_arrays, university_manifest = compile_universities(universities_data)
+        arrays.update(university_arrays)
+
+    manifest = {
+        "n_careers": len(engine),
+        "n_features": len(tfidf_vectorizer.vocabulary_),
+        "vocabulary": tfidf_vectorizer.get_feature_names_out().tolist(),
+        "mbti_tokens": engine.index.mbti.tokens,
+        "subject_tokens": engine.index.subjects.tokens,
+        "options": {
+            name: sorted(data_frontend[col].dropna().unique().tolist())
+            for name, col in OPTION_COLUMNS.items()
+        },
+        **university_manifest,
+        "arrays": sorted(arrays),
+    }
+    return arrays, manifest
+
+def write_snapshot(arrays, manifest, snapshot_dir=SNAPSHOT_DIR):
+    """Ghi vào thư mục tạm rồi rename, nên worker khác không bao giờ thấy snapshot dở dang."""
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    target = snapshot_dir / manifest["version"]
+
+    tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=snapshot_dir))
+    try:
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(array), allow_pickle=False)
+        with open(tmp / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.rename(tmp, target)
+    except OSError:
+        # Một worker khác đã ghi cùng phiên bản trước -> dùng bản đó
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not (target / "manifest.json").exists():
+            raise
+    return target
+
+def prune_snapshots(snapshot_dir=SNAPSHOT_DIR, keep=(), max_versions=3):
+    """Xoá các phiên bản cũ, luôn giữ `keep` và `max_versions` bản mới nhất.
+
+    Worker nào còn memory-map bản bị xoá vẫn đọc được (file chỉ bị unlink).
+    """
+    versions = sorted(
+        (p for p in Path(snapshot_dir).iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: p.stat().st_mtime, reverse=True,
+    )
+    for path in versions[max_versions:]:
+        if path.name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+def build_snapshot(sources=SOURCE_FILES, snapshot_dir=SNAPSHOT_DIR, source_hashes=None):
+    started = time.perf_counter()
+    sources = resolve_sources(sources)
+    if source_hashes is None:
+        source_hashes = {name: file_sha256(path) for name, path in sources.items()}
+    arrays, manifest = compile_snapshot(sources)
+    manifest.update({
+        "format_version": FORMAT_VERSION,
+        "version": snapshot_version(source_hashes),
+        "sources": source_hashes,
+        "build_seconds": round(time.perf_counter() - started, 4),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    return write_snapshot(arrays, manifest, snapshot_dir)
+
+
+# === Load ===
+class ReferenceSnapshot:
+    """Snapshot đã mở: engine chấm điểm, retriever top-k, trường theo ngành, vectorizer, lựa chọn của /home."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.arrays = {
+            name: np.load(self.path / f"{name}.npy", mmap_mode="r")
+            for name in self.manifest["arrays"]
+        }
+        self.vectorizer = self._build_vectorizer()
+        self.engine = self._build_engine()
+        self.retriever = CareerRetriever(self.engine)
+        self.universities = UniversityDirectory.from_arrays(self.arrays, self.manifest)
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def options(self):
+        return self.manifest["options"]
+
+    def _build_vectorizer(self):
+        vocabulary = {token: j for j, token in enumerate(self.manifest["vocabulary"])}
+        vectorizer = TfidfVectorizer(vocabulary=vocabulary)
+        vectorizer.idf_ = np.asarray(self.arrays["idf"])
+        return vectorizer
+
+    def _build_engine(self):
+        a = self.arrays
+        shape = (self.manifest["n_careers"], self.manifest["n_features"])
+        def csr(prefix, shape):
+            return sp.csr_matrix((a[f"{prefix}_data"], a[f"{prefix}_indices"], a[f"{prefix}_indptr"]),
+                                 shape=shape, copy=False)
+
+        # Chỉ mục ngược từ -> ngành memory-map, dùng chung giữa worker
+        postings = {key: csr(f"postings_{key}", shape[::-1]) for key in TEXT_COLUMNS}
+        careers, fields = (CodedColumn(a[f"{name}_codes"], a[f"{name}_names"]) for name in CODED_COLUMNS)
+        index = CareerIndex(
+            careers,
+            TokenBitmaskIndex(self.manifest["mbti_tokens"], a["mbti_masks"]),
+            TokenBitmaskIndex(self.manifest["subject_tokens"], a["subject_masks"]),
+        )
+        return ScoringEngine(
+            vectorizer=self.vectorizer,
+            careers=careers,
+            fields=fields,
+            postings=postings,
+            index=index,
+            high_tuition=a["high_tuition"],
+            social_factor_score=a["social_factor_score"],
+        )
+
+def release_build_memory():
+    """Trả bộ nhớ của DataFrame / vectorizer lúc biên dịch về hệ điều hành.
+
+    Sau khi build, các đối tượng đó không còn được tham chiếu nhưng glibc thường giữ
+    lại heap đã cấp; malloc_trim thu hồi để RSS của worker không mang theo chúng.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+@contextmanager
+def build_lock(snapshot_dir=SNAPSHOT_DIR):
+    """Khoá độc quyền (flock trên `.build.lock`) giữa các process biên dịch vào `snapshot_dir`."""
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(snapshot_dir / ".build.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def load_or_build_snapshot(sources=SOURCE_FILES, snapshot_dir=SNAPSHOT_DIR):
+    """Mở snapshot ứng với nội dung hiện tại của file nguồn; biên dịch nếu chưa có.
+
+    Khi file nguồn đổi, mọi worker cùng phát hiện nhưng chỉ process giữ
+    build_lock biên dịch; các process khác chờ khoá rồi memory-map bản vừa ghi.
+    """
+    sources = resolve_sources(sources)
+    source_hashes = {name: file_sha256(path) for name, path in sources.items()}
+    path = Path(snapshot_dir) / snapshot_version(source_hashes)
+    if not (path / "manifest.json").exists():
+        with build_lock(snapshot_dir):
+            if not (path / "manifest.json").exists():   # chưa có process nào biên dịch xong trong lúc chờ
+                logger.info("Biên dịch dữ liệu tham chiếu -> %s", path)
+                path = build_snapshot(sources, snapshot_dir, source_hashes)
+                release_build_memory()
+    return ReferenceSnapshot(path)
+
+
+# === CLI ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Biên dịch snapshot dữ liệu tham chiếu cho app.py")
+    parser.add_argument("--force", action="store_true", help="biên dịch lại dù snapshot đã tồn tại")
+    parser.add_argument("--snapshot-dir", default=str(SNAPSHOT_DIR))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.force:
+        hashes = {name: file_sha256(path) for name, path in resolve_sources(SOURCE_FILES).items()}
+        shutil.rmtree(Path(args.snapshot_dir) / snapshot_version(hashes), ignore_errors=True)
+
+    started = time.perf_counter()
+    snapshot = load_or_build_snapshot(snapshot_dir=args.snapshot_dir)
+    print(f"Snapshot {snapshot.version}: {snapshot.manifest['n_careers']} ngành, "
+          f"{snapshot.manifest['n_features']} từ vựng, build {snapshot.manifest['build_seconds']}s")
+    print(f"Mở snapshot: {time.perf_counter() - started:.3f}s -> {snapshot.path}")
@@ -0,0 +1,88 @@
+"""Cache mô hình Prophet đã fit và dự báo của từng ngành cho forecasting.py.
+
+Mỗi mục được đặt tên theo hash của chuỗi số liệu đầu vào (ds, y) và siêu
+tham số, nên khi chạy lại chỉ những ngành có dữ liệu thay đổi (hoặc ngành
+mới) mới phải fit lại.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+CACHE_FORMAT = 1
+
+
+def series_key(nganh, nganh_data, params):
+    """Hash ổn định của (ngành, chuỗi ds/y, siêu tham số)."""
+    payload = {
+        "format": CACHE_FORMAT,
+        "nganh": nganh,
+        "ds": [ts.isoformat() for ts in pd.to_datetime(nganh_data["ds"])],
+        "y": [float(v) for v in nganh_data["y"]],
+        "params": params,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ForecastCache:
+    """Thư mục `<key>.json` chứa mô hình (prophet.serialize) và dự báo đã tính."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key):
+        """DataFrame dự báo (ds, yhat, nganh_nghe) nếu có trong cache, ngược lại None."""
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        forecast = pd.DataFrame(entry["forecast"])
+        forecast["ds"] = pd.to_datetime(forecast["ds"])
+        return forecast
+
+    def put(self, key, nganh, forecast, model_json=None):
+        entry = {
+            "nganh_nghe": nganh,
+            "model": model_json,
+            "forecast": {
+                "ds": [ts.isoformat() for ts in forecast["ds"]],
+                "yhat": [float(v) for v in forecast["yhat"]],
+                "nganh_nghe": [nganh] * len(forecast),
+            },
+        }
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=self.cache_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, self._path(key))
+
+    def load_model(self, key):
+        """Mô hình Prophet đã fit của mục `key` (None nếu không có)."""
+        from prophet.serialize import model_from_json
+
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                model_json = json.load(f).get("model")
+        except (OSError, ValueError):
+            return None
+        return model_from_json(model_json) if model_json else None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
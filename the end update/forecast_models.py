@@ -0,0 +1,59 @@
+"""Mô hình dự báo rẻ cho chuỗi tuyển dụng theo năm (so với Prophet trong backtesting.py).
+
+Mọi mô hình cùng chữ ký `model(years, y, target_years) -> mảng dự báo` (năm là
+số nguyên, y đã bỏ NaN, tăng dần theo năm), chỉ dùng numpy: fit + dự báo mất vài
+micro giây thay vì một lần chạy Stan.
+"""
+import numpy as np
+
+# Lưới tham số làm trơn cho Holt (alpha: mức, beta: xu hướng)
+SMOOTHING_GRID = np.round(np.arange(0.1, 1.0, 0.1), 1)
+
+
+def naive(years, y, target_years):
+    """Giá trị năm gần nhất cho mọi năm dự báo."""
+    return np.full(len(target_years), float(y[-1]))
+
+
+def linear_trend(years, y, target_years):
+    """Đường thẳng bình phương tối thiểu theo năm; một điểm -> như naive."""
+    if len(y) < 2:
+        return naive(years, y, target_years)
+    slope, intercept = np.polyfit(np.asarray(years, dtype=float), np.asarray(y, dtype=float), 1)
+    return intercept + slope * np.asarray(target_years, dtype=float)
+
+
+def _holt(y, alpha, beta):
+    """(level, trend, SSE dự báo một bước) của Holt tuyến tính trên `y`."""
+    level, trend = y[0], y[1] - y[0]
+    sse = 0.0
+    for value in y[1:]:
+        sse += (value - (level + trend)) ** 2
+        previous = level
+        level = alpha * value + (1 - alpha) * (level + trend)
+        trend = beta * (level - previous) + (1 - beta) * trend
+    return level, trend, sse
+
+
+def exp_smoothing(years, y, target_years):
+    """Làm trơn mũ Holt (mức + xu hướng), alpha/beta chọn theo SSE một bước trên lưới."""
+    y = np.asarray(y, dtype=float)
+    if len(y) < 2:
+        return naive(years, y, target_years)
+    level, trend, _ = min(
+        (_holt(y, alpha, beta) for alpha in SMOOTHING_GRID for beta in SMOOTHING_GRID),
+        key=lambda fit: fit[2],
+    )
+    steps = np.asarray(target_years, dtype=float) - float(years[-1])
+    return level + trend * steps
+
+
+BASELINE_MODELS = {
+    "naive": naive,
+    "linear": linear_trend,
+    "exp_smoothing": exp_smoothing,
+}
+
+# Mô hình dự báo phẳng: mọi năm 2025–2028 bằng nhau nên AAGR luôn 0, không
+# được chọn để dự báo cho bảng xếp hạng AAGR (chỉ dùng làm mốc so sánh khi backtest)
+FLAT_MODELS = ("naive",)
@@ -1,145 +1,340 @@
+import argparse
+import io
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from prophet import Prophet
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-
-# Tạo thư mục nếu chưa tồn tại
-os.makedirs('./data/generate', exist_ok=True)
-os.makedirs('./static', exist_ok=True)
-
-# 1. Load dữ liệu
-file_path = "./data/Rounded_Top_20_Industries_VN_2019_2024.xlsx"
-data = pd.read_excel(file_path)
-
-# 2. Chuẩn bị dữ liệu
-data_melted = data.melt(id_vars=["nganh_nghe"], var_name="nam", value_name="so_luong_tuyen_dung")
-data_melted["nam"] = data_melted["nam"].astype(int)
-data_melted["ds"] = pd.to_datetime(data_melted["nam"], format='%Y')
-data_melted = data_melted.rename(columns={"so_luong_tuyen_dung": "y"})
-
-# Kiểm tra dữ liệu
-print("Số lượng dữ liệu lịch sử theo từng ngành:")
-print(data_melted.groupby('nganh_nghe').count())
-
-# 3. Dự báo với Prophet
-future_predictions = []
-skipped_industries = []
-
-for nganh in data_melted["nganh_nghe"].unique():
-    nganh_data = data_melted[data_melted["nganh_nghe"] == nganh][["ds", "y"]]
-    
-    if nganh_data.empty:
-        skipped_industries.append(nganh)
-        continue
-    
+from matplotlib.figure import Figure
+
+from artifacts import TABLE_FORMATS, ArtifactWriter
+from forecast_cache import ForecastCache, series_key
+from forecast_models import BASELINE_MODELS, FLAT_MODELS
+from ingestion import DEFAULT_CHUNKSIZE, SeriesSpool, read_table
+
+FORECAST_YEARS = [2025, 2026, 2027, 2028]
+
+PROPHET_PARAMS = {
+    "yearly_seasonality": True,
+    "seasonality_prior_scale": 10,
+    "changepoint_prior_scale": 0.05,
+}
+
+
+def forecast_industry(nganh, nganh_data, serialize_model=False):
+    """Fit Prophet cho một ngành và dự báo 2025–2028.
+
+    Chạy được trong process con: trả về (nganh, forecast | None, model_json | None,
+    lỗi | None) thay vì ném exception, để tiến trình chính gom lỗi theo từng ngành.
+    """
     try:
         # Khởi tạo mô hình Prophet
-        model = Prophet(
-            yearly_seasonality=True,
-            seasonality_prior_scale=10,
-            changepoint_prior_scale=0.05
-        )
+        model = Prophet(**PROPHET_PARAMS)
         model.fit(nganh_data)
         
         # Dự báo 6 năm tới để đảm bảo đủ 2025–2028
         future = model.make_future_dataframe(periods=6, freq='YE')
         forecast = model.predict(future)
         
-        # Lọc dữ liệu từ 2025–2028
+        # Lọc dữ liệu từ 2025–2028 (năm thiếu được bù trong build_forecast_table)
         forecast = forecast[(forecast["ds"].dt.year >= 2025) & (forecast["ds"].dt.year <= 2028)]
         
-        if len(forecast) < 4:
-            print(f"⚠️ Không đủ dữ liệu cho các năm 2025–2028 của ngành {nganh}. Sử dụng giá trị gần nhất.")
-            last_value = nganh_data["y"].iloc[-1] if not nganh_data.empty else 0
-            for year in range(2025, 2029):
-                forecast = forecast.append({
-                    "ds": pd.Timestamp(f"{year}-12-31"),
-                    "yhat": last_value,
-                    "nganh_nghe": nganh
-                }, ignore_index=True)
-        
         forecast["nganh_nghe"] = nganh
-        future_predictions.append(forecast[["ds", "yhat", "nganh_nghe"]])
+        model_json = None
+        if serialize_model:
+            from prophet.serialize import model_to_json
+            model_json = model_to_json(model)
+        return nganh, forecast[["ds", "yhat", "nganh_nghe"]], model_json, None
     except Exception as e:
-        print(f"Lỗi dự báo ngành {nganh}: {e}")
-        skipped_industries.append(nganh)
-
-# Kết hợp dữ liệu dự báo
-if future_predictions:
-    forecast_df = pd.concat(future_predictions)
-else:
-    raise ValueError("Không có dữ liệu dự báo hợp lệ.")
-
-# 4. Tạo bảng số liệu nhu cầu hàng năm (2025–2028)
-annual_demand_data = []
-for nganh in forecast_df["nganh_nghe"].unique():
-    subset = forecast_df[forecast_df["nganh_nghe"] == nganh]
-    yearly_data = {
-        "nganh_nghe": nganh,
-        "2025": round(subset[subset["ds"].dt.year == 2025]["yhat"].values[0], -2) if len(subset[subset["ds"].dt.year == 2025]) > 0 else None,
-        "2026": round(subset[subset["ds"].dt.year == 2026]["yhat"].values[0], -2) if len(subset[subset["ds"].dt.year == 2026]) > 0 else None,
-        "2027": round(subset[subset["ds"].dt.year == 2027]["yhat"].values[0], -2) if len(subset[subset["ds"].dt.year == 2027]) > 0 else None,
-        "2028": round(subset[subset["ds"].dt.year == 2028]["yhat"].values[0], -2) if len(subset[subset["ds"].dt.year == 2028]) > 0 else None,
-    }
-    annual_demand_data.append(yearly_data)
-
-annual_demand_df = pd.DataFrame(annual_demand_data)
-annual_demand_file = "./data/generate/bang_so_lieu_nhu_cau_2025_2028.xlsx"
-annual_demand_df.to_excel(annual_demand_file, index=False)
-
-# 5. Tính toán AAGR (2025–2028)
-adjusted_growth_data = []
-
-for nganh in forecast_df["nganh_nghe"].unique():
-    subset = forecast_df[forecast_df["nganh_nghe"] == nganh].sort_values(by="ds")
-    
-    values = subset[subset["ds"].dt.year.isin([2025, 2026, 2027, 2028])]["yhat"].values
-    
-    if len(values) < 4:
-        print(f"⚠️ Không đủ dữ liệu để tính AAGR cho ngành {nganh}.")
-        adjusted_growth_data.append({
+        return nganh, None, None, e
+
+
+def baseline_forecast(nganh, nganh_data, model_name):
+    """Dự báo 2025–2028 bằng mô hình rẻ (forecast_models.py), cùng dạng kết quả forecast_industry."""
+    try:
+        history = nganh_data.dropna(subset=["y"])
+        yhat = BASELINE_MODELS[model_name](
+            history["ds"].dt.year.to_numpy(), history["y"].to_numpy(dtype=float), np.array(FORECAST_YEARS)
+        )
+        forecast = pd.DataFrame({
+            "ds": pd.to_datetime([f"{year}-12-31" for year in FORECAST_YEARS]),
+            "yhat": yhat,
             "nganh_nghe": nganh,
-            "2025": None,
-            "2028": None,
-            "AAGR (%)": None
         })
-        continue
-    
+        return nganh, forecast, None, None
+    except Exception as e:
+        return nganh, None, None, e
+
+
+def load_model_selection(path):
+    """{ngành: mô hình} từ bảng chọn mô hình của backtesting.py (selected_model).
+
+    Mô hình phẳng (FLAT_MODELS, chỉ có trong bảng chọn cũ) bị bỏ qua kèm cảnh báo:
+    dự báo phẳng cho AAGR = 0, nên ngành đó vẫn dùng Prophet.
+    """
+    selection = read_table(path)
+    models = dict(zip(selection["nganh_nghe"].astype(str), selection["selected_model"].astype(str)))
+    flat = sorted(nganh for nganh, model in models.items() if model in FLAT_MODELS)
+    if flat:
+        print(f"⚠️ Bảng chọn mô hình chọn mô hình phẳng ({', '.join(FLAT_MODELS)}) cho {len(flat)} ngành: "
+              f"{', '.join(flat)}. AAGR của mô hình phẳng luôn bằng 0 nên các ngành này dùng Prophet; "
+              "chạy lại backtesting.py để có bảng chọn mới.")
+    return {nganh: model for nganh, model in models.items() if model not in FLAT_MODELS}
+
+
+def run_forecasts(series, workers=1, cache=None, models=None):
+    """Dự báo từng chuỗi (ngành, DataFrame ds/y) của `series`, song song trên `workers` process.
+
+    `series` được đọc lần lượt (vd. `SeriesSpool.series()`): mỗi lúc chỉ có tối đa
+    2 × `workers` chuỗi đang chờ fit nằm trong bộ nhớ. Kết quả giữ đúng thứ tự
+    ngành như trong nguồn; ngành rỗng hoặc lỗi được đưa vào `skipped_industries`.
+    Nếu có `cache` (ForecastCache), ngành có chuỗi số liệu không đổi dùng lại dự
+    báo đã lưu, chỉ ngành thay đổi / mới mới được fit. `models` ({ngành: tên mô
+    hình}, từ `load_model_selection`) cho phép dự báo ngành bằng mô hình rẻ thay vì
+    Prophet; ngành không có trong `models` vẫn dùng Prophet.
+    """
+    models = models or {}
+    future_predictions = []
+    skipped_industries = []
+
+    order = []
+    results = {}
+    keys = {}
+    serialize_model = cache is not None
+    executor = None            # tạo khi có ngành đầu tiên cần fit (cache hit hết thì không cần)
+    pending = deque()
+
+    def finish(nganh, result):
+        results[nganh] = result
+        _, forecast, model_json, error = result
+        if cache and error is None:
+            cache.put(keys.pop(nganh), nganh, forecast, model_json)
+
+    def collect(nganh, future):
+        try:
+            result = future.result()
+        except Exception as e:   # process con chết / lỗi pickle
+            result = (nganh, None, None, e)
+        finish(nganh, result)
+
     try:
-        agr_values = [(values[i] / values[i-1] - 1) for i in range(1, len(values))]
-        aagr = (sum(agr_values) / len(agr_values)) * 100
-    except ZeroDivisionError:
-        aagr = 0
-    
-    adjusted_growth_data.append({
-        "nganh_nghe": nganh,
-        "2025": round(values[0], -2),
-        "2028": round(values[-1], -2),
-        "AAGR (%)": round(aagr, 2)
+        for nganh, nganh_data in series:
+            if nganh_data.empty:
+                skipped_industries.append(nganh)
+                continue
+            order.append(nganh)
+            if models.get(nganh, "prophet") in BASELINE_MODELS:
+                results[nganh] = baseline_forecast(nganh, nganh_data, models[nganh])
+                continue
+            key = series_key(nganh, nganh_data, PROPHET_PARAMS) if cache else None
+            cached = cache.get(key) if cache else None
+            if cached is not None:
+                results[nganh] = (nganh, cached, None, None)
+                continue
+            keys[nganh] = key
+            if workers <= 1:
+                finish(nganh, forecast_industry(nganh, nganh_data, serialize_model))
+                continue
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            pending.append((nganh, executor.submit(forecast_industry, nganh, nganh_data, serialize_model)))
+            while len(pending) >= 2 * workers:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    for nganh in order:
+        _, forecast, _, error = results[nganh]
+        if error is not None:
+            print(f"Lỗi dự báo ngành {nganh}: {error}")
+            skipped_industries.append(nganh)
+        else:
+            future_predictions.append(forecast)
+
+    return future_predictions, skipped_industries
+
+
+def build_forecast_table(forecast_df, last_values):
+    """Bảng ngành × năm (2025–2028) của yhat, dựng bằng một lần pivot.
+
+    Năm nào Prophet không trả về được bù bằng giá trị lịch sử gần nhất của
+    ngành đó (`last_values`: ngành -> y năm cuối, vd. `SeriesSpool.last_values`),
+    ngay trong cùng phép tính (không lặp theo từng ngành).
+    """
+    yearly = forecast_df.assign(nam=forecast_df["ds"].dt.year)
+    yearly = yearly[yearly["nam"].isin(FORECAST_YEARS)].sort_values("ds", kind="stable")
+    yearly = yearly.drop_duplicates(subset=["nganh_nghe", "nam"], keep="first")
+    table = (
+        yearly.pivot(index="nganh_nghe", columns="nam", values="yhat")
+        .reindex(index=forecast_df["nganh_nghe"].unique(), columns=FORECAST_YEARS)
+    )
+
+    missing = table.isna().any(axis=1)
+    for nganh in table.index[missing]:
+        print(f"⚠️ Không đủ dữ liệu cho các năm 2025–2028 của ngành {nganh}. Sử dụng giá trị gần nhất.")
+    if missing.any():
+        fallback = pd.Series(last_values, dtype=float).reindex(table.index).to_numpy(dtype=float)[:, None]
+        table = pd.DataFrame(
+            np.where(table.isna(), fallback, table.to_numpy(dtype=float)),
+            index=table.index, columns=table.columns,
+        )
+    return table
+
+
+def build_annual_demand(table):
+    """Bảng số liệu nhu cầu hàng năm (làm tròn hàng trăm)."""
+    annual_demand_df = table.round(-2)
+    annual_demand_df.columns = [str(year) for year in annual_demand_df.columns]
+    return annual_demand_df.rename_axis("nganh_nghe").reset_index()
+
+
+def build_aagr_ranking(table):
+    """AAGR 2025–2028 = trung bình tăng trưởng năm, tính theo cột cho mọi ngành."""
+    values = table.to_numpy(dtype=float)
+    incomplete = np.isnan(values).any(axis=1)
+    for nganh in table.index[incomplete]:
+        print(f"⚠️ Không đủ dữ liệu để tính AAGR cho ngành {nganh}.")
+
+    growth_sum = np.zeros(len(table))
+    zero_base = np.zeros(len(table), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i in range(1, values.shape[1]):
+            zero_base |= values[:, i - 1] == 0
+            growth_sum = growth_sum + (values[:, i] / values[:, i - 1] - 1)
+    # Năm trước bằng 0 -> AAGR = 0. Đổi hành vi: bản cũ chia float64 của numpy nên
+    # không bao giờ ném ZeroDivisionError mà ra inf (0/0 -> nan), đẩy ngành lên đầu bảng.
+    aagr = np.where(zero_base, 0.0, (growth_sum / (values.shape[1] - 1)) * 100)
+
+    adjusted_ranking_df = pd.DataFrame({
+        "nganh_nghe": table.index,
+        "2025": np.round(values[:, 0], -2),
+        "2028": np.round(values[:, -1], -2),
+        "AAGR (%)": np.round(aagr, 2),
     })
+    adjusted_ranking_df.loc[incomplete, ["2025", "2028", "AAGR (%)"]] = np.nan
+    return adjusted_ranking_df.sort_values(by="AAGR (%)", ascending=False)
+
+
+def build_chart_frame(forecast_df):
+    """Khung năm × ngành của yhat (một lần pivot) để vẽ mọi đường bằng một lệnh plot."""
+    yearly = forecast_df.assign(nam=forecast_df["ds"].dt.year)
+    return (
+        yearly.pivot_table(index="nam", columns="nganh_nghe", values="yhat", aggfunc="first")
+        .reindex(columns=forecast_df["nganh_nghe"].unique())
+    )
+
+
+def draw_chart(fig, chart_frame, title):
+    ax = fig.add_subplot()
+    lines = ax.plot(chart_frame.index, chart_frame.to_numpy())
+    ax.set_title(title)
+    ax.set_xlabel("Năm")
+    ax.set_ylabel("Số lượng tuyển dụng dự báo")
+    ax.legend(lines, chart_frame.columns, bbox_to_anchor=(1.05, 1), loc='upper left')
+    fig.tight_layout()
+
+
+def render_chart(chart_frame, title, figsize=(14, 8)):
+    """PNG (byte) của biểu đồ, vẽ bằng Figure/Agg: không cần màn hình, không qua pyplot."""
+    fig = Figure(figsize=figsize)
+    draw_chart(fig, chart_frame, title)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", metadata={"Software": None})
+    return buffer.getvalue()
+
+
+def parse_formats(value):
+    formats = tuple(f.strip().lower() for f in value.split(",") if f.strip())
+    unknown = [f for f in formats if f not in TABLE_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"định dạng phải thuộc {', '.join(TABLE_FORMATS)}, nhận {value!r}")
+    return formats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dự báo nhu cầu tuyển dụng 2025–2028 theo ngành (Prophet)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="số process fit Prophet song song (mặc định: số CPU)")
+    parser.add_argument("--cache-dir", default="./data/cache/prophet",
+                        help="thư mục cache mô hình / dự báo theo hash dữ liệu từng ngành")
+    parser.add_argument("--no-cache", action="store_true", help="fit lại mọi ngành, không đọc/ghi cache")
+    parser.add_argument("--input", default="./data/Rounded_Top_20_Industries_VN_2019_2024.xlsx",
+                        help="file số liệu tuyển dụng (.xlsx / .csv / .parquet, dạng rộng hoặc dài)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="số dòng đọc mỗi khối")
+    parser.add_argument("--formats", type=parse_formats, default=("xlsx",),
+                        help="định dạng bảng đầu ra, phân tách bởi dấu phẩy: xlsx,parquet,json (mặc định: xlsx)")
+    parser.add_argument("--model-selection",
+                        help="bảng chọn mô hình của backtesting.py (.json / .xlsx): ngành chọn mô hình rẻ không fit Prophet")
+    parser.add_argument("--show", action="store_true", help="mở cửa sổ biểu đồ sau khi ghi (cần màn hình)")
+    args = parser.parse_args(argv)
+
+    # Tạo thư mục nếu chưa tồn tại
+    os.makedirs('./data/generate', exist_ok=True)
+    os.makedirs('./static', exist_ok=True)
+
+    # 1. Load dữ liệu theo khối
+    # 2. Chuẩn bị dữ liệu: melt + kiểm tra từng khối, spool theo ngành
+    with SeriesSpool() as spool:
+        spool.ingest(args.input, chunksize=args.chunksize)
+
+        # Kiểm tra dữ liệu
+        print(f"Đã đọc {spool.rows} dòng ({spool.chunks} khối), {len(spool)} ngành.")
+        print("Số lượng dữ liệu lịch sử theo từng ngành:")
+        print(spool.counts().to_string())
+
+        # 3. Dự báo với Prophet, từng ngành một (chỉ fit lại ngành có dữ liệu thay đổi)
+        cache = None if args.no_cache else ForecastCache(args.cache_dir)
+        models = load_model_selection(args.model_selection) if args.model_selection else None
+        future_predictions, skipped_industries = run_forecasts(
+            spool.series(), workers=args.workers, cache=cache, models=models
+        )
+        last_values = spool.last_values
+    if cache:
+        stats = cache.stats()
+        print(f"Cache mô hình: {stats['hits']} hit / {stats['misses']} miss (hit rate {stats['hit_rate']:.0%})")
+
+    # Kết hợp dữ liệu dự báo
+    if future_predictions:
+        forecast_df = pd.concat(future_predictions)
+    else:
+        raise ValueError("Không có dữ liệu dự báo hợp lệ.")
+
+    # 4. Tạo bảng số liệu nhu cầu hàng năm (2025–2028)
+    # File có nội dung không đổi so với lần chạy trước không bị ghi lại (artifacts.py)
+    writer = ArtifactWriter('./data/generate')
+    forecast_table = build_forecast_table(forecast_df, last_values)
+    annual_demand_df = build_annual_demand(forecast_table)
+    annual_demand_files = writer.write_table("bang_so_lieu_nhu_cau_2025_2028", annual_demand_df, args.formats)
+
+    # 5. Tính toán AAGR (2025–2028)
+    adjusted_ranking_df = build_aagr_ranking(forecast_table)
+
+    # Xuất bảng xếp hạng AAGR
+    adjusted_ranking_files = writer.write_table("bang_xep_hang_nganh_nghe_AAGR_2025_2028", adjusted_ranking_df, args.formats)
+
+    print(f"Bảng xếp hạng AAGR đã lưu: {', '.join(map(str, adjusted_ranking_files.values()))}")
+
+    # 6. Vẽ biểu đồ (headless, chỉ khi số liệu dự báo đổi)
+    chart_title = "Dự báo số lượng tuyển dụng và AAGR (2025–2028)"
+    chart_frame = build_chart_frame(forecast_df)
+    writer.write_chart("du_bao_AAGR_2025_2028.png", chart_frame, render_chart, title=chart_title)
+    writer.save()
+
+    print(f"Bảng số liệu đã lưu: {', '.join(map(str, annual_demand_files.values()))}")
+    print(f"Bảng xếp hạng đã lưu: {', '.join(map(str, adjusted_ranking_files.values()))}")
+    print(f"Đầu ra: {len(writer.written)} file ghi mới, {len(writer.skipped)} file không đổi (bỏ qua)")
+
+    if args.show:
+        import matplotlib.pyplot as plt
+
+        draw_chart(plt.figure(figsize=(14, 8)), chart_frame, chart_title)
+        plt.show()
+
 
-# Xuất bảng xếp hạng AAGR
-adjusted_ranking_df = pd.DataFrame(adjusted_growth_data).sort_values(by="AAGR (%)", ascending=False)
-adjusted_ranking_file = "./data/generate/bang_xep_hang_nganh_nghe_AAGR_2025_2028.xlsx"
-adjusted_ranking_df.to_excel(adjusted_ranking_file, index=False)
-
-print(f"Bảng xếp hạng AAGR đã lưu: {adjusted_ranking_file}")
-
-# 6. Vẽ biểu đồ
-plt.figure(figsize=(14, 8))
-for nganh in forecast_df["nganh_nghe"].unique():
-    subset = forecast_df[forecast_df["nganh_nghe"] == nganh]
-    plt.plot(subset["ds"].dt.year, subset["yhat"], label=nganh)
-
-plt.title("Dự báo số lượng tuyển dụng và AAGR (2025–2028)")
-plt.xlabel("Năm")
-plt.ylabel("Số lượng tuyển dụng dự báo")
-plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.tight_layout()
-chart_path = "./data/generate/du_bao_AAGR_2025_2028.png"
-plt.savefig(chart_path)
-plt.show()
-
-print(f"Bảng số liệu đã lưu: {annual_demand_file}")
-print(f"Bảng xếp hạng đã lưu: {adjusted_ranking_file}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Cấu hình gunicorn cho production (thay cho `app.run(debug=True)`).
+
+    cd "the end update"
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Mô hình: nhiều process x nhiều thread (worker `gthread`).
+- Chấm điểm (numpy/scipy) là CPU-bound nên song song theo process; mặc định
+  một worker mỗi CPU (WEB_CONCURRENCY).
+- Đăng nhập và ghi Supabase là I/O-bound: mỗi worker có GUNICORN_THREADS thread,
+  dùng chung một pool kết nối keep-alive tới PostgREST (supabase_pool.py) với số
+  kết nối và timeout có giới hạn. Ghi UserProfile/Top10Major vẫn đi qua
+  write_queue nên không giữ thread của request.
+- Snapshot dữ liệu tham chiếu được memory-map, các worker chia sẻ page cache.
+
+Không bật preload_app: app.py khởi động thread nền (write_queue, theo dõi dữ
+liệu tham chiếu) lúc import, thread không sống sót qua fork. Mỗi worker tự
+import app và có spool riêng theo PID.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Request chấm điểm lô lớn (/recommend/batch) có thể mất vài giây
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Tái tạo worker định kỳ để tránh phân mảnh bộ nhớ tích luỹ
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = 500
+
+preload_app = False
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def on_starting(server):
+    """Biên dịch snapshot dữ liệu tham chiếu một lần, trong process riêng, trước khi fork worker.
+
+    Worker chỉ memory-map snapshot có sẵn; DataFrame và vectorizer lúc biên dịch
+    không bao giờ nằm trong bộ nhớ của master hay worker.
+    """
+    import subprocess
+    import sys
+
+    subprocess.run([sys.executable, "data_snapshot.py"], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def worker_exit(server, worker):
+    """Ghi nốt hàng đợi Supabase trước khi worker thoát; phần còn lại nằm trong spool."""
+    import app
+
+    if app.write_queue:
+        app.write_queue.stop()
@@ -0,0 +1,230 @@
+"""Đọc dữ liệu tuyển dụng theo khối (chunk) cho forecasting.py.
+
+Nguồn: .xlsx (openpyxl read_only, không dựng cả workbook trong bộ nhớ), .csv
+(pandas chunksize) và .parquet (pyarrow, theo batch). Chấp nhận hai dạng bảng:
+
+- rộng: `nganh_nghe` + một cột mỗi năm (2019, 2020, ...); cột khác (vd. tỉnh /
+  thành) là chiều phụ, được cộng dồn;
+- dài: `nganh_nghe`, `nam`, `so_luong_tuyen_dung` (hoặc `y`).
+
+Mỗi khối được melt và kiểm tra rồi ghi nối vào spool trên đĩa, mỗi ngành một
+file. Đọc hết nguồn xong, `SeriesSpool.series()` trả chuỗi (ds, y) của từng
+ngành lần lượt, đã cộng các dòng trùng (ngành, năm) và sắp theo năm. Bộ nhớ
+đỉnh chỉ còn cỡ một khối + chuỗi lớn nhất thay vì cả bảng đã melt.
+"""
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+INDUSTRY_COLUMN = "nganh_nghe"
+YEAR_COLUMN = "nam"
+VALUE_COLUMNS = ("so_luong_tuyen_dung", "y")
+DEFAULT_CHUNKSIZE = 10_000
+TABLE_FORMATS = (".xlsx", ".xlsm", ".csv", ".parquet")
+
+
+# === Đọc nguồn ===
+def _suffix(path, formats=TABLE_FORMATS):
+    suffix = Path(path).suffix.lower()
+    if suffix not in formats:
+        raise ValueError(f"Định dạng không hỗ trợ: {path} (chỉ nhận {', '.join(formats)})")
+    return suffix
+
+
+def _excel_chunks(path, chunksize):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row[:len(columns)])
+            if len(chunk) >= chunksize:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _parquet_chunks(path, chunksize):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Các DataFrame tối đa `chunksize` dòng của sheet đầu tiên / file CSV / Parquet."""
+    suffix = _suffix(path)
+    if suffix == ".csv":
+        yield from pd.read_csv(path, chunksize=chunksize)
+    elif suffix == ".parquet":
+        yield from _parquet_chunks(path, chunksize)
+    else:
+        yield from _excel_chunks(path, chunksize)
+
+
+def read_table(path):
+    """Đọc cả bảng (dùng cho dữ liệu tham chiếu cần toàn bộ dòng, vd. fit TF-IDF).
+
+    Nhận thêm .json dạng records (đầu ra `--formats json` của forecasting.py).
+    """
+    suffix = _suffix(path, (*TABLE_FORMATS, ".json"))
+    if suffix == ".json":
+        return pd.read_json(path, orient="records", convert_axes=False, convert_dates=False, precise_float=True)
+    if suffix == ".csv":
+        return pd.read_csv(path)
+    if suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_excel(path)
+
+
+# === Melt + kiểm tra ===
+def year_of(column):
+    """2019 / "2019" / 2019.0 -> 2019; cột không phải năm -> None."""
+    try:
+        year = int(float(str(column).strip()))
+    except ValueError:
+        return None
+    return year if 1900 <= year <= 2100 else None
+
+
+def melt_chunk(chunk):
+    """Khối dạng rộng hoặc dài -> DataFrame dài (nganh_nghe, nam, y) đã kiểm tra.
+
+    Bỏ dòng không có tên ngành; y thiếu giữ NaN (Prophet tự bỏ qua). Ném
+    ValueError nếu thiếu cột bắt buộc, năm không hợp lệ, hoặc y không phải số
+    / âm.
+    """
+    chunk = chunk.rename(columns=lambda c: c.strip() if isinstance(c, str) else c)
+    if INDUSTRY_COLUMN not in chunk.columns:
+        raise ValueError(f"Thiếu cột '{INDUSTRY_COLUMN}' (các cột: {list(chunk.columns)})")
+
+    if YEAR_COLUMN in chunk.columns:
+        value_column = next((c for c in VALUE_COLUMNS if c in chunk.columns), None)
+        if value_column is None:
+            raise ValueError(f"Bảng dạng dài cần một trong các cột {VALUE_COLUMNS}")
+        long = chunk[[INDUSTRY_COLUMN, YEAR_COLUMN, value_column]].set_axis(
+            [INDUSTRY_COLUMN, YEAR_COLUMN, "y"], axis=1)
+        years = {value: year_of(value) for value in long[YEAR_COLUMN].unique()}
+        bad = [value for value, year in years.items() if year is None]
+        if bad:
+            raise ValueError(f"Năm không hợp lệ: {bad[0]!r}")
+        long[YEAR_COLUMN] = long[YEAR_COLUMN].map(years).astype(int)
+    else:
+        year_columns = {c: year_of(c) for c in chunk.columns if year_of(c) is not None}
+        if not year_columns:
+            raise ValueError(f"Không tìm thấy cột năm nào (các cột: {list(chunk.columns)})")
+        # Đổi tên cột năm trước khi melt: chuyển kiểu một lần mỗi cột, không phải mỗi dòng
+        long = chunk[[INDUSTRY_COLUMN, *year_columns]].rename(columns=year_columns).melt(
+            id_vars=[INDUSTRY_COLUMN], var_name=YEAR_COLUMN, value_name="y")
+        long[YEAR_COLUMN] = long[YEAR_COLUMN].astype(int)
+
+    long = long[long[INDUSTRY_COLUMN].notna()].copy()
+    long[INDUSTRY_COLUMN] = long[INDUSTRY_COLUMN].astype(str).str.strip()
+    values = pd.to_numeric(long["y"], errors="coerce")
+    invalid = values.isna() & long["y"].notna()
+    if invalid.any():
+        row = long[invalid].iloc[0]
+        raise ValueError(f"Số lượng tuyển dụng không phải số: ngành {row[INDUSTRY_COLUMN]}, "
+                         f"năm {row[YEAR_COLUMN]}: {row['y']!r}")
+    if (values < 0).any():
+        row = long[values < 0].iloc[0]
+        raise ValueError(f"Số lượng tuyển dụng âm: ngành {row[INDUSTRY_COLUMN]}, năm {row[YEAR_COLUMN]}")
+    long["y"] = values.astype(float)
+    return long
+
+
+# === Spool theo ngành ===
+class SeriesSpool:
+    """Spool trên đĩa: mỗi ngành một file nhị phân các cặp (năm, y) float64.
+
+    Dùng như context manager để xoá thư mục tạm khi xong:
+
+        with SeriesSpool() as spool:
+            spool.ingest(path)
+            for nganh, nganh_data in spool.series():
+                ...
+    """
+
+    def __init__(self, spool_dir=None):
+        self._owned = spool_dir is None
+        self.spool_dir = Path(spool_dir or tempfile.mkdtemp(prefix="forecast-spool-"))
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.files = {}            # ngành -> file, theo thứ tự xuất hiện đầu tiên
+        self.rows = 0
+        self.chunks = 0
+        self.last_values = {}      # ngành -> y của năm gần nhất, điền khi đọc series()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._owned:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def __len__(self):
+        return len(self.files)
+
+    def append(self, long):
+        """Ghi nối một khối dài (nganh_nghe, nam, y) vào file của từng ngành.
+
+        Khối được cộng trước theo (ngành, năm) nên dữ liệu cấp tỉnh chỉ ghi một
+        cặp mỗi ngành × năm mỗi khối; `sum(min_count=1)` giữ NaN khi cả nhóm thiếu.
+        """
+        totals = long.groupby([INDUSTRY_COLUMN, YEAR_COLUMN], sort=False)["y"].sum(min_count=1)
+        codes, names = pd.factorize(totals.index.get_level_values(0))
+        pairs = np.column_stack([
+            totals.index.get_level_values(1).to_numpy(dtype="<f8"), totals.to_numpy(dtype="<f8"),
+        ])
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        for j, nganh in enumerate(names):
+            path = self.files.get(nganh)
+            if path is None:
+                path = self.files[nganh] = self.spool_dir / f"{len(self.files):06d}.bin"
+            with open(path, "ab") as f:
+                pairs[order[bounds[j]:bounds[j + 1]]].tofile(f)
+        self.rows += len(long)
+        self.chunks += 1
+
+    def ingest(self, path, chunksize=DEFAULT_CHUNKSIZE):
+        """Đọc `path` theo khối, melt + kiểm tra + spool từng khối."""
+        for chunk in iter_chunks(path, chunksize):
+            self.append(melt_chunk(chunk))
+        return self
+
+    def series(self):
+        """(ngành, DataFrame ds/y) lần lượt từng ngành; chỉ một chuỗi nằm trong bộ nhớ."""
+        for nganh, path in self.files.items():
+            pairs = np.fromfile(path, dtype="<f8").reshape(-1, 2)
+            y = pd.Series(pairs[:, 1]).groupby(pairs[:, 0].astype(int), sort=True).sum(min_count=1)
+            nganh_data = pd.DataFrame({
+                "ds": pd.to_datetime(y.index.astype(str), format="%Y"),
+                "y": y.to_numpy(),
+            })
+            if len(nganh_data):
+                self.last_values[nganh] = nganh_data["y"].iloc[-1]
+            yield nganh, nganh_data
+
+    def counts(self):
+        """Số cặp (năm, y) đã spool theo ngành, không cần đọc lại dữ liệu."""
+        return pd.Series(
+            {nganh: path.stat().st_size // 16 for nganh, path in self.files.items()},
+            name="so_dong", dtype=int,
+        ).rename_axis(INDUSTRY_COLUMN)
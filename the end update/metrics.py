@@ -0,0 +1,127 @@
+"""Histogram thời gian theo phase và xuất định dạng text của Prometheus.
+
+    with span("score"):
+        ...
+
+Mỗi process giữ số liệu riêng (với nhiều worker, Prometheus cộng theo nhãn
+instance). Không phụ thuộc thư viện ngoài.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}    # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(key, list(series)) for key, series in items]
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', repr(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_label_text(key + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_text(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self.collectors = []     # callable -> [(name, type, help, value, labels)]
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, help_text, buckets)
+        return self.histograms[name]
+
+    def register_collector(self, collector):
+        """`collector()` trả về list (tên, kiểu, mô tả, giá trị, nhãn) đọc lúc scrape."""
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+        seen = set()
+        for collector in self.collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                lines.append(f"# collector error: {type(e).__name__}")
+                continue
+            for name, kind, help_text, value, labels in samples:
+                if value is None:
+                    continue
+                if name not in seen:
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    seen.add(name)
+                lines.append(f"{name}{_label_text(tuple(sorted((labels or {}).items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "universitychoose_phase_seconds",
+    "Thời gian từng phase xử lý (parse, vectorize, score, sort, ghi Supabase, truy vấn Account).",
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "universitychoose_http_request_seconds",
+    "Thời gian xử lý request HTTP theo endpoint.",
+)
+
+
+def process_rss_bytes():
+    """RSS hiện tại của process (Linux /proc); None nếu không đọc được."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@contextmanager
+def span(phase, **labels):
+    """Đo thời gian một khối lệnh vào histogram phase."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - started, phase=phase, **labels)
@@ -0,0 +1,148 @@
+"""Quản lý dữ liệu tham chiếu có thể nạp lại khi file nguồn thay đổi.
+
+Một thread nền theo dõi các file Excel (mtime + kích thước). Khi có thay đổi,
+nó biên dịch snapshot mới (data_snapshot.py) rồi thay con trỏ `current()` bằng
+một phép gán duy nhất. Request nào đã lấy snapshot cũ vẫn dùng trọn vẹn bản
+đó cho tới khi trả lời, nên không bao giờ thấy dữ liệu nửa cũ nửa mới.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from data_snapshot import SNAPSHOT_DIR, SOURCE_FILES, load_or_build_snapshot, prune_snapshots, resolve_sources
+from metrics import process_rss_bytes
+
+logger = logging.getLogger("universitychoose.reference_data")
+
+
+def rss_mb():
+    rss = process_rss_bytes()
+    return round(rss / 2**20, 1) if rss is not None else None
+
+
+def file_signature(sources):
+    """(đường dẫn, mtime_ns, size) của từng file nguồn; None nếu file đang bị thiếu.
+
+    Đường dẫn được chọn lại mỗi lần (resolve_sources), nên nguồn đổi sang file
+    khác (vd. forecasting.py ghi thêm .parquet) cũng tính là thay đổi.
+    """
+    signature = {}
+    for name, path in resolve_sources(sources).items():
+        try:
+            stat = os.stat(path)
+            signature[name] = (str(path), stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature[name] = None
+    return signature
+
+
+class ReferenceDataManager:
+    """Giữ snapshot hiện hành và nạp lại ở nền khi file nguồn đổi."""
+
+    def __init__(self, sources=SOURCE_FILES, snapshot_dir=SNAPSHOT_DIR, poll_seconds=5.0, history=20):
+        self.sources = sources
+        self.snapshot_dir = snapshot_dir
+        self.poll_seconds = poll_seconds
+        self.rebuilds = deque(maxlen=history)
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._signature = file_signature(sources)
+        self._snapshot = self._load("startup")
+        self.loaded_at = time.time()
+
+    def current(self):
+        """Snapshot đang dùng; lấy một lần đầu request và dùng suốt request đó."""
+        return self._snapshot
+
+    # --- Reload ---
+    def _load(self, reason):
+        started = time.perf_counter()
+        rss_before = rss_mb()
+        snapshot = load_or_build_snapshot(self.sources, self.snapshot_dir)
+        self.rebuilds.append({
+            "reason": reason,
+            "ok": True,
+            "version": snapshot.version,
+            "seconds": round(time.perf_counter() - started, 4),
+            "build_seconds": snapshot.manifest.get("build_seconds"),
+            "rss_mb_before": rss_before,
+            "rss_mb_after": rss_mb(),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        return snapshot
+
+    def reload(self, reason="manual"):
+        """Biên dịch/nạp snapshot theo file nguồn hiện tại; trả về True nếu đổi phiên bản."""
+        with self._reload_lock:
+            signature = file_signature(self.sources)
+            previous = self._snapshot
+            try:
+                snapshot = self._load(reason)
+            except Exception as e:
+                # Giữ snapshot cũ (vd. file Excel đang được ghi dở); thử lại ở lần thay đổi sau
+                logger.exception("reload reference data (%s)", reason)
+                self.rebuilds.append({
+                    "reason": reason,
+                    "ok": False,
+                    "error": str(e),
+                    "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                })
+                self._signature = signature
+                return False
+
+            self._signature = signature
+            if snapshot.version == previous.version:
+                return False
+            self.install(snapshot)
+            prune_snapshots(self.snapshot_dir, keep={previous.version, snapshot.version})
+            return True
+
+    def install(self, snapshot):
+        """Thay snapshot hiện hành (phép gán nguyên tử); dùng cho reload và benchmark."""
+        previous = self._snapshot
+        self._snapshot = snapshot
+        self.loaded_at = time.time()
+        logger.info("Dữ liệu tham chiếu %s -> %s", previous.version, snapshot.version)
+
+    def check_for_changes(self):
+        if file_signature(self.sources) != self._signature:
+            return self.reload("file changed")
+        return False
+
+    # --- Background watcher ---
+    def start(self):
+        if self._thread is not None or self.poll_seconds <= 0:
+            return
+        self._thread = threading.Thread(target=self._watch, name="reference-data-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check_for_changes()
+            except Exception:
+                logger.exception("reference data watcher")
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "built_at": snapshot.manifest.get("built_at"),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "n_careers": snapshot.manifest.get("n_careers"),
+            "sources": snapshot.manifest.get("sources"),
+            "poll_seconds": self.poll_seconds,
+            "watching": self._thread is not None,
+            "rss_mb": rss_mb(),
+            "rebuilds": list(self.rebuilds),
+        }
@@ -0,0 +1,124 @@
+"""Cache LRU/TTL kết quả top-10 theo hồ sơ học sinh đã chuẩn hoá.
+
+Mục cache được khoá theo (phiên bản dữ liệu tham chiếu, hash của hồ sơ: MBTI,
+tổ hợp môn đã sắp xếp, các tập điểm mạnh / sở thích, lựa chọn gia đình).
+Phiên bản hiện hành lấy từ `current_version` (snapshot đang dùng). Khi nó đổi
+(bảng ngành, FamilyFactor hoặc bảng AAGR thay đổi), các mục của phiên bản khác
+bị xoá. Request còn giữ snapshot cũ lúc reload chỉ bị miss và không được lưu
+kết quả của nó, chứ không xoá cache của phiên bản mới; nên cache không bao giờ
+trả kết quả tính trên dữ liệu cũ và không bị xoá đi xoá lại khi hai phiên bản
+cùng có request đang chạy.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def profile_key(profile, k=10):
+    """Hash chuẩn của hồ sơ: thứ tự chọn không ảnh hưởng tới khoá."""
+    canonical = {
+        "k": k,
+        "mbti": profile['mbti'],
+        "subjects": sorted(set(profile['subjects'])),
+        "mainstrengths": sorted(profile['mainstrengths']),
+        "strengths": sorted(profile['strengths']),
+        "maininterests": sorted(profile['maininterests']),
+        "interests": sorted(profile['interests']),
+        "financial_influence": bool(profile['financial_influence']),
+        "family_advice": profile['family_advice'],
+        "family_industry_select": profile['family_industry_select'],
+    }
+    encoded = json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    def __init__(self, maxsize=4096, ttl=3600.0, current_version=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Hàm trả về phiên bản hiện hành; None: không xoá theo phiên bản (mục cũ chỉ hết qua LRU/TTL)
+        self.current_version = current_version
+        self._entries = OrderedDict()    # (version, key) -> (expires_at, value)
+        self._version = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def _sync_version(self):
+        """Phiên bản hiện hành; xoá mục của phiên bản khác khi nó đổi (gọi khi đang giữ lock)."""
+        if self.current_version is None:
+            return None
+        version = self.current_version()
+        if version != self._version:
+            stale = [entry_key for entry_key in self._entries if entry_key[0] != version]
+            for entry_key in stale:
+                del self._entries[entry_key]
+            if stale:
+                self.invalidations += 1
+            self._version = version
+        return version
+
+    def get(self, version, key):
+        """Kết quả đã lưu cho `key` ở phiên bản dữ liệu `version`, hoặc None."""
+        if self.maxsize <= 0:
+            return None
+        entry_key = (version, key)
+        with self._lock:
+            self._sync_version()
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[entry_key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return value
+
+    def put(self, version, key, value):
+        """Lưu kết quả; bỏ qua nếu `version` không còn là phiên bản hiện hành."""
+        if self.maxsize <= 0:
+            return
+        entry_key = (version, key)
+        with self._lock:
+            current = self._sync_version()
+            if self.current_version is not None and version != current:
+                self.stale_puts += 1
+                return
+            self._entries[entry_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
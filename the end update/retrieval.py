@@ -0,0 +1,247 @@
+"""Truy hồi ứng viên top-k (MaxScore) trước khi chấm điểm đầy đủ.
+
+Khi bảng ngành lên cỡ "ngành × trường" toàn quốc, chấm cả bảng cho mỗi request
+dựng nhiều ma trận dày số hồ sơ × số ngành mà phần lớn ngành không bao giờ lọt
+top-k. `CareerRetriever` có hai chế độ:
+
+- "exact": chấm cả bảng (`ScoringEngine.recommend_batch`). Đây là đường tham chiếu.
+- "approximate": cắt tỉa kiểu MaxScore. final_score của một ngành là phần tĩnh
+  (gia đình cơ bản + xã hội, không phụ thuộc học sinh) trừ mức phạt học phí
+  cộng các phần không âm, mỗi phần là một danh sách ngành kèm cận trên:
+
+  * mỗi từ trong hồ sơ ở mỗi cột văn bản: một dòng của `engine.postings`, cận
+    trên = trọng số × TF-IDF của từ trong hồ sơ × TF-IDF lớn nhất trong dòng;
+  * ngành khớp MBTI, ngành nhận tổ hợp môn đã chọn, ngành cùng lĩnh vực gia
+    đình: cận trên là đúng trọng số của phần đó.
+
+  Các danh sách được duyệt theo cận trên giảm dần (xem `candidates`): điểm góp
+  thật được cộng dồn, θ (cận dưới của điểm thứ k) tăng dần, ngành nào không thể
+  vượt θ dù cộng đủ các danh sách còn lại thì bị loại. Khi còn ít ngành, danh
+  sách sau chỉ được tra cho các ngành đó thay vì duyệt hết. Các ngành còn lại
+  được chấm đầy đủ bằng `ScoringEngine` (cùng công thức, cùng giá trị).
+
+  Với `threshold_factor` = 1, kết quả trùng đúng "exact" (kể cả thứ tự hoà
+  điểm). Đặt > 1 thì ngưỡng được nâng lên, loại ngành sớm hơn nhưng có thể bỏ
+  sót ngành ở cuối top-k; `evaluate()` đo recall@k so với "exact".
+
+Chi phí duyệt danh sách chỉ lời hơn phép nhân ma trận cả bảng khi bảng ngành
+lớn (cỡ vài chục nghìn ngành trở lên), nên mặc định của app vẫn là "exact".
+"""
+import numpy as np
+
+from scoring import (
+    FAMILY_ADVICE_BONUS, FAMILY_BASE, FAMILY_HIGH_TUITION_PENALTY, FINAL_WEIGHTS,
+    MAIN_WEIGHT, PF_WEIGHTS, REMAINING_WEIGHT,
+)
+
+RETRIEVAL_MODES = ("exact", "approximate")
+# Bù sai số làm tròn khi so cận trên với θ, để ngành hoà điểm vẫn được chấm
+BOUND_EPSILON = 1e-9
+# Chi phí tra một ngành còn lại trong danh sách (searchsorted) so với cộng một phần tử
+# danh sách vào bộ tích luỹ; quyết định duyệt hết hay chỉ tra các ngành còn lại
+PROBE_COST = 16.0
+
+# Hệ số của từng cột văn bản trong final_score
+TEXT_WEIGHTS = {
+    'mainstrengths': PF_WEIGHTS['strengths_score'] * MAIN_WEIGHT,
+    'strengths': PF_WEIGHTS['strengths_score'] * REMAINING_WEIGHT,
+    'maininterests': PF_WEIGHTS['interests_score'] * MAIN_WEIGHT,
+    'interests': PF_WEIGHTS['interests_score'] * REMAINING_WEIGHT,
+}
+
+
+class CareerRetriever:
+    """Chọn ứng viên bằng cận trên MaxScore rồi chấm đầy đủ bằng `ScoringEngine` trên tập đó."""
+
+    def __init__(self, engine, threshold_factor=1.0):
+        self.engine = engine
+        self.threshold_factor = threshold_factor
+        pf, family = FINAL_WEIGHTS['PF_score'], FINAL_WEIGHTS['family_score']
+
+        # Phần tĩnh của từng ngành và mức trừ học phí cao (khi hồ sơ chịu ảnh hưởng tài chính)
+        self.static = family * FAMILY_BASE + FINAL_WEIGHTS['social_factor_score'] * np.asarray(
+            engine.social_factor_score, dtype=float)
+        self.static_min = self.static.min(initial=0.0)
+        self.tuition_penalty = family * FAMILY_HIGH_TUITION_PENALTY * np.asarray(engine.high_tuition, dtype=float)
+
+        # TF-IDF lớn nhất trong danh sách ngành của từng từ
+        self.text_weights = {key: pf * weight for key, weight in TEXT_WEIGHTS.items()}
+        self.postings_max = {}
+        for key, postings in engine.postings.items():
+            row_max = np.zeros(postings.shape[0])
+            lengths = np.diff(postings.indptr)
+            if postings.nnz:
+                row_max[lengths > 0] = np.maximum.reduceat(postings.data, postings.indptr[:-1][lengths > 0])
+            self.postings_max[key] = row_max
+
+        # Danh sách ngành (tăng dần) theo MBTI, tổ hợp môn, lĩnh vực; dựng một lần
+        index = engine.index
+        self.mbti_rows = {token: index.mbti.rows_with(token) for token in index.mbti.tokens}
+        self.subject_rows = {token: index.subjects.rows_with(token) for token in index.subjects.tokens}
+        codes = np.asarray(engine.fields.codes)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(engine.fields.categories) + 1))
+        self.field_rows = [order[bounds[j]:bounds[j + 1]] for j in range(len(engine.fields.categories))]
+        self.mbti_bound = pf * PF_WEIGHTS['mbti_score']
+        self.subjects_bound = pf * PF_WEIGHTS['subjects_score']
+
+    def __len__(self):
+        return len(self.engine)
+
+    # --- Danh sách và cận trên ---
+    def posting_lists(self, profile, queries, row):
+        """Các danh sách ngành của một hồ sơ, cận trên giảm dần.
+
+        Mỗi phần tử là (cận trên, chỉ số ngành tăng dần, hệ số, TF-IDF của ngành,
+        cột văn bản). Điểm góp của danh sách cho ngành thứ j trong đó là hệ số ×
+        TF-IDF[j] (danh sách một từ) hoặc đúng hệ số (MBTI, tổ hợp môn, lĩnh vực:
+        TF-IDF và cột là None). `queries` từ `vectorize_profiles`.
+        """
+        lists = []
+        for key, weight in self.text_weights.items():
+            query, postings = queries[key], self.engine.postings[key]
+            start, end = query.indptr[row], query.indptr[row + 1]
+            for term, value in zip(query.indices[start:end], query.data[start:end]):
+                first, last = postings.indptr[term], postings.indptr[term + 1]
+                if last > first:
+                    scale = weight * value
+                    lists.append((scale * self.postings_max[key][term], postings.indices[first:last],
+                                  scale, postings.data[first:last], key))
+
+        if profile['mbti'] in self.mbti_rows:
+            lists.append((self.mbti_bound, self.mbti_rows[profile['mbti']], self.mbti_bound, None, None))
+        subjects = [self.subject_rows[s] for s in profile['subjects'] if s in self.subject_rows]
+        if subjects:
+            rows = subjects[0]
+            if len(subjects) > 1:
+                union = np.zeros(len(self), dtype=bool)
+                for subject_rows in subjects:
+                    union[subject_rows] = True
+                rows = np.flatnonzero(union)
+            lists.append((self.subjects_bound, rows, self.subjects_bound, None, None))
+
+        bonus = FINAL_WEIGHTS['family_score'] * FAMILY_ADVICE_BONUS.get(profile['family_advice'], 0.0)
+        code = self.engine.fields.code_of(profile['family_industry_select'])
+        if bonus > 0 and code >= 0:
+            lists.append((bonus, self.field_rows[code], bonus, None, None))
+        return sorted((item for item in lists if len(item[1])), key=lambda item: -item[0])
+
+    def remaining_bounds(self, lists):
+        """remaining[i]: cận trên phần điểm đến từ các danh sách i, i+1, ... (chưa duyệt).
+
+        Phần văn bản của một cột còn bị chặn bởi chuẩn L2 của các hệ số chưa duyệt
+        (Cauchy-Schwarz, vector ngành đã chuẩn hoá L2), chặt hơn tổng cận trên
+        từng từ khi hồ sơ chọn nhiều từ.
+        """
+        bounds = np.array([item[0] for item in lists])
+        scales = np.array([item[2] for item in lists])
+        columns = [item[4] for item in lists]
+
+        def suffix(values):
+            return np.append(np.cumsum(values[::-1])[::-1], 0.0)
+
+        remaining = suffix(np.where([key is None for key in columns], bounds, 0.0))
+        for key in TEXT_WEIGHTS:
+            in_column = np.array([column == key for column in columns], dtype=bool)
+            if in_column.any():
+                norm = np.sqrt(suffix(np.where(in_column, scales ** 2, 0.0)))
+                remaining += np.minimum(suffix(np.where(in_column, bounds, 0.0)), norm)
+        return remaining
+
+    def candidates(self, profile, lists, k, threshold_factor):
+        """Chỉ số (tăng dần) các ngành có thể lọt top-k.
+
+        Duyệt các danh sách theo cận trên giảm dần, cộng điểm góp thật vào bộ tích
+        luỹ bắt đầu từ phần tĩnh. Sau mỗi danh sách:
+
+        - θ = điểm thứ k của (tích luỹ - mức trừ học phí) trên các ngành vừa được
+          cộng hoặc còn lại; điểm thứ k của tập con nào cũng là cận dưới của điểm
+          thứ k thật;
+        - ngành có tích luỹ + cận trên các danh sách còn lại < θ không thể lọt top-k
+          và bị loại hẳn.
+
+        Khi số ngành còn lại đủ nhỏ, danh sách kế không được duyệt hết mà chỉ tra
+        các ngành còn lại trong đó (searchsorted), như MaxScore chỉ nhảy tới các
+        tài liệu còn ứng viên.
+        """
+        accumulated = self.static.copy()
+        remaining = self.remaining_bounds(lists)
+        alive = None   # None: chưa loại được ngành nào
+        theta = -np.inf
+        for split in range(len(lists) + 1):
+            if split:
+                touched = lists[split - 1][1] if alive is None else alive
+                if len(touched) >= k:
+                    lower = accumulated[touched]
+                    if profile['financial_influence']:
+                        lower -= self.tuition_penalty[touched]
+                    theta = max(theta, np.partition(lower, -k)[-k] - BOUND_EPSILON)
+            need = theta * threshold_factor - remaining[split] - BOUND_EPSILON
+            if alive is not None:
+                alive = alive[accumulated[alive] >= need]
+            elif need > self.static_min:
+                alive = np.flatnonzero(accumulated >= need)
+            if split == len(lists) or (alive is not None and len(alive) <= k):
+                break
+
+            _, rows, scale, data, _ = lists[split]
+            if alive is None or len(alive) * PROBE_COST > len(rows):
+                accumulated[rows] += scale if data is None else scale * data
+            else:
+                targets = alive.astype(rows.dtype, copy=False)
+                positions = np.minimum(np.searchsorted(rows, targets), len(rows) - 1)
+                found = rows[positions] == targets
+                accumulated[alive[found]] += scale if data is None else scale * data[positions[found]]
+        return np.arange(len(self)) if alive is None else alive
+
+    # --- Top-k ---
+    def recommend_batch(self, profiles, k=10, mode="exact", threshold_factor=None):
+        """Top-k từng hồ sơ, cùng dạng `ScoringEngine.recommend_batch`."""
+        return self.retrieve(profiles, k, mode, threshold_factor)[0]
+
+    def retrieve(self, profiles, k=10, mode="exact", threshold_factor=None):
+        """(top-k từng hồ sơ, số ngành đã chấm đầy đủ cho cả lô)."""
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"mode phải là một trong {RETRIEVAL_MODES}, nhận {mode!r}")
+        if not profiles:
+            return [], 0
+        if mode == "exact" or not 0 < k < len(self):
+            return self.engine.recommend_batch(profiles, k), len(self)
+
+        engine = self.engine
+        queries = engine.vectorize_profiles(profiles)
+        factor = threshold_factor or self.threshold_factor
+        # Hợp ứng viên của cả lô, tăng dần để hoà điểm vẫn xếp theo thứ tự dòng
+        columns = np.unique(np.concatenate([
+            self.candidates(profile, self.posting_lists(profile, queries, row), k, factor)
+            for row, profile in enumerate(profiles)
+        ]))
+        scores = engine.score_batch(profiles, columns=columns, queries=queries)
+        results = [engine._top_k_details(scores, row, k, columns) for row in range(len(profiles))]
+        return results, len(columns)
+
+    # --- Đánh giá ---
+    def evaluate(self, profiles, k=10, threshold_factor=None):
+        """Recall@k của "approximate" so với "exact", tính theo từng hồ sơ."""
+        threshold_factor = threshold_factor or self.threshold_factor
+        if not profiles:
+            return {"k": k, "threshold_factor": threshold_factor, "profiles": 0, "recall_at_k": None}
+
+        recalls, same_order, scored = [], 0, []
+        for profile in profiles:
+            expected = [career for career, _ in self.engine.recommend(profile, k)]
+            results, n_scored = self.retrieve([profile], k, "approximate", threshold_factor)
+            got = [career for career, _ in results[0]]
+            recalls.append(len(set(expected) & set(got)) / max(1, len(expected)))
+            same_order += expected == got
+            scored.append(n_scored)
+        return {
+            "k": k,
+            "threshold_factor": threshold_factor,
+            "n_careers": len(self),
+            "profiles": len(profiles),
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "min_recall_at_k": round(float(np.min(recalls)), 4),
+            "exact_order": round(same_order / len(profiles), 4),
+            "scored_careers_mean": round(float(np.mean(scored)), 1),
+        }
@@ -0,0 +1,264 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from career_index import CareerIndex
+from career_store import CodedColumn
+from metrics import span
+
+# === Weights (giữ nguyên hằng số của save_route) ===
+MAIN_WEIGHT = 0.35
+REMAINING_WEIGHT = 0.65
+
+PF_WEIGHTS = {
+    'mbti_score': 0.2391,
+    'subjects_score': 0.2457,
+    'strengths_score': 0.2609,
+    'interests_score': 0.2543,
+}
+
+FAMILY_BASE = 0.5456
+FAMILY_HIGH_TUITION_PENALTY = 0.2
+FAMILY_ADVICE_BONUS = {
+    'Có': 0.4544,
+    'Có, nhưng không nhiều': 0.303,
+    'Không': 0.2,
+}
+
+FINAL_WEIGHTS = {
+    'PF_score': 0.5702,
+    'family_score': 0.2936,
+    'social_factor_score': 0.1362,
+}
+
+# Cột văn bản -> khoá hồ sơ học sinh tương ứng
+TEXT_COLUMNS = {
+    'mainstrengths': 'MAIN STRENGTHS',
+    'strengths': 'Khả năng và Điểm mạnh',
+    'maininterests': 'MAIN INTERESTEDS',
+    'interests': 'Sở thích và Đam mê',
+}
+
+SCORE_KEYS = (
+    'mbti_score', 'subjects_score', 'strengths_score', 'interests_score',
+    'PF_score', 'family_score', 'social_factor_score', 'final_score',
+)
+
+
+# === Helpers ===
+def social_factor(cagr):
+    return 1 + (cagr / 100) if cagr > 0 else 0
+
+
+# === Scoring engine ===
+class ScoringEngine:
+    """Tính điểm cho toàn bộ bảng ngành bằng phép toán theo cột.
+
+    Mọi thứ không phụ thuộc vào học sinh (TF-IDF đã chuẩn hoá L2 của 4 cột văn
+    bản, chỉ mục bitmask MBTI / tổ hợp môn, cờ học phí cao, điểm xã hội) được
+    dựng một lần: từ DataFrame (`from_dataframe`) hoặc từ snapshot đã biên dịch.
+
+    TF-IDF của ngành chỉ được giữ dạng chỉ mục ngược (`postings`: từ -> ngành,
+    CSR, chỉ số ngành tăng dần trong mỗi dòng), nên cosine của một hồ sơ chỉ duyệt
+    danh sách ngành của các từ hồ sơ có.
+
+    Các hàm chấm nhận thêm `columns` (mảng chỉ số ngành tăng dần) để chỉ chấm một
+    tập ứng viên (xem retrieval.py); giá trị trùng từng bit với khi chấm cả bảng.
+    """
+
+    def __init__(self, vectorizer, careers, fields, postings, index, high_tuition, social_factor_score):
+        self.vectorizer = vectorizer
+        self.careers = careers
+        self.fields = fields
+        self.postings = postings
+        self.index = index
+        self.high_tuition = high_tuition
+        self.social_factor_score = social_factor_score
+
+    @classmethod
+    def from_dataframe(cls, data_backend, tfidf_vectorizer, high_tuition_careers, cagr_dict):
+        """Dựng engine từ bảng ngành đã làm sạch và vectorizer đã fit."""
+        careers = CodedColumn.from_values(data_backend['Ngành'].astype(str).tolist())
+        return cls(
+            vectorizer=tfidf_vectorizer,
+            careers=careers,
+            fields=CodedColumn.from_values(data_backend['Lĩnh vực'].astype(str).tolist()),
+            postings={
+                key: normalize(tfidf_vectorizer.transform(data_backend[col])).T.tocsr()
+                for key, col in TEXT_COLUMNS.items()
+            },
+            index=CareerIndex.from_dataframe(data_backend),
+            high_tuition=data_backend['Ngành'].isin(list(high_tuition_careers)).to_numpy(),
+            social_factor_score=np.array(
+                [social_factor(cagr_dict.get(career, 0)) for career in careers], dtype=float
+            ),
+        )
+
+    def __len__(self):
+        return len(self.careers)
+
+    # --- Thành phần điểm (mỗi hàm trả về ma trận số hồ sơ × số ngành) ---
+    def vectorize(self, selections_list):
+        """Vector TF-IDF đã chuẩn hoá L2 của lựa chọn từng học sinh (rỗng -> vector 0)."""
+        return normalize(self.vectorizer.transform([" ".join(s) for s in selections_list]))
+
+    def similarity(self, key, queries):
+        """Cosine giữa các vector hồ sơ và cả cột `key`."""
+        return (queries @ self.postings[key]).toarray()
+
+    def similarities_at(self, queries, columns):
+        """Cosine của 4 cột văn bản chỉ với các ngành `columns`, bằng một phép nhân thưa.
+
+        Khối hồ sơ (4 × số hồ sơ dòng, mỗi cột văn bản một dải từ riêng) nhân với
+        khối postings chỉ gồm các từ hồ sơ có và các ngành `columns`; `columns` được
+        tra trong danh sách ngành của từng từ bằng searchsorted, không duyệt hết danh
+        sách. Mỗi cosine vẫn cộng các từ theo đúng thứ tự như khi nhân với cả
+        `postings[key]`, nên trùng từng bit với `similarity`.
+        """
+        n = queries[next(iter(TEXT_COLUMNS))].shape[0]
+        data, indices, row_lengths = [], [], []
+        query_data, query_indices, query_indptr = [], [], [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for key in TEXT_COLUMNS:
+            query, postings = queries[key], self.postings[key]
+            terms = np.unique(query.indices)
+            targets = columns.astype(postings.indices.dtype, copy=False)   # searchsorted không phải đổi kiểu
+            for term in terms:
+                start, end = postings.indptr[term], postings.indptr[term + 1]
+                found = np.zeros(len(columns), dtype=bool)
+                if end > start:
+                    rows = postings.indices[start:end]
+                    positions = np.minimum(np.searchsorted(rows, targets), len(rows) - 1)
+                    found = rows[positions] == targets
+                    data.append(postings.data[start:end][positions[found]])
+                indices.append(np.flatnonzero(found))
+                row_lengths.append(len(indices[-1]))
+            query_data.append(query.data)
+            query_indices.append(offset + np.searchsorted(terms, query.indices))
+            query_indptr.append(query_indptr[-1][-1] + query.indptr[1:])
+            offset += len(terms)
+
+        block = sp.csr_matrix(
+            (np.concatenate(data) if data else np.zeros(0), np.concatenate(indices) if indices else np.zeros(0, dtype=int),
+             np.append(0, np.cumsum(row_lengths))),
+            shape=(offset, len(columns)),
+        )
+        profiles_block = sp.csr_matrix(
+            (np.concatenate(query_data), np.concatenate(query_indices), np.concatenate(query_indptr)),
+            shape=(len(TEXT_COLUMNS) * n, offset),
+        )
+        sims = (profiles_block @ block).toarray()
+        return {key: sims[i * n:(i + 1) * n] for i, key in enumerate(TEXT_COLUMNS)}
+
+    def mbti_score(self, mbtis, columns=None):
+        return self.index.mbti_match(mbtis, columns).astype(float)
+
+    def subjects_score(self, subjects_list, columns=None):
+        return self.index.subjects_match(subjects_list, columns).astype(float)
+
+    def family_score(self, financial_influences, family_advices, family_industry_selects, columns=None):
+        fields = self.fields.codes if columns is None else self.fields.codes[columns]
+        high_tuition = self.high_tuition if columns is None else self.high_tuition[columns]
+        financial = np.asarray(financial_influences, dtype=bool)[:, None]
+        bonus = np.array([FAMILY_ADVICE_BONUS.get(a, 0.0) for a in family_advices])[:, None]
+        same_field = self.fields.codes_of(family_industry_selects)[:, None] == fields[None, :]
+
+        score = np.full((len(family_advices), len(fields)), FAMILY_BASE)
+        score -= np.where(financial & high_tuition[None, :], FAMILY_HIGH_TUITION_PENALTY, 0.0)
+        score += np.where(same_field, bonus, 0.0)
+        return score
+
+    # --- Điểm tổng hợp ---
+    def vectorize_profiles(self, profiles):
+        """Vector TF-IDF của 4 cột văn bản cho nhiều hồ sơ (dict khoá -> ma trận thưa).
+
+        Một lần `transform` cho cả 4 cột (4 × số hồ sơ dòng) rồi cắt theo khoá.
+        """
+        with span("vectorize"):
+            vectors = self.vectorize([p[key] for key in TEXT_COLUMNS for p in profiles])
+            n = len(profiles)
+            return {key: vectors[i * n:(i + 1) * n] for i, key in enumerate(TEXT_COLUMNS)}
+
+    def similarities(self, queries, columns=None):
+        """Cosine cho từng cột văn bản (dict khoá -> số hồ sơ × số ngành)."""
+        if columns is not None:
+            return self.similarities_at(queries, columns)
+        return {key: self.similarity(key, queries[key]) for key in TEXT_COLUMNS}
+
+    def score_batch(self, profiles, columns=None, queries=None):
+        """Dict các ma trận điểm (số hồ sơ × số ngành) cho nhiều học sinh cùng lúc.
+
+        `columns`: chỉ chấm các ngành này, cột kết quả theo đúng thứ tự đó;
+        `queries`: vector hồ sơ đã có từ `vectorize_profiles` (khỏi transform lại).
+        """
+        def column(key):
+            return [p[key] for p in profiles]
+
+        if queries is None:
+            queries = self.vectorize_profiles(profiles)
+        sims = self.similarities(queries, columns)
+
+        strengths_score = sims['mainstrengths'] * MAIN_WEIGHT + sims['strengths'] * REMAINING_WEIGHT
+        interests_score = sims['maininterests'] * MAIN_WEIGHT + sims['interests'] * REMAINING_WEIGHT
+        del sims
+        scores = {
+            'mbti_score': self.mbti_score(column('mbti'), columns),
+            'subjects_score': self.subjects_score(column('subjects'), columns),
+            'strengths_score': strengths_score,
+            'interests_score': interests_score,
+        }
+        scores['PF_score'] = (
+            scores['mbti_score'] * PF_WEIGHTS['mbti_score'] +
+            scores['subjects_score'] * PF_WEIGHTS['subjects_score'] +
+            scores['strengths_score'] * PF_WEIGHTS['strengths_score'] +
+            scores['interests_score'] * PF_WEIGHTS['interests_score']
+        )
+        scores['family_score'] = self.family_score(
+            column('financial_influence'), column('family_advice'), column('family_industry_select'), columns
+        )
+        social = self.social_factor_score if columns is None else self.social_factor_score[columns]
+        scores['social_factor_score'] = np.broadcast_to(social, (len(profiles), len(social)))
+        scores['final_score'] = (
+            scores['PF_score'] * FINAL_WEIGHTS['PF_score'] +
+            scores['family_score'] * FINAL_WEIGHTS['family_score'] +
+            scores['social_factor_score'] * FINAL_WEIGHTS['social_factor_score']
+        )
+        return scores
+
+    def score(self, profile):
+        """Dict các mảng điểm (mỗi phần tử ứng với một ngành) cho một học sinh."""
+        return {key: value[0] for key, value in self.score_batch([profile]).items()}
+
+    def top_k(self, final_score, k=10):
+        """Chỉ số k ngành điểm cao nhất; hoà điểm giữ thứ tự dòng như sorted() cũ."""
+        k = min(k, len(final_score))
+        if k == 0:
+            return np.array([], dtype=int)
+        if k < len(final_score):
+            kth = final_score[np.argpartition(-final_score, k - 1)[k - 1]]
+            candidates = np.flatnonzero(final_score >= kth)
+        else:
+            candidates = np.arange(len(final_score))
+        order = np.lexsort((candidates, -final_score[candidates]))
+        return candidates[order[:k]]
+
+    def _top_k_details(self, scores, row, k, columns=None):
+        """Top-k của dòng `row`; với `columns` (tăng dần) vị trí cột được đổi về chỉ số ngành."""
+        careers = self.careers if columns is None else self.careers[columns]
+        return [
+            (careers[i], {key: float(scores[key][row, i]) for key in SCORE_KEYS})
+            for i in self.top_k(scores['final_score'][row], k)
+        ]
+
+    def recommend(self, profile, k=10):
+        """Top-k dạng [(ngành, {tên điểm: giá trị})] như save_route vẫn dùng."""
+        return self.recommend_batch([profile], k)[0]
+
+    def recommend_batch(self, profiles, k=10):
+        """Top-k của từng hồ sơ, cùng thứ tự với `profiles`."""
+        if not profiles:
+            return []
+        with span("score"):
+            scores = self.score_batch(profiles)
+        with span("sort"):
+            return [self._top_k_details(scores, row, k) for row in range(len(profiles))]
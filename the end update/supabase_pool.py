@@ -0,0 +1,50 @@
+"""Client Supabase dùng chung một pool kết nối HTTP.
+
+Mặc định supabase-py tạo httpx.Client không giới hạn, timeout PostgREST 120 giây.
+Khi nhiều thread (gunicorn gthread, xem gunicorn.conf.py) cùng đăng nhập/ghi lúc
+cao điểm, ta muốn:
+
+- giữ kết nối keep-alive tới PostgREST thay vì bắt tay TLS mỗi request;
+- giới hạn số kết nối đồng thời mỗi process (`max_connections`); request vượt quá
+  chờ tối đa `pool_timeout` giây rồi báo lỗi thay vì treo worker;
+- timeout ngắn cho connect/read để một Supabase chậm không giữ hết thread.
+"""
+import os
+
+import httpx
+from supabase import ClientOptions, create_client
+
+SUPABASE_BUSY_ERRORS = (httpx.TimeoutException, httpx.NetworkError)
+
+
+def pool_settings_from_env():
+    return {
+        "max_connections": int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20")),
+        "max_keepalive": int(os.getenv("SUPABASE_MAX_KEEPALIVE", "10")),
+        "keepalive_expiry": float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "30")),
+        "timeout": float(os.getenv("SUPABASE_TIMEOUT", "5")),
+        "connect_timeout": float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "3")),
+        "pool_timeout": float(os.getenv("SUPABASE_POOL_TIMEOUT", "2")),
+    }
+
+
+def pooled_http_client(max_connections=20, max_keepalive=10, keepalive_expiry=30.0,
+                       timeout=5.0, connect_timeout=3.0, pool_timeout=2.0):
+    """httpx.Client dùng chung (thread-safe) với giới hạn pool và timeout."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout),
+        follow_redirects=True,
+    )
+
+
+def create_pooled_client(url, key, **settings):
+    """Giống supabase.create_client nhưng mọi lệnh PostgREST đi qua pool ở trên."""
+    settings = {**pool_settings_from_env(), **settings}
+    http = pooled_http_client(**settings)
+    options = ClientOptions(httpx_client=http, postgrest_client_timeout=settings["timeout"])
+    return create_client(url, key, options=options)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Các module của app nằm phẳng trong thư mục cha (chạy: cd "the end update" && python -m pytest)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,97 @@
+"""Mô hình dự báo rẻ (forecast_models.py), mốc cắt backtest và chọn mô hình (backtesting.py)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtesting import rolling_origins, select_models
+from forecasting import load_model_selection
+from forecast_models import BASELINE_MODELS, FLAT_MODELS, SMOOTHING_GRID, _holt, exp_smoothing, linear_trend, naive
+
+YEARS = np.arange(2019, 2025)
+TARGETS = np.array([2025, 2026, 2027, 2028])
+
+
+# === Mô hình ===
+def test_naive_repeats_last_value():
+    assert naive(YEARS, [5.0, 7.0, 9.0, 4.0, 6.0, 8.0], TARGETS).tolist() == [8.0] * 4
+
+
+def test_linear_trend_extrapolates_exact_line():
+    y = 100 + 12.5 * (YEARS - 2019)
+    np.testing.assert_allclose(linear_trend(YEARS, y, TARGETS), 100 + 12.5 * (TARGETS - 2019))
+
+
+def test_linear_trend_least_squares_fit():
+    y = np.array([10.0, 14.0, 11.0, 17.0, 15.0, 20.0])
+    slope, intercept = np.polyfit(YEARS.astype(float), y, 1)
+    np.testing.assert_allclose(linear_trend(YEARS, y, TARGETS), intercept + slope * TARGETS)
+
+
+@pytest.mark.parametrize("model", [linear_trend, exp_smoothing])
+def test_single_point_falls_back_to_naive(model):
+    assert model(YEARS[:1], [42.0], TARGETS).tolist() == [42.0] * 4
+
+
+def test_holt_follows_exact_trend():
+    y = 50 - 4.0 * (YEARS - 2019)
+    np.testing.assert_allclose(exp_smoothing(YEARS, y, TARGETS), 50 - 4.0 * (TARGETS - 2019))
+
+
+def test_holt_uses_grid_parameters_with_lowest_sse():
+    y = np.array([120.0, 135.0, 128.0, 150.0, 149.0, 170.0])
+    fits = [_holt(y, alpha, beta) for alpha in SMOOTHING_GRID for beta in SMOOTHING_GRID]
+    level, trend, _ = min(fits, key=lambda fit: fit[2])
+    np.testing.assert_allclose(exp_smoothing(YEARS, y, TARGETS), level + trend * (TARGETS - 2024))
+
+
+def test_models_are_deterministic():
+    y = np.array([3.0, 8.0, 6.0, 9.0, 12.0, 11.0])
+    for model in BASELINE_MODELS.values():
+        assert np.array_equal(model(YEARS, y, TARGETS), model(YEARS, y, TARGETS))
+
+
+# === Mốc cắt ===
+def test_rolling_origins_cover_every_cut():
+    origins = rolling_origins(6, min_train=3, horizon=2)
+    assert [(n, test.tolist()) for n, test in origins] == [(3, [3, 4]), (4, [4, 5]), (5, [5])]
+
+
+def test_rolling_origins_need_one_training_point():
+    assert [n for n, _ in rolling_origins(3, min_train=0, horizon=1)] == [1, 2]
+    assert rolling_origins(3, min_train=3, horizon=4) == []
+
+
+# === Chọn mô hình ===
+def summary(rows):
+    return pd.DataFrame(rows, columns=["nganh_nghe", "model", "mae", "fit_seconds"])
+
+
+def test_select_models_never_selects_flat_model():
+    selection = select_models(summary([
+        ("A", "prophet", 10.0, 1.0),
+        ("A", "naive", 5.0, 0.0001),
+        ("A", "linear", 10.4, 0.001),
+        ("A", "exp_smoothing", 12.0, 0.002),
+    ]))
+    row = selection.iloc[0]
+    assert row["best_model"] == "naive"          # vẫn báo cáo mô hình sai số thấp nhất
+    assert row["selected_model"] == "linear"     # nhanh nhất trong 5% của mô hình không phẳng tốt nhất
+    assert row["selected_mae"] == 10.4
+    assert row["prophet_mae"] == 10.0
+
+
+def test_select_models_skips_industry_with_only_flat_models():
+    selection = select_models(summary([
+        ("A", "naive", 5.0, 0.0001),
+        ("B", "naive", 5.0, 0.0001),
+        ("B", "exp_smoothing", 7.0, 0.002),
+    ]))
+    assert selection["nganh_nghe"].tolist() == ["B"]
+    assert not selection["selected_model"].isin(FLAT_MODELS).any()
+
+
+def test_load_model_selection_drops_flat_models(tmp_path, capsys):
+    path = tmp_path / "selection.json"
+    pd.DataFrame({"nganh_nghe": ["A", "B"], "selected_model": ["naive", "linear"]}).to_json(path, orient="records")
+    assert load_model_selection(path) == {"B": "linear"}
+    assert "A" in capsys.readouterr().out
@@ -0,0 +1,141 @@
+"""Đọc dữ liệu tuyển dụng theo khối: dạng rộng / dài, kiểm tra và spool theo ngành."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import SeriesSpool, iter_chunks, melt_chunk, read_table, year_of
+
+WIDE = pd.DataFrame({
+    "nganh_nghe": ["CNTT", "Kế toán", "CNTT", " Kế toán ", None],
+    "tinh_thanh": ["Hà Nội", "Hà Nội", "TP.HCM", "TP.HCM", "Huế"],
+    2019: [100, 50, 40, 10, 7],
+    "2020": [110.0, np.nan, 60.0, np.nan, 7],
+    "2021.0": [120, 70, 80, 5, 7],
+})
+
+
+def series_dict(spool):
+    return {nganh: (data["ds"].dt.year.tolist(), data["y"].tolist()) for nganh, data in spool.series()}
+
+
+def long_from(frame):
+    return frame.melt(id_vars=["nganh_nghe", "tinh_thanh"], var_name="nam", value_name="so_luong_tuyen_dung")
+
+
+# === Melt + kiểm tra ===
+def test_year_of():
+    assert [year_of(c) for c in (2019, "2019", 2019.0, " 2020 ", "nganh_nghe", 1800)] == [
+        2019, 2019, 2019, 2020, None, None]
+
+
+def test_wide_chunk_melts_year_columns():
+    long = melt_chunk(WIDE)
+    assert list(long.columns) == ["nganh_nghe", "nam", "y"]
+    assert sorted(long["nam"].unique()) == [2019, 2020, 2021]
+    assert set(long["nganh_nghe"]) == {"CNTT", "Kế toán"}          # bỏ dòng không tên ngành, strip tên
+    assert long["y"].isna().sum() == 2
+
+
+def test_long_chunk_accepts_value_column_aliases():
+    long = melt_chunk(long_from(WIDE).rename(columns={"so_luong_tuyen_dung": "y"}))
+    assert sorted(long["nam"].unique()) == [2019, 2020, 2021]
+    assert long["y"].sum() == pytest.approx(WIDE.loc[WIDE["nganh_nghe"].notna(), [2019, "2020", "2021.0"]].sum().sum())
+
+
+@pytest.mark.parametrize("frame, message", [
+    (pd.DataFrame({"nganh": ["A"], 2019: [1]}), "Thiếu cột 'nganh_nghe'"),
+    (pd.DataFrame({"nganh_nghe": ["A"], "tinh": ["X"]}), "Không tìm thấy cột năm"),
+    (pd.DataFrame({"nganh_nghe": ["A"], "nam": [2019]}), "Bảng dạng dài cần"),
+    (pd.DataFrame({"nganh_nghe": ["A"], "nam": ["năm 2019"], "y": [1]}), "Năm không hợp lệ"),
+    (pd.DataFrame({"nganh_nghe": ["A"], 2019: ["nhiều"]}), "không phải số"),
+    (pd.DataFrame({"nganh_nghe": ["A"], 2019: [-3]}), "âm"),
+])
+def test_invalid_chunks_are_rejected(frame, message):
+    with pytest.raises(ValueError, match=message):
+        melt_chunk(frame)
+
+
+# === Đọc nguồn ===
+@pytest.mark.parametrize("suffix", [".csv", ".xlsx", ".parquet"])
+def test_iter_chunks_reads_every_format(tmp_path, suffix):
+    path = tmp_path / f"input{suffix}"
+    frame = WIDE.rename(columns=str)
+    if suffix == ".csv":
+        frame.to_csv(path, index=False)
+    elif suffix == ".xlsx":
+        frame.to_excel(path, index=False)
+    else:
+        pytest.importorskip("pyarrow")
+        frame.to_parquet(path, index=False)
+    chunks = list(iter_chunks(path, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    names = pd.concat(chunks)["nganh_nghe"]
+    assert names.iloc[:4].tolist() == WIDE["nganh_nghe"].iloc[:4].tolist()
+    assert pd.isna(names.iloc[4])
+
+
+def test_unsupported_format(tmp_path):
+    with pytest.raises(ValueError, match="Định dạng không hỗ trợ"):
+        list(iter_chunks(tmp_path / "input.txt"))
+
+
+def test_read_table_json_records(tmp_path):
+    path = tmp_path / "table.json"
+    pd.DataFrame({"nganh_nghe": ["A"], "2025": [1.5]}).to_json(path, orient="records")
+    assert read_table(path).to_dict("records") == [{"nganh_nghe": "A", "2025": 1.5}]
+
+
+# === Spool theo ngành ===
+EXPECTED = {
+    "CNTT": ([2019, 2020, 2021], [140.0, 170.0, 200.0]),
+    "Kế toán": ([2019, 2020, 2021], [60.0, np.nan, 75.0]),
+}
+
+
+def assert_series(actual):
+    assert list(actual) == list(EXPECTED)
+    for nganh, (years, values) in EXPECTED.items():
+        assert actual[nganh][0] == years
+        np.testing.assert_array_equal(actual[nganh][1], values)
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 100])
+def test_spool_sums_provinces_across_chunks(tmp_path, chunksize):
+    path = tmp_path / "wide.csv"
+    WIDE.to_csv(path, index=False)
+    with SeriesSpool() as spool:
+        spool.ingest(path, chunksize=chunksize)
+        assert_series(series_dict(spool))
+        assert spool.rows == 12 and len(spool) == 2
+        assert spool.last_values["CNTT"] == 200.0
+
+
+def test_spool_long_input_matches_wide(tmp_path):
+    path = tmp_path / "long.csv"
+    long_from(WIDE).sample(frac=1, random_state=0).to_csv(path, index=False)
+    with SeriesSpool() as spool:
+        spool.ingest(path, chunksize=4)
+        actual = series_dict(spool)
+    assert sorted(actual) == sorted(EXPECTED)
+    for nganh, (years, values) in EXPECTED.items():
+        assert actual[nganh][0] == years
+        np.testing.assert_array_equal(actual[nganh][1], values)
+
+
+def test_spool_writes_one_file_per_industry(tmp_path):
+    spool = SeriesSpool(tmp_path / "spool")
+    spool.append(melt_chunk(WIDE))
+    spool.append(melt_chunk(WIDE.iloc[:1]))
+    assert [path.name for path in spool.files.values()] == ["000000.bin", "000001.bin"]
+    assert sorted(p.name for p in (tmp_path / "spool").iterdir()) == ["000000.bin", "000001.bin"]
+    assert spool.counts().to_dict() == {"CNTT": 6, "Kế toán": 3}
+    spool.close()
+    assert (tmp_path / "spool").exists()                  # thư mục do người gọi cấp: không xoá
+
+
+def test_owned_spool_dir_is_removed():
+    with SeriesSpool() as spool:
+        spool.append(melt_chunk(WIDE))
+        spool_dir = spool.spool_dir
+        assert spool_dir.exists()
+    assert not spool_dir.exists()
@@ -0,0 +1,124 @@
+"""RecommendationCache: LRU, TTL và xoá theo phiên bản dữ liệu tham chiếu."""
+import pytest
+
+import result_cache
+from result_cache import RecommendationCache, profile_key
+
+PROFILE = {
+    'mbti': "INTJ",
+    'subjects': ["A00", "D01"],
+    'mainstrengths': {"Logic"},
+    'strengths': {"Logic", "Toán"},
+    'maininterests': set(),
+    'interests': {"Đọc sách"},
+    'financial_influence': False,
+    'family_advice': "Không",
+    'family_industry_select': "",
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    return clock
+
+
+class Versions:
+    """Phiên bản hiện hành, như reference_data.current().version."""
+
+    def __init__(self, version):
+        self.version = version
+
+    def __call__(self):
+        return self.version
+
+
+# === Khoá ===
+def test_profile_key_ignores_selection_order():
+    reordered = {**PROFILE, 'subjects': ["D01", "A00", "A00"], 'strengths': {"Toán", "Logic"}}
+    assert profile_key(reordered) == profile_key(PROFILE)
+    assert profile_key(PROFILE, k=5) != profile_key(PROFILE)
+    assert profile_key({**PROFILE, 'mbti': "ENTP"}) != profile_key(PROFILE)
+
+
+# === LRU ===
+def test_lru_evicts_least_recently_used():
+    cache = RecommendationCache(maxsize=2)
+    cache.put("v1", "a", 1)
+    cache.put("v1", "b", 2)
+    assert cache.get("v1", "a") == 1          # "a" mới dùng -> "b" bị đẩy ra trước
+    cache.put("v1", "c", 3)
+    assert cache.get("v1", "b") is None
+    assert (cache.get("v1", "a"), cache.get("v1", "c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_size_disables_cache():
+    cache = RecommendationCache(maxsize=0)
+    cache.put("v1", "a", 1)
+    assert cache.get("v1", "a") is None
+    assert cache.stats()["size"] == 0
+
+
+# === TTL ===
+def test_entries_expire_after_ttl(clock):
+    cache = RecommendationCache(ttl=10)
+    cache.put("v1", "a", 1)
+    clock.now += 9.9
+    assert cache.get("v1", "a") == 1
+    clock.now += 0.2
+    assert cache.get("v1", "a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 0)
+
+
+# === Phiên bản ===
+def test_version_change_drops_old_entries():
+    versions = Versions("v1")
+    cache = RecommendationCache(current_version=versions)
+    cache.put("v1", "a", 1)
+    versions.version = "v2"
+    assert cache.get("v2", "a") is None
+    cache.put("v2", "a", 2)
+    assert cache.get("v2", "a") == 2
+    stats = cache.stats()
+    assert (stats["version"], stats["size"], stats["invalidations"]) == ("v2", 1, 1)
+
+
+def test_request_on_old_snapshot_does_not_clear_new_version():
+    versions = Versions("v1")
+    cache = RecommendationCache(current_version=versions)
+    versions.version = "v2"
+    cache.put("v2", "a", 2)
+
+    # Request bắt đầu trước reload vẫn dùng snapshot v1
+    assert cache.get("v1", "a") is None
+    cache.put("v1", "a", 1)
+    assert cache.get("v2", "a") == 2
+    stats = cache.stats()
+    assert (stats["stale_puts"], stats["invalidations"], stats["size"]) == (1, 0, 1)
+
+
+def test_reverted_data_reuses_version():
+    versions = Versions("v1")
+    cache = RecommendationCache(current_version=versions)
+    versions.version = "v2"
+    versions.version = "v1"                   # file nguồn quay về nội dung cũ -> cùng phiên bản
+    cache.put("v1", "a", 1)
+    assert cache.get("v1", "a") == 1
+
+
+def test_without_current_version_entries_are_kept_per_version():
+    cache = RecommendationCache()
+    cache.put("v1", "a", 1)
+    cache.put("v2", "a", 2)
+    assert (cache.get("v1", "a"), cache.get("v2", "a")) == (1, 2)
@@ -0,0 +1,164 @@
+"""ScoringEngine (chấm theo ma trận) phải cho đúng kết quả của vòng lặp save_route cũ.
+
+Vòng lặp tham chiếu bên dưới chép công thức save_route trước khi tách sang
+scoring.py: duyệt từng ngành, cosine qua sklearn, sorted() ổn định. Chạy trên
+các file Excel đi kèm repo, so khớp tuyệt đối thứ tự top-10 và từng điểm thành phần.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+
+from data_snapshot import (
+    SOURCE_FILES, load_cagr_dict, load_or_build_snapshot, prepare_backend, resolve_sources,
+)
+from ingestion import read_table
+from scoring import SCORE_KEYS
+
+N_PROFILES = 60
+FAMILY_ADVICES = ["", "Có", "Có, nhưng không nhiều", "Không"]
+
+
+# === Vòng lặp tham chiếu (save_route cũ) ===
+class LoopRecommender:
+    def __init__(self, sources):
+        self.data_backend, self.vectorizer = prepare_backend(read_table(sources["backend"]))
+        self.high_tuition_careers = read_table(sources["family"])['Top học phí'].dropna().unique()
+        self.cagr_dict = load_cagr_dict(read_table(sources["forecasting"]))
+        self.rows = [self.data_backend.iloc[i] for i in range(len(self.data_backend))]
+        self.row_vectors = {
+            col: [self.vectorizer.transform([row[col]]) for row in self.rows]
+            for col in ('MAIN STRENGTHS', 'Khả năng và Điểm mạnh', 'MAIN INTERESTEDS', 'Sở thích và Đam mê')
+        }
+
+    def cosine(self, selections, col, i):
+        if not selections:
+            return 0.0
+        vector = self.vectorizer.transform([" ".join(selections)])
+        return cosine_similarity(vector, self.row_vectors[col][i]).flatten()[0]
+
+    def recommend(self, profile, k=10):
+        mbti, subjects = profile['mbti'], profile['subjects']
+        suggestions = []
+        for i, row in enumerate(self.rows):
+            backend_mbtis = {m.strip().upper() for m in str(row['MBTI']).split(',')}
+            mbti_score = 1.0 if mbti and mbti in backend_mbtis else 0.0
+
+            backend_subjects = {subject.strip().upper() for subject in str(row['Tổ hợp môn']).split(',')}
+            subjects_score = 1.0 if any(sub in backend_subjects for sub in subjects) else 0.0
+
+            strengths_score = (
+                self.cosine(profile['mainstrengths'], 'MAIN STRENGTHS', i) * 0.35 +
+                self.cosine(profile['strengths'], 'Khả năng và Điểm mạnh', i) * 0.65
+            )
+            interests_score = (
+                self.cosine(profile['maininterests'], 'MAIN INTERESTEDS', i) * 0.35 +
+                self.cosine(profile['interests'], 'Sở thích và Đam mê', i) * 0.65
+            )
+            PF_score = (
+                mbti_score * 0.2391 +
+                subjects_score * 0.2457 +
+                strengths_score * 0.2609 +
+                interests_score * 0.2543
+            )
+
+            family_score = 0.5456
+            if profile['financial_influence'] and row['Ngành'] in self.high_tuition_careers:
+                family_score -= 0.2
+            same_field = row['Lĩnh vực'] == profile['family_industry_select']
+            if profile['family_advice'] == 'Có' and same_field:
+                family_score += 0.4544
+            elif profile['family_advice'] == 'Có, nhưng không nhiều' and same_field:
+                family_score += 0.303
+            elif profile['family_advice'] == 'Không' and same_field:
+                family_score += 0.2
+
+            cagr = self.cagr_dict.get(row['Ngành'], 0)
+            social_factor_score = 1 + (cagr / 100) if cagr > 0 else 0
+
+            final_score = PF_score * 0.5702 + family_score * 0.2936 + social_factor_score * 0.1362
+            suggestions.append((row['Ngành'], {
+                'mbti_score': mbti_score,
+                'subjects_score': subjects_score,
+                'strengths_score': strengths_score,
+                'interests_score': interests_score,
+                'PF_score': PF_score,
+                'family_score': family_score,
+                'social_factor_score': social_factor_score,
+                'final_score': final_score,
+            }))
+        return sorted(suggestions, key=lambda x: x[1]['final_score'], reverse=True)[:k]
+
+
+# === Fixtures ===
+@pytest.fixture(scope="module")
+def sources():
+    return resolve_sources(SOURCE_FILES)
+
+
+@pytest.fixture(scope="module")
+def snapshot(sources, tmp_path_factory):
+    return load_or_build_snapshot(sources, tmp_path_factory.mktemp("snapshot"))
+
+
+@pytest.fixture(scope="module")
+def loop(sources):
+    return LoopRecommender(sources)
+
+
+@pytest.fixture(scope="module")
+def profiles(sources):
+    """Hồ sơ ngẫu nhiên (cố định seed) lấy từ các lựa chọn của trang /home."""
+    options = pd.read_excel(sources["frontend"])
+    def choices(col):
+        return sorted(options[col].dropna().astype(str).unique())
+    mbtis, subjects = choices('MBTI'), choices('Tổ hợp môn')
+    strengths, interests = choices('Khả năng và Điểm mạnh'), choices('Sở thích và Đam mê')
+    fields = choices('Lĩnh vực')
+
+    rng = random.Random(0)
+    result = []
+    for _ in range(N_PROFILES):
+        family_has_industry = rng.random() < 0.5
+        family_advice = rng.choice(FAMILY_ADVICES) or ("Có" if family_has_industry else "Không")
+        result.append({
+            'mbti': rng.choice(mbtis + [""]).strip().upper(),
+            'subjects': [s.strip().upper() for s in rng.sample(subjects, rng.randint(0, 3))],
+            'mainstrengths': set(rng.sample(strengths, rng.randint(0, 2))),
+            'strengths': set(rng.sample(strengths, rng.randint(0, 4))),
+            'maininterests': set(rng.sample(interests, rng.randint(0, 2))),
+            'interests': set(rng.sample(interests, rng.randint(0, 4))),
+            'financial_influence': rng.random() < 0.5,
+            'family_advice': family_advice,
+            'family_industry_select': rng.choice(fields) if family_has_industry else "",
+        })
+    return result
+
+
+# === Tests ===
+def test_recommend_matches_loop(snapshot, loop, profiles):
+    for profile in profiles:
+        assert snapshot.engine.recommend(profile) == loop.recommend(profile)
+
+
+def test_recommend_batch_matches_single(snapshot, profiles):
+    engine = snapshot.engine
+    assert engine.recommend_batch(profiles) == [engine.recommend(profile) for profile in profiles]
+
+
+def test_score_columns_match_full_table(snapshot, profiles):
+    engine = snapshot.engine
+    columns = np.arange(1, len(engine), 3)
+    full, subset = engine.score_batch(profiles), engine.score_batch(profiles, columns=columns)
+    for key in SCORE_KEYS:
+        assert np.array_equal(full[key][:, columns], subset[key])
+
+
+def test_maxscore_retrieval_matches_exact(snapshot, profiles):
+    retriever = snapshot.retriever
+    expected = snapshot.engine.recommend_batch(profiles)
+    assert retriever.recommend_batch(profiles, mode="approximate") == expected
+    assert [retriever.recommend_batch([p], mode="approximate")[0] for p in profiles] == expected
+    assert retriever.evaluate(profiles)["recall_at_k"] == 1.0
@@ -0,0 +1,89 @@
+"""Tra cứu trường theo ngành: tách tên trường, gộp trùng và phân trang."""
+import pandas as pd
+import pytest
+
+from universities import LEVEL_COLUMNS, UniversityDirectory, compile_universities, split_schools
+
+
+@pytest.fixture
+def directory():
+    table = pd.DataFrame({
+        "STT": [1, 2, 3],
+        "Ngành": ["Kế toán", "Luật", "Y khoa"],
+        LEVEL_COLUMNS["university"]: [
+            "ĐH Kinh tế Quốc dân, Học viện Tài chính (AOF, Hà Nội),ĐH Thương mại",
+            "ĐH Luật Hà Nội,  đh kinh tế   quốc dân ",
+            float("nan"),
+        ],
+        LEVEL_COLUMNS["college"]: ["CĐ Kinh tế, CĐ Kinh tế", "", "CĐ Y tế Hà Nội"],
+        "Học phí": ["20-30 triệu", None, 45],
+    })
+    arrays, manifest = compile_universities(table)
+    return UniversityDirectory.from_arrays(arrays, manifest)
+
+
+# === Tách tên ===
+def test_split_only_top_level_commas():
+    assert split_schools("A, B (x, y),C\n") == ["A", "B (x, y)", "C"]
+    assert split_schools("ĐH (Cơ sở (1, 2), HN), ĐH B") == ["ĐH (Cơ sở (1, 2), HN)", "ĐH B"]
+
+
+def test_split_normalises_whitespace_and_skips_empty():
+    assert split_schools("  A   B ,, ,C  ") == ["A B", "C"]
+    assert split_schools("") == []
+    assert split_schools(float("nan")) == []
+    assert split_schools("Lẻ ngoặc ), D") == ["Lẻ ngoặc )", "D"]
+
+
+# === Gộp trùng ===
+def test_same_school_is_stored_once(directory):
+    # "đh kinh tế   quốc dân" trùng "ĐH Kinh tế Quốc dân" (không phân biệt hoa thường, khoảng trắng)
+    assert len(directory) == 6
+    assert directory.names.count("ĐH Kinh tế Quốc dân") == 1
+    assert directory.query(q="kinh tế quốc dân")["items"] == [
+        {"name": "ĐH Kinh tế Quốc dân", "level": "university", "majors": ["Kế toán", "Luật"]},
+    ]
+
+
+def test_for_major_keeps_ranking_and_dedupes(directory):
+    assert directory.for_major("Kế toán") == {
+        "universities": ["ĐH Kinh tế Quốc dân", "Học viện Tài chính (AOF, Hà Nội)", "ĐH Thương mại"],
+        "colleges": ["CĐ Kinh tế"],
+        "Học phí": "20-30 triệu",
+    }
+    assert directory.for_major("Luật") == {"universities": ["ĐH Luật Hà Nội", "ĐH Kinh tế Quốc dân"], "colleges": []}
+    assert directory.for_major("Y khoa") == {"universities": [], "colleges": ["CĐ Y tế Hà Nội"], "Học phí": 45}
+    assert directory.for_major("Không có") == {"universities": [], "colleges": []}
+
+
+def test_same_name_at_different_levels_is_two_schools():
+    table = pd.DataFrame({
+        "Ngành": ["A"],
+        LEVEL_COLUMNS["university"]: ["Trường X"],
+        LEVEL_COLUMNS["college"]: ["Trường X"],
+    })
+    directory = UniversityDirectory.from_arrays(*compile_universities(table))
+    assert directory.for_major("A") == {"universities": ["Trường X"], "colleges": ["Trường X"]}
+
+
+# === Truy vấn / phân trang ===
+def test_query_filters_by_majors_in_ranking_order(directory):
+    result = directory.query(majors=["Luật", "Kế toán"], level="university")
+    assert [item["name"] for item in result["items"]] == [
+        "ĐH Luật Hà Nội", "ĐH Kinh tế Quốc dân", "Học viện Tài chính (AOF, Hà Nội)", "ĐH Thương mại",
+    ]
+    assert directory.query(majors=["Kế toán"], level="college")["total"] == 1
+
+
+def test_query_paginates(directory):
+    pages = [directory.query(page=page, per_page=4) for page in (1, 2, 3)]
+    assert [len(p["items"]) for p in pages] == [4, 2, 0]
+    assert {(p["total"], p["pages"], p["per_page"]) for p in pages} == {(6, 2, 4)}
+    names = [item["name"] for p in pages for item in p["items"]]
+    assert names == directory.names
+
+
+def test_empty_directory():
+    directory = UniversityDirectory.empty()
+    assert directory.query() == {"items": [], "page": 1, "per_page": 20, "total": 0, "pages": 0}
+    assert directory.for_major("Kế toán") == {"universities": [], "colleges": []}
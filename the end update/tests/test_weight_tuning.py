@@ -0,0 +1,153 @@
+"""Chấm lại theo bộ trọng số (weight_tuning.py) và endpoint /recommend/what-if.
+
+Trọng số mặc định phải cho đúng top-10 như /save; profile / trọng số không hợp
+lệ bị từ chối.
+"""
+import importlib
+import json
+import os
+import random
+
+import pytest
+
+from weight_tuning import DEFAULT_PROFILE, DEFAULT_WEIGHTS, ComponentScores, WeightProfiles, merge_weights
+
+N_PROFILES = 20
+
+
+# === Fixtures ===
+@pytest.fixture(scope="module")
+def app_module():
+    # Không kết nối Supabase, không chạy thread theo dõi file nguồn; session cần SECRET_KEY
+    os.environ.update(SUPABASE_URL="", SUPABASE_KEY="", REFERENCE_DATA_POLL_SECONDS="0", SECRET_KEY="test")
+    return importlib.import_module("app")
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "hs-001"
+    return client
+
+
+@pytest.fixture(scope="module")
+def payloads(app_module):
+    """Payload FE ngẫu nhiên (cố định seed) từ các lựa chọn của trang /home."""
+    options = app_module.reference_data.current().options
+    rng = random.Random(1)
+    result = []
+    for _ in range(N_PROFILES):
+        family_has_industry = rng.random() < 0.5
+        result.append({
+            "mbti": rng.choice(options["mbti_options"] + [""]),
+            "subjects": rng.sample(options["subject_combination_options"], rng.randint(0, 3)),
+            "mainstrengths": rng.sample(options["strengths_options"], rng.randint(0, 2)),
+            "strengths": rng.sample(options["strengths_options"], rng.randint(0, 4)),
+            "maininterests": rng.sample(options["interests_options"], rng.randint(0, 2)),
+            "interests": rng.sample(options["interests_options"], rng.randint(0, 4)),
+            "financial_influence": rng.choice(["yes", "no"]),
+            "family_has_industry": "yes" if family_has_industry else "no",
+            "family_advice": rng.choice(["", "Có", "Có, nhưng không nhiều", "Không"]),
+            "family_industry_select": rng.choice(options["fields"]) if family_has_industry else "",
+        })
+    return result
+
+
+# === Trọng số mặc định = /save ===
+def test_default_weights_match_engine(app_module, payloads):
+    engine = app_module.reference_data.current().engine
+    for payload in payloads:
+        profile = app_module.parse_profile(payload)
+        expected = engine.recommend(profile)
+        actual = ComponentScores.compute(engine, profile).rescore(DEFAULT_WEIGHTS, k=10)
+        assert [career for career, _ in actual] == [career for career, _ in expected]
+        for (_, details), (_, expected_details) in zip(actual, expected):
+            assert details == pytest.approx(expected_details, rel=1e-12, abs=1e-12)
+
+
+def test_default_what_if_matches_save(client, payloads):
+    for payload in payloads:
+        saved = client.post("/save", json=payload)
+        what_if = client.post("/recommend/what-if", json=payload)
+        assert saved.status_code == what_if.status_code == 200
+        [result] = what_if.get_json()["results"]
+        assert result["weight_profile"] == DEFAULT_PROFILE
+        assert result["top_10"] == saved.get_json()
+
+
+def test_empty_override_matches_base_profile(client, payloads):
+    response = client.post("/recommend/what-if", json={**payloads[0], "weights": {}})
+    default, custom = response.get_json()["results"]
+    assert custom["weight_profile"] == "custom"
+    assert custom["top_10"] == default["top_10"]
+
+
+def test_components_are_cached_per_profile(client, payloads):
+    payload = {**payloads[1], "weight_profiles": ["no_family"]}
+    first = client.post("/recommend/what-if", json=payload).get_json()
+    second = client.post("/recommend/what-if", json={**payload, "k": 5}).get_json()
+    assert second["cached"] is True
+    assert second["results"][0]["top_10"] == first["results"][0]["top_10"][:5]
+
+
+# === Trọng số không hợp lệ ===
+@pytest.mark.parametrize("overrides, message", [
+    ({"unknown": 1}, "Trọng số không hợp lệ"),
+    ({"pf_weights": 0.5}, "phải là object"),
+    ({"pf_weights": {"typo_score": 0.5}}, "Khoá không hợp lệ"),
+    ({"main_weight": -0.1}, "không âm"),
+    ({"main_weight": True}, "không âm"),
+    ({"main_weight": "0.3"}, "không âm"),
+    ({"final_weights": {"PF_score": float("nan")}}, "không âm"),
+    ({"family_advice_bonus": {"Có": float("inf")}}, "không âm"),
+])
+def test_merge_weights_rejects_invalid(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        merge_weights(overrides)
+
+
+def test_merge_weights_keeps_base_untouched():
+    merged = merge_weights({"pf_weights": {"mbti_score": 0}, "family_advice_bonus": {"Khác": 0.1}})
+    assert merged["pf_weights"]["mbti_score"] == 0.0
+    assert merged["family_advice_bonus"]["Khác"] == 0.1
+    assert DEFAULT_WEIGHTS["pf_weights"]["mbti_score"] != 0.0
+    assert "Khác" not in DEFAULT_WEIGHTS["family_advice_bonus"]
+
+
+def test_weight_profiles_file(tmp_path):
+    path = tmp_path / "profiles.json"
+    profiles = WeightProfiles(path)
+    assert list(profiles.all()) == [DEFAULT_PROFILE]               # chưa có file: chỉ mặc định
+
+    path.write_text(json.dumps({"mbti_only": {"pf_weights": {"mbti_score": 1.0}}}), encoding="utf-8")
+    assert profiles.get("mbti_only")["pf_weights"]["mbti_score"] == 1.0
+
+    path.write_text(json.dumps({"broken": {"main_weight": -1}}), encoding="utf-8")
+    os.utime(path, ns=(1, 1))                                       # mtime chắc chắn đổi
+    with pytest.raises(ValueError):
+        profiles.all()
+
+
+@pytest.mark.parametrize("body, message", [
+    ([], "hồ sơ phải là object"),
+    ({"mbti": 1}, "'mbti' phải là chuỗi"),
+    ({"weight_profiles": "default"}, "danh sách tên"),
+    ({"weight_profiles": ["missing"]}, "Không có profile trọng số"),
+    ({"weights": []}, "'weights' phải là object"),
+    ({"weights": {"main_weight": -1}}, "không âm"),
+    ({"k": 0}, "k phải là số nguyên"),
+    ({"k": "nhiều"}, "k phải là số nguyên"),
+])
+def test_what_if_rejects_invalid_request(client, body, message):
+    response = client.post("/recommend/what-if", json=body)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+def test_what_if_reports_broken_profile_file(app_module, client, tmp_path, monkeypatch):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps({"broken": {"pf_weights": {"typo_score": 1}}}), encoding="utf-8")
+    monkeypatch.setattr(app_module, "weight_profiles", WeightProfiles(path))
+    assert client.post("/recommend/what-if", json={}).status_code == 500
+    assert client.get("/recommend/weight-profiles").status_code == 500
@@ -0,0 +1,220 @@
+"""SupabaseWriteQueue: gom dòng, backoff, dead-letter, thứ tự ghi và spool."""
+import json
+import os
+
+import pytest
+
+from benchmarks.supabase_stub import SupabaseStub
+from write_queue import SupabaseWriteQueue
+
+
+class Busy(Exception):
+    """Lỗi tạm thời (như SUPABASE_BUSY_ERRORS)."""
+
+
+class FlakyStub(SupabaseStub):
+    """Stub ném lỗi theo bảng; `bad_keys` chỉ làm hỏng các dòng có chat_id đó."""
+
+    def __init__(self):
+        super().__init__()
+        self.errors = {}          # bảng -> exception cho mọi lệnh upsert
+        self.bad_keys = set()
+        self.upserts = []         # (bảng, số dòng) của mọi lệnh upsert
+
+    def _execute(self, query):
+        if query.op == "upsert":
+            self.upserts.append((query.table, len(query.payload)))
+            if query.table in self.errors:
+                raise self.errors[query.table]
+            if any(row["chat_id"] in self.bad_keys for row in query.payload):
+                raise ValueError("invalid row")
+        return super()._execute(query)
+
+
+@pytest.fixture
+def stub():
+    return FlakyStub()
+
+
+def make_queue(client, spool_dir, **kwargs):
+    kwargs.setdefault("fsync", False)
+    return SupabaseWriteQueue(client, spool_dir, transient_errors=(Busy,), **kwargs)
+
+
+def spool_files(spool_dir):
+    return sorted(p.name for p in spool_dir.glob("writes-*.jsonl"))
+
+
+# === Gom dòng ===
+def test_coalesces_rows_with_same_key(stub, tmp_path):
+    queue = make_queue(stub, tmp_path)
+    for mbti in ("INTJ", "ENTP", "ISFJ"):
+        queue.enqueue("UserProfile", {"chat_id": "1", "MBTI": mbti})
+    queue.enqueue("UserProfile", {"chat_id": "2", "MBTI": "INFP"})
+    queue.enqueue("Top10Major", {"chat_id": "1", "Top_1": "A: 90%"})
+
+    assert queue.flush() == 3
+    assert sorted(stub.upserts) == [("Top10Major", 1), ("UserProfile", 2)]
+    assert stub.tables["UserProfile"]["1"]["MBTI"] == "ISFJ"
+    metrics = queue.metrics()
+    assert (metrics["enqueued"], metrics["coalesced"], metrics["written"], metrics["depth"]) == (5, 2, 3, 0)
+
+
+def test_batch_size_limits_rows_per_upsert(stub, tmp_path):
+    queue = make_queue(stub, tmp_path, batch_size=2)
+    for i in range(5):
+        queue.enqueue("UserProfile", {"chat_id": str(i)})
+    while queue.flush():
+        pass
+    assert stub.upserts == [("UserProfile", 2), ("UserProfile", 2), ("UserProfile", 1)]
+
+
+# === Backoff ===
+def test_transient_error_backs_off_per_table(stub, tmp_path):
+    queue = make_queue(stub, tmp_path, base_backoff=30, max_backoff=100)
+    stub.errors["Top10Major"] = Busy("timeout")
+    queue.enqueue("UserProfile", {"chat_id": "1"})
+    queue.enqueue("Top10Major", {"chat_id": "1"})
+
+    assert queue.flush() == 1                      # UserProfile vẫn ghi được
+    assert queue.metrics()["backoff_by_table"] == {"Top10Major": 30}
+    assert queue.flush() == 0                      # Top10Major đang chờ backoff
+    assert stub.upserts.count(("Top10Major", 1)) == 1
+
+    queue._retry_at["Top10Major"] = 0.0            # hết thời gian chờ
+    queue.flush()
+    assert queue.metrics()["backoff_by_table"] == {"Top10Major": 60}
+
+    del stub.errors["Top10Major"]
+    queue._retry_at["Top10Major"] = 0.0
+    assert queue.flush() == 1
+    metrics = queue.metrics()
+    assert (metrics["backoff_by_table"], metrics["depth"], metrics["dead_lettered"]) == ({}, 0, 0)
+
+
+def test_transient_errors_never_dead_letter(stub, tmp_path):
+    queue = make_queue(stub, tmp_path, base_backoff=0.0, max_batch_attempts=2)
+    stub.errors["UserProfile"] = Busy("timeout")
+    queue.enqueue("UserProfile", {"chat_id": "1"})
+    for _ in range(5):
+        queue._retry_at.clear()
+        queue.flush()
+    assert queue.metrics()["depth"] == 1
+    assert queue.dead_lettered == 0
+
+
+# === Dead-letter ===
+def test_bad_row_is_dead_lettered_after_max_attempts(stub, tmp_path):
+    queue = make_queue(stub, tmp_path, base_backoff=0.0, max_batch_attempts=2)
+    stub.bad_keys.add("bad")
+    queue.enqueue("UserProfile", {"chat_id": "ok", "MBTI": "INTJ"})
+    queue.enqueue("UserProfile", {"chat_id": "bad", "MBTI": "ENTP"})
+
+    assert queue.flush() == 0                      # lần 1: lỗi cả lô, chờ thử lại
+    queue._retry_at.clear()
+    assert queue.flush() == 2                      # lần 2: thử từng dòng
+    assert "ok" in stub.tables["UserProfile"]
+    assert "bad" not in stub.tables["UserProfile"]
+
+    records = [json.loads(line) for line in queue.dead_letter_path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["table"], r["row"]["chat_id"], r["attempts"]) for r in records] == [("UserProfile", "bad", 3)]
+    metrics = queue.metrics()
+    assert (metrics["depth"], metrics["dead_lettered"], metrics["dead_letter_total"]) == (0, 1, 1)
+    assert metrics["recent_dead_letters"][0]["key"] == "bad"
+
+
+# === Thứ tự ghi ===
+def test_saved_at_is_strictly_increasing(tmp_path):
+    queue = make_queue(None, tmp_path)
+    for i in range(100):
+        queue.enqueue("UserProfile", {"chat_id": str(i)})
+    stamps = [entry["row"]["saved_at"] for entry in queue._pending.values()]
+    assert stamps == sorted(set(stamps))
+
+
+def test_older_batch_from_other_worker_does_not_overwrite(stub, tmp_path):
+    first = make_queue(stub, tmp_path / "worker-1")
+    second = make_queue(stub, tmp_path / "worker-2")
+    first.enqueue("UserProfile", {"chat_id": "1", "MBTI": "OLD"})
+    second.enqueue("UserProfile", {"chat_id": "1", "MBTI": "NEW"})
+    second.flush()
+    first.flush()                                  # lô cũ tới sau
+    assert stub.tables["UserProfile"]["1"]["MBTI"] == "NEW"
+
+
+def test_version_column_can_be_disabled(stub, tmp_path):
+    queue = make_queue(stub, tmp_path, version_column=None)
+    queue.enqueue("UserProfile", {"chat_id": "1"})
+    queue.flush()
+    assert stub.tables["UserProfile"]["1"] == {"chat_id": "1"}
+
+
+# === Spool ===
+def test_spool_holds_pending_rows_and_is_removed_when_drained(stub, tmp_path):
+    queue = make_queue(None, tmp_path)
+    queue.enqueue("UserProfile", {"chat_id": "1"})
+    queue.enqueue("UserProfile", {"chat_id": "1", "MBTI": "INTJ"})
+    assert spool_files(tmp_path) == [f"writes-{os.getpid()}-0.jsonl"]
+
+    queue.client = stub
+    queue.flush()
+    assert spool_files(tmp_path) == []
+
+
+def test_spool_compacts_only_past_threshold(stub, tmp_path):
+    queue = make_queue(None, tmp_path, batch_size=1, spool_compact_bytes=10**6)
+    for i in range(3):
+        queue.enqueue("UserProfile", {"chat_id": str(i)})
+    queue.client = stub
+    queue.flush()                                  # còn 2 dòng chờ, dưới ngưỡng: không viết lại
+    assert spool_files(tmp_path) == [f"writes-{os.getpid()}-0.jsonl"]
+    assert len((tmp_path / f"writes-{os.getpid()}-0.jsonl").read_text().splitlines()) == 3
+
+    queue.spool_compact_bytes = 1
+    queue.flush()                                  # còn 1 dòng: thu gọn sang segment mới
+    [segment] = spool_files(tmp_path)
+    assert [json.loads(line)["row"]["chat_id"] for line in (tmp_path / segment).read_text().splitlines()] == ["2"]
+
+
+def test_replay_adopts_spool_of_stopped_process(stub, tmp_path):
+    queue = make_queue(None, tmp_path)
+    queue.enqueue("UserProfile", {"chat_id": "1", "MBTI": "INTJ"})
+    enqueued_at = queue._pending[("UserProfile", "1")]["enqueued_at"]
+    queue.enqueue("UserProfile", {"chat_id": "1", "MBTI": "ENTP"})
+    queue.stop()
+
+    replayed = make_queue(stub, tmp_path)
+    entry = replayed._pending[("UserProfile", "1")]
+    assert entry["row"]["MBTI"] == "ENTP"
+    assert entry["enqueued_at"] == enqueued_at     # độ trễ không bị đặt lại khi khởi động
+    replayed.enqueue("Top10Major", {"chat_id": "1"})
+    assert replayed._pending[("Top10Major", "1")]["row"]["saved_at"] > entry["row"]["saved_at"]
+
+    while replayed.flush():
+        pass
+    assert stub.tables["UserProfile"]["1"]["MBTI"] == "ENTP"
+    assert spool_files(tmp_path) == []
+
+
+def test_replay_keeps_newest_row_across_files(tmp_path):
+    dead_pid = 2**22 + 12345                       # vượt pid_max mặc định: không process nào sống
+    records = [
+        (f"writes-{dead_pid}-0.jsonl", {"chat_id": "1", "MBTI": "NEW", "saved_at": 20}, 5.0),
+        (f"writes-{dead_pid}.jsonl", {"chat_id": "1", "MBTI": "OLD", "saved_at": 10}, 3.0),
+    ]
+    for name, row, enqueued_at in records:
+        line = json.dumps({"table": "UserProfile", "row": row, "enqueued_at": enqueued_at})
+        (tmp_path / name).write_text(line + "\n{dòng ghi dở", encoding="utf-8")
+
+    queue = make_queue(None, tmp_path)
+    entry = queue._pending[("UserProfile", "1")]
+    assert (entry["row"]["MBTI"], entry["enqueued_at"]) == ("NEW", 3.0)
+    assert not any(name.startswith(f"writes-{dead_pid}") for name in spool_files(tmp_path))
+
+
+def test_replay_skips_spool_of_live_process(tmp_path):
+    live = tmp_path / f"writes-{os.getppid()}-0.jsonl"
+    live.write_text(json.dumps({"table": "UserProfile", "row": {"chat_id": "1"}}) + "\n", encoding="utf-8")
+    queue = make_queue(None, tmp_path)
+    assert queue.metrics()["depth"] == 0
+    assert live.exists()
@@ -0,0 +1,176 @@
+"""Tra cứu trường theo ngành (Truong_theo_nganh.xlsx).
+
+Mỗi ô "Top trường ..." là một chuỗi tên trường cách nhau bởi dấu phẩy, theo thứ
+tự xếp hạng. Khi biên dịch snapshot (data_snapshot.py), bảng được chuyển thành:
+
+- `school_names` / `school_levels`: danh sách trường duy nhất và bậc đào tạo;
+- `school_majors` + CSR (`school_major_indptr`, `school_major_indices`): ngành ->
+  chỉ số trường, giữ thứ tự xếp hạng.
+
+`UniversityDirectory` dựng từ các mảng đó một dict ngành -> trường (O(1) mỗi
+ngành, dùng khi gắn trường vào top-10) và chỉ mục ngược trường -> ngành cho
+endpoint `/universities`.
+"""
+import numpy as np
+
+MAJOR_COLUMN = "Ngành"
+# Cột Excel -> bậc đào tạo
+LEVEL_COLUMNS = {
+    "university": "Top trường đại học",
+    "college": "Top trường Trường cao đẳng",
+}
+SCHOOL_LEVELS = tuple(LEVEL_COLUMNS)
+IGNORED_COLUMNS = {"STT", MAJOR_COLUMN, *LEVEL_COLUMNS.values()}
+
+
+def split_schools(value):
+    """'A, B (x, y),C\\n' -> ['A', 'B (x, y)', 'C']; không tách dấu phẩy trong ngoặc."""
+    if not isinstance(value, str):
+        return []
+    names, current, depth = [], [], 0
+    for char in value:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(0, depth - 1)
+        if char == "," and depth == 0:
+            names.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    names.append("".join(current))
+    return [" ".join(name.split()) for name in names if name.strip()]
+
+
+def school_key(name):
+    """Khoá so trùng tên trường (không phân biệt hoa thường, khoảng trắng)."""
+    return " ".join(name.split()).casefold()
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    return value if isinstance(value, (bool, int, float, str)) else str(value)
+
+
+def compile_universities(universities_data):
+    """DataFrame Truong_theo_nganh -> (arrays, manifest) để ghi vào snapshot."""
+    keys, names, levels = {}, [], []
+    majors, indptr, indices = [], [0], []
+    extra_columns = [c for c in universities_data.columns if c not in IGNORED_COLUMNS]
+    extras = {}
+
+    for row in universities_data.to_dict("records"):
+        major = str(row[MAJOR_COLUMN]).strip()
+        school_ids = []
+        for level, col in LEVEL_COLUMNS.items():
+            for name in split_schools(row.get(col)):
+                key = (level, school_key(name))
+                if key not in keys:
+                    keys[key] = len(names)
+                    names.append(name)
+                    levels.append(SCHOOL_LEVELS.index(level))
+                if keys[key] not in school_ids:
+                    school_ids.append(keys[key])
+        majors.append(major)
+        indices.extend(school_ids)
+        indptr.append(len(indices))
+        info = {col: row[col] for col in extra_columns if row[col] is not None and row[col] == row[col]}   # bỏ None/NaN
+        if info:
+            extras[major] = {col: _json_value(value) for col, value in info.items()}
+
+    arrays = {
+        "school_names": np.array(names, dtype=str),
+        "school_levels": np.array(levels, dtype=np.uint8),
+        "school_majors": np.array(majors, dtype=str),
+        "school_major_indptr": np.array(indptr, dtype=np.int32),
+        "school_major_indices": np.array(indices, dtype=np.int32),
+    }
+    return arrays, {"school_levels": list(SCHOOL_LEVELS), "school_extra": extras}
+
+
+class UniversityDirectory:
+    """Ngành -> trường (theo bậc, giữ thứ tự xếp hạng) và truy vấn có lọc / phân trang."""
+
+    def __init__(self, names, levels, majors, indptr, indices, level_names=SCHOOL_LEVELS, extras=None):
+        self.names = [str(name) for name in names]
+        self.levels = [level_names[code] for code in levels]
+        self.extras = extras or {}
+        self.by_major = {}
+        self.majors_of = [[] for _ in self.names]
+        for m, major in enumerate(majors):
+            major = str(major)
+            ids = [int(i) for i in indices[indptr[m]:indptr[m + 1]]]
+            self.by_major[major] = ids
+            for i in ids:
+                self.majors_of[i].append(major)
+        self._search_keys = [school_key(name) for name in self.names]
+        self._schools = {major: self._group(major, ids) for major, ids in self.by_major.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays, manifest):
+        if "school_names" not in arrays:
+            return cls.empty()
+        return cls(
+            arrays["school_names"], arrays["school_levels"], arrays["school_majors"],
+            arrays["school_major_indptr"], arrays["school_major_indices"],
+            level_names=tuple(manifest.get("school_levels", SCHOOL_LEVELS)),
+            extras=manifest.get("school_extra"),
+        )
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [0], [])
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def majors(self):
+        return list(self.by_major)
+
+    def _group(self, major, ids):
+        schools = {"universities": [], "colleges": []}
+        for i in ids:
+            schools["universities" if self.levels[i] == "university" else "colleges"].append(self.names[i])
+        schools.update(self.extras.get(major, {}))
+        return schools
+
+    def for_major(self, major):
+        """{"universities": [...], "colleges": [...]} của một ngành (dựng sẵn, O(1)); không có -> rỗng."""
+        return self._schools.get(major) or {"universities": [], "colleges": []}
+
+    def query(self, majors=None, level=None, q=None, page=1, per_page=20):
+        """Danh sách trường lọc theo ngành / bậc / chuỗi tên, phân trang.
+
+        Lọc theo ngành giữ thứ tự xếp hạng của ngành đầu tiên; không lọc ngành thì theo
+        thứ tự xuất hiện trong file.
+        """
+        if majors:
+            ids, seen = [], set()
+            for major in majors:
+                for i in self.by_major.get(major, ()):
+                    if i not in seen:
+                        seen.add(i)
+                        ids.append(i)
+        else:
+            ids = range(len(self.names))
+        if level:
+            ids = [i for i in ids if self.levels[i] == level]
+        if q:
+            needle = school_key(q)
+            ids = [i for i in ids if needle in self._search_keys[i]]
+        ids = list(ids)
+
+        start = (page - 1) * per_page
+        items = [
+            {"name": self.names[i], "level": self.levels[i], "majors": self.majors_of[i]}
+            for i in ids[start:start + per_page]
+        ]
+        return {
+            "items": items,
+            "page": page,
+            "per_page": per_page,
+            "total": len(ids),
+            "pages": (len(ids) + per_page - 1) // per_page,
+        }
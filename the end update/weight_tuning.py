@@ -0,0 +1,183 @@
+"""Chấm lại top-k với bộ trọng số khác mà không tính lại độ tương đồng.
+
+final_score của `ScoringEngine` là tổ hợp tuyến tính của các thành phần không
+phụ thuộc trọng số (COMPONENTS):
+
+    mbti, subjects, 4 cosine văn bản, hằng số 1 (điểm gia đình cơ bản),
+    cờ học phí cao × ảnh hưởng tài chính, cờ cùng lĩnh vực gia đình, điểm xã hội
+
+nên với một học sinh, `ComponentScores.compute` (số ngành × len(COMPONENTS)) được
+tính một lần; mỗi bộ trọng số (`weight_vector`) chỉ còn một phép nhân ma trận × vector
+và một lần chọn top-k. Trọng số mặc định là các hằng số của scoring.py; điểm có
+thể lệch vài ulp so với `ScoringEngine` vì thứ tự cộng khác.
+
+Bộ trọng số đặt tên (weight profile) cấu hình phía server trong một file JSON
+(`WeightProfiles`): mỗi profile chỉ ghi phần khác với mặc định, ví dụ
+
+    {"interest_focus": {"pf_weights": {"interests_score": 0.4, "mbti_score": 0.1}}}
+"""
+import copy
+import json
+import os
+import threading
+
+import numpy as np
+
+from metrics import span
+from scoring import (
+    FAMILY_ADVICE_BONUS, FAMILY_BASE, FAMILY_HIGH_TUITION_PENALTY, FINAL_WEIGHTS,
+    MAIN_WEIGHT, PF_WEIGHTS, REMAINING_WEIGHT, SCORE_KEYS, TEXT_COLUMNS,
+)
+
+COMPONENTS = (
+    'mbti', 'subjects', 'mainstrengths', 'strengths', 'maininterests', 'interests',
+    'family_base', 'high_tuition', 'same_field', 'social',
+)
+_C = {name: j for j, name in enumerate(COMPONENTS)}
+
+DEFAULT_WEIGHTS = {
+    'main_weight': MAIN_WEIGHT,
+    'remaining_weight': REMAINING_WEIGHT,
+    'pf_weights': dict(PF_WEIGHTS),
+    'final_weights': dict(FINAL_WEIGHTS),
+    'family_base': FAMILY_BASE,
+    'family_high_tuition_penalty': FAMILY_HIGH_TUITION_PENALTY,
+    'family_advice_bonus': dict(FAMILY_ADVICE_BONUS),
+}
+DEFAULT_PROFILE = "default"
+
+
+# === Trọng số ===
+def merge_weights(overrides, base=DEFAULT_WEIGHTS):
+    """`base` ghi đè bởi `overrides` (cùng cấu trúc, có thể thiếu khoá); kiểm tra kiểu / dấu."""
+    weights = copy.deepcopy(base)
+    for key, value in (overrides or {}).items():
+        if key not in weights:
+            raise ValueError(f"Trọng số không hợp lệ: {key!r} (chỉ nhận {sorted(weights)})")
+        if isinstance(weights[key], dict):
+            if not isinstance(value, dict):
+                raise ValueError(f"'{key}' phải là object")
+            unknown = set(value) - set(weights[key]) if key != 'family_advice_bonus' else set()
+            if unknown:
+                raise ValueError(f"Khoá không hợp lệ trong '{key}': {sorted(unknown)}")
+            for name, number in value.items():
+                weights[key][name] = _weight(f"{key}.{name}", number)
+        else:
+            weights[key] = _weight(key, value)
+    return weights
+
+
+def _weight(name, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value < 0:
+        raise ValueError(f"'{name}' phải là số không âm, nhận {value!r}")
+    return float(value)
+
+
+def weight_vector(weights, family_advice):
+    """Vector trọng số theo COMPONENTS cho một học sinh (thưởng gia đình theo lựa chọn của học sinh)."""
+    pf, final = weights['pf_weights'], weights['final_weights']
+    w_pf, w_family = final['PF_score'], final['family_score']
+    w = np.empty(len(COMPONENTS))
+    w[_C['mbti']] = w_pf * pf['mbti_score']
+    w[_C['subjects']] = w_pf * pf['subjects_score']
+    w[_C['mainstrengths']] = w_pf * pf['strengths_score'] * weights['main_weight']
+    w[_C['strengths']] = w_pf * pf['strengths_score'] * weights['remaining_weight']
+    w[_C['maininterests']] = w_pf * pf['interests_score'] * weights['main_weight']
+    w[_C['interests']] = w_pf * pf['interests_score'] * weights['remaining_weight']
+    w[_C['family_base']] = w_family * weights['family_base']
+    w[_C['high_tuition']] = -w_family * weights['family_high_tuition_penalty']
+    w[_C['same_field']] = w_family * weights['family_advice_bonus'].get(family_advice, 0.0)
+    w[_C['social']] = final['social_factor_score']
+    return w
+
+
+class WeightProfiles:
+    """Bộ trọng số đặt tên từ file JSON; đọc lại khi file đổi (so mtime mỗi lần tra)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._profiles = {DEFAULT_PROFILE: DEFAULT_WEIGHTS}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        profiles = {DEFAULT_PROFILE: DEFAULT_WEIGHTS}
+        if mtime is not None:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+            for name, overrides in raw.items():
+                profiles[name] = merge_weights(overrides)
+        self._profiles, self._mtime = profiles, mtime
+
+    def all(self):
+        with self._lock:
+            self._refresh()
+            return dict(self._profiles)
+
+    def get(self, name):
+        """Trọng số của profile `name`; KeyError nếu không có."""
+        return self.all()[name]
+
+
+# === Thành phần điểm ===
+class ComponentScores:
+    """Ma trận thành phần (số ngành × COMPONENTS) của một học sinh, chấm lại được với mọi bộ trọng số."""
+
+    def __init__(self, engine, matrix, family_advice):
+        self.engine = engine
+        self.matrix = matrix
+        self.family_advice = family_advice
+
+    @classmethod
+    def compute(cls, engine, profile):
+        with span("components"):
+            sims = engine.similarities(engine.vectorize_profiles([profile]))
+            matrix = np.empty((len(engine), len(COMPONENTS)))
+            matrix[:, _C['mbti']] = engine.mbti_score([profile['mbti']])[0]
+            matrix[:, _C['subjects']] = engine.subjects_score([profile['subjects']])[0]
+            for key in TEXT_COLUMNS:
+                matrix[:, _C[key]] = sims[key][0]
+            matrix[:, _C['family_base']] = 1.0
+            matrix[:, _C['high_tuition']] = bool(profile['financial_influence']) & np.asarray(engine.high_tuition)
+            field_code = engine.fields.code_of(profile['family_industry_select'])
+            matrix[:, _C['same_field']] = engine.fields.codes == field_code
+            matrix[:, _C['social']] = engine.social_factor_score
+        return cls(engine, matrix, profile['family_advice'])
+
+    def final_score(self, weights):
+        return self.matrix @ weight_vector(weights, self.family_advice)
+
+    def details(self, rows, weights, final):
+        """Điểm thành phần (như SCORE_KEYS) theo `weights` của các ngành `rows`, tính theo cột."""
+        m = self.matrix[rows]
+        pf = weights['pf_weights']
+        main, remaining = weights['main_weight'], weights['remaining_weight']
+        scores = {
+            'mbti_score': m[:, _C['mbti']],
+            'subjects_score': m[:, _C['subjects']],
+            'strengths_score': m[:, _C['mainstrengths']] * main + m[:, _C['strengths']] * remaining,
+            'interests_score': m[:, _C['maininterests']] * main + m[:, _C['interests']] * remaining,
+        }
+        scores['PF_score'] = sum(scores[key] * pf[key] for key in PF_WEIGHTS)
+        scores['family_score'] = (
+            weights['family_base']
+            - weights['family_high_tuition_penalty'] * m[:, _C['high_tuition']]
+            + weights['family_advice_bonus'].get(self.family_advice, 0.0) * m[:, _C['same_field']]
+        )
+        scores['social_factor_score'] = m[:, _C['social']]
+        scores['final_score'] = final[rows]
+        columns = [scores[key].tolist() for key in SCORE_KEYS]
+        return [dict(zip(SCORE_KEYS, values)) for values in zip(*columns)]
+
+    def rescore(self, weights, k=10):
+        """Top-k [(ngành, {tên điểm: giá trị})] theo `weights`; hoà điểm giữ thứ tự dòng."""
+        with span("rescore"):
+            final = self.final_score(weights)
+            top = self.engine.top_k(final, k)
+            return list(zip((self.engine.careers[i] for i in top), self.details(top, weights, final)))
@@ -0,0 +1,445 @@
+"""Hàng đợi ghi nền (write-behind) cho UserProfile và Top10Major trên Supabase.
+
+`/save` chỉ cần đưa dòng cần ghi vào hàng đợi rồi trả kết quả ngay; một thread
+nền gom các dòng lại và upsert theo lô:
+
+- Lưu nhiều lần cho cùng (bảng, chat_id) trước khi kịp ghi -> chỉ ghi bản cuối.
+- Mỗi bảng một lệnh upsert cho cả lô và được ghi / thử lại độc lập: lỗi ở
+  Top10Major không chặn UserProfile. Bảng lỗi chờ backoff luỹ thừa riêng.
+- Lô lỗi `max_batch_attempts` lần (lỗi không thuộc `transient_errors`) được
+  thử lại từng dòng; dòng vẫn lỗi chuyển sang file dead-letter
+  (`deadletter-<pid>.jsonl`) kèm lỗi, để một dòng hỏng không giữ cả hàng đợi.
+  Lỗi tạm thời (timeout, mất kết nối) chỉ backoff, không bao giờ dead-letter.
+- Mọi dòng chưa ghi được nằm trong spool: các segment JSONL
+  `writes-<pid>-<n>.jsonl`, mỗi lần lưu nối một dòng và fsync (ngoài
+  `self._lock`, nên /save khác không phải chờ đĩa). Spool chỉ được thu gọn khi
+  hàng đợi rỗng (xoá hết segment) hoặc khi đã nối quá `spool_compact_bytes`
+  (ghi các dòng còn chờ sang segment mới rồi xoá segment cũ). Process khởi
+  động sau sẽ nhận lại spool của process đã tắt và ghi tiếp, nên tắt process
+  không làm mất dữ liệu.
+- Thứ tự ghi: mỗi dòng mang cột `saved_at` (micro giây, tăng ngặt trong một
+  process). Mỗi worker gunicorn có hàng đợi riêng nên lô cũ của worker này có
+  thể tới Supabase sau lô mới hơn của worker khác (hoặc của spool được nhận
+  lại). Trigger trong `ORDERING_MIGRATION_SQL` bỏ qua mọi update có `saved_at`
+  cũ hơn bản đang lưu, nên upsert theo lô thành upsert có điều kiện: chỉ bản
+  lưu sau cùng thắng.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from metrics import span
+
+logger = logging.getLogger("universitychoose.write_queue")
+
+# Bảng -> cột khoá dùng cho on_conflict
+TABLE_KEYS = {
+    "UserProfile": "chat_id",
+    "Top10Major": "chat_id",
+}
+
+# Cột thứ tự ghi; chạy SQL dưới đây một lần trên Supabase trước khi bật (VERSION_COLUMN)
+VERSION_COLUMN = "saved_at"
+ORDERING_MIGRATION_SQL = """
+alter table "UserProfile" add column if not exists saved_at bigint;
+alter table "Top10Major" add column if not exists saved_at bigint;
+
+create or replace function keep_newest_saved_at() returns trigger
+language plpgsql as $$
+begin
+  -- Upsert (on conflict do update) mang saved_at cũ hơn bản đang lưu: bỏ qua dòng này
+  if new.saved_at < old.saved_at then
+    return null;
+  end if;
+  return new;
+end $$;
+
+drop trigger if exists keep_newest_saved_at on "UserProfile";
+create trigger keep_newest_saved_at before update on "UserProfile"
+  for each row execute function keep_newest_saved_at();
+drop trigger if exists keep_newest_saved_at on "Top10Major";
+create trigger keep_newest_saved_at before update on "Top10Major"
+  for each row execute function keep_newest_saved_at();
+"""
+
+
+class SupabaseWriteQueue:
+    def __init__(self, client, spool_dir, batch_size=200, flush_interval=0.2,
+                 max_backoff=60.0, base_backoff=0.5, max_batch_attempts=3,
+                 transient_errors=(), dead_letter_history=20, version_column=VERSION_COLUMN,
+                 spool_compact_bytes=1 << 20, fsync=True):
+        self.client = client
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.dead_letter_path = self.spool_dir / f"deadletter-{os.getpid()}.jsonl"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_batch_attempts = max_batch_attempts
+        self.transient_errors = tuple(transient_errors)
+        self.version_column = version_column   # None: không gắn saved_at (ghi đè theo thứ tự tới)
+        self.spool_compact_bytes = spool_compact_bytes
+        self.fsync = fsync
+
+        self._pending = {}               # (table, key) -> {"row", "enqueued_at", "attempts"}
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()   # segment spool đang mở; giữ sau self._lock nếu cần cả hai
+        self._segment = 0                     # số thứ tự segment đang nối
+        self._segment_file = None
+        self._spool_bytes = 0                 # số byte đã nối từ lần thu gọn trước
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._backoff = {}               # bảng -> backoff hiện tại (giây)
+        self._retry_at = {}              # bảng -> thời điểm được thử lại
+        self._last_saved_at = 0
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.recent_dead_letters = deque(maxlen=dead_letter_history)
+        self.last_error = None
+        self.last_flush_at = None
+
+        self._replay_spool()
+
+    # --- Public API ---
+    def enqueue(self, table, row):
+        """Đưa một dòng vào hàng đợi; dòng cũ cùng khoá chưa ghi sẽ bị thay thế."""
+        key = (table, row[TABLE_KEYS[table]])
+        with self._lock:
+            if self.version_column:
+                row = {**row, self.version_column: self._next_saved_at()}
+            entry = {"row": row, "enqueued_at": time.time(), "attempts": 0}
+            previous = self._pending.get(key)
+            if previous is not None:
+                entry["enqueued_at"] = previous["enqueued_at"]   # độ trễ tính từ lần chờ đầu tiên
+                self.coalesced += 1
+            self._pending[key] = entry
+            self.enqueued += 1
+        self._append_spool(table, entry)
+        self._wakeup.set()
+
+    def _next_saved_at(self):
+        """Micro giây hiện tại, tăng ngặt trong process (gọi khi đang giữ self._lock)."""
+        self._last_saved_at = max(time.time_ns() // 1000, self._last_saved_at + 1)
+        return self._last_saved_at
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="supabase-write-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Dừng thread nền sau khi cố ghi nốt; phần còn lại vẫn nằm trong spool."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._spool_lock:
+            self._close_segment()
+
+    def flush(self):
+        """Ghi một lô mỗi bảng (bỏ qua bảng đang backoff); dùng trong thread nền và khi tắt.
+
+        Trả về số dòng đã xử lý xong: đã ghi hoặc đã chuyển sang dead-letter.
+        """
+        if self.client is None:
+            return 0
+        now = time.time()
+        with self._lock:
+            batches = {}
+            for key, entry in self._pending.items():
+                table = key[0]
+                if self._retry_at.get(table, 0.0) > now:
+                    continue
+                items = batches.setdefault(table, [])
+                if len(items) < self.batch_size:
+                    items.append((key, entry))
+
+        done = []
+        for table, items in batches.items():
+            done.extend(self._flush_table(table, items))
+        if not done:
+            return 0
+
+        with self._lock:
+            for key, entry in done:
+                # Chỉ xoá nếu không có bản mới hơn được đưa vào trong lúc đang ghi
+                if self._pending.get(key) is entry:
+                    del self._pending[key]
+        self._maybe_compact_spool()
+        self.last_flush_at = time.time()
+        return len(done)
+
+    def _flush_table(self, table, items):
+        """Upsert lô của một bảng; trả về các (khoá, entry) đã xong."""
+        try:
+            self._upsert(table, [entry["row"] for _, entry in items])
+        except Exception as e:
+            for _, entry in items:
+                entry["attempts"] += 1
+            if self._is_transient(e) or max(entry["attempts"] for _, entry in items) < self.max_batch_attempts:
+                self._retry_later(table, e)
+                return []
+            return self._flush_rows(table, items)
+        self._recovered(table)
+        self.written += len(items)
+        self.batches += 1
+        return items
+
+    def _flush_rows(self, table, items):
+        """Thử từng dòng của lô đã lỗi nhiều lần; dòng vẫn lỗi (không tạm thời) -> dead-letter."""
+        done = []
+        for key, entry in items:
+            try:
+                self._upsert(table, [entry["row"]])
+            except Exception as e:
+                if self._is_transient(e):
+                    self._retry_later(table, e)
+                    return done
+                self._dead_letter(table, entry, e)
+            else:
+                self.written += 1
+            done.append((key, entry))
+        self._recovered(table)
+        return done
+
+    def _upsert(self, table, rows):
+        with span("supabase_write", table=table):
+            self.client.table(table).upsert(rows, on_conflict=TABLE_KEYS[table]).execute()
+
+    def _is_transient(self, error):
+        return isinstance(error, self.transient_errors)
+
+    def _retry_later(self, table, error):
+        self.failures += 1
+        self.last_error = f"{table}: {type(error).__name__}: {error}"
+        backoff = min(self.max_backoff, max(self.base_backoff, self._backoff.get(table, 0.0) * 2))
+        self._backoff[table] = backoff
+        self._retry_at[table] = time.time() + backoff
+        logger.warning("write queue flush (%s); thử lại sau %.1fs", self.last_error, backoff)
+
+    def _recovered(self, table):
+        self._backoff.pop(table, None)
+        self._retry_at.pop(table, None)
+
+    def _dead_letter(self, table, entry, error):
+        self.failures += 1
+        self.dead_lettered += 1
+        self.last_error = f"{table}: {type(error).__name__}: {error}"
+        record = {
+            "table": table,
+            "row": entry["row"],
+            "error": f"{type(error).__name__}: {error}",
+            "attempts": entry["attempts"] + 1,
+            "dead_lettered_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._spool_lock, open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        key = entry["row"].get(TABLE_KEYS[table])
+        self.recent_dead_letters.append({"table": table, "key": key, "error": record["error"],
+                                         "dead_lettered_at": record["dead_lettered_at"]})
+        logger.error("write queue: chuyển %s %s sang dead-letter (%s)", table, key, record["error"])
+
+    def metrics(self):
+        with self._lock:
+            depth = len(self._pending)
+            oldest = min((e["enqueued_at"] for e in self._pending.values()), default=None)
+        backoff = dict(self._backoff)
+        return {
+            "depth": depth,
+            "lag_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "backoff_seconds": max(backoff.values(), default=0.0),
+            "backoff_by_table": backoff,
+            "dead_lettered": self.dead_lettered,
+            "dead_letter_total": self.dead_letter_total(),
+            "recent_dead_letters": list(self.recent_dead_letters),
+            "last_error": self.last_error,
+            "last_flush_at": self.last_flush_at,
+        }
+
+    def dead_letter_total(self):
+        """Số dòng dead-letter trong mọi file của thư mục spool (mọi process, mọi lần chạy)."""
+        total = 0
+        for path in self.spool_dir.glob("deadletter-*.jsonl"):
+            try:
+                with open(path, "rb") as f:
+                    total += sum(1 for _ in f)
+            except OSError:
+                continue
+        return total
+
+    # --- Background worker ---
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self._retry_delay())   # hết backoff của một bảng -> thử lại
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            time.sleep(self.flush_interval)   # gom thêm các lần lưu đến sát nhau
+            while self.flush() and not self._stop.is_set():
+                pass
+        # Tắt process: cố ghi nốt một lượt, phần lỗi vẫn nằm trong spool
+        while self.flush():
+            pass
+
+    def _retry_delay(self):
+        """Số giây tới lần thử lại sớm nhất của bảng đang backoff; None nếu không có."""
+        now = time.time()
+        upcoming = [at for at in self._retry_at.values() if at > now]
+        return min(upcoming) - now if upcoming else None
+
+    # --- Spool ---
+    @staticmethod
+    def _spool_record(table, entry):
+        return json.dumps({"table": table, "row": entry["row"], "enqueued_at": entry["enqueued_at"]},
+                          ensure_ascii=False) + "\n"
+
+    def _segment_path(self, number):
+        return self.spool_dir / f"writes-{os.getpid()}-{number}.jsonl"
+
+    def _own_segments(self):
+        return list(self.spool_dir.glob(f"writes-{os.getpid()}-*.jsonl"))
+
+    def _close_segment(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+
+    def _append_spool(self, table, entry):
+        """Nối một dòng vào segment hiện tại và fsync; chỉ giữ self._spool_lock."""
+        record = self._spool_record(table, entry).encode("utf-8")
+        with self._spool_lock:
+            if self._segment_file is None:
+                self._segment_file = open(self._segment_path(self._segment), "ab")
+            self._segment_file.write(record)
+            self._segment_file.flush()
+            if self.fsync:
+                os.fsync(self._segment_file.fileno())
+            self._spool_bytes += len(record)
+
+    def _maybe_compact_spool(self):
+        """Sau mỗi lần flush: hàng đợi rỗng -> xoá spool; spool quá lớn -> thu gọn."""
+        with self._spool_lock:
+            # Kiểm tra khi đang giữ _spool_lock: dòng nào vào _pending sau đó sẽ nối sau khi xoá
+            with self._lock:
+                empty = not self._pending
+            if empty:
+                self._close_segment()
+                for path in self._own_segments():
+                    path.unlink(missing_ok=True)
+                self._spool_bytes = 0
+                return
+            if self._spool_bytes < self.spool_compact_bytes:
+                return
+        self._compact_spool()
+
+    def _compact_spool(self, obsolete=None):
+        """Ghi các dòng còn chờ sang một segment mới rồi xoá `obsolete` (mặc định: segment cũ).
+
+        Chỉ gọi từ một thread (thread nền hoặc lúc khởi tạo). Lần nối sau chuyển
+        sang segment kế tiếp, nên việc ghi file thu gọn không chặn enqueue; dòng
+        vào trong lúc thu gọn có thể nằm ở cả hai file, replay chỉ giữ một bản.
+        """
+        with self._spool_lock:
+            if obsolete is None:
+                obsolete = self._own_segments()
+            self._close_segment()
+            compacted = self._segment_path(self._segment + 1)
+            self._segment += 2
+            self._spool_bytes = 0
+        with self._lock:
+            items = [(key[0], entry) for key, entry in self._pending.items()]
+
+        fd, tmp = tempfile.mkstemp(prefix=".spool-", dir=self.spool_dir)
+        with os.fdopen(fd, "wb") as f:
+            for table, entry in items:
+                f.write(self._spool_record(table, entry).encode("utf-8"))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, compacted)
+        for path in obsolete:
+            if path != compacted:
+                path.unlink(missing_ok=True)
+
+    def _replay_spool(self):
+        """Nhận lại spool của các process đã tắt (kể cả lần chạy trước của chính pid này).
+
+        Cùng một khoá có thể nằm trong nhiều file: giữ dòng có `saved_at` lớn nhất
+        (dòng không có saved_at: dòng đọc sau thắng) và `enqueued_at` sớm nhất, để
+        độ trễ vẫn tính từ lần lưu đầu tiên chưa ghi được.
+        """
+        adopted = []
+        now = time.time()
+        own = str(os.getpid())
+        for path in sorted(self.spool_dir.glob("writes-*.jsonl"), key=spool_order):
+            # writes-<pid>-<n>.jsonl (hoặc writes-<pid>.jsonl của bản cũ)
+            pid = path.stem.split("-")[1]
+            if pid != own and pid.isdigit() and process_alive(int(pid)):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                        table, row = item["table"], item["row"]
+                        key = (table, row[TABLE_KEYS[table]])
+                    except (ValueError, KeyError, TypeError):
+                        continue   # dòng ghi dở lúc process bị tắt
+                    entry = {"row": row, "enqueued_at": item.get("enqueued_at", now), "attempts": 0}
+                    previous = self._pending.get(key)
+                    if previous is not None:
+                        entry["enqueued_at"] = min(entry["enqueued_at"], previous["enqueued_at"])
+                        if self._saved_at(previous["row"]) > self._saved_at(row):
+                            entry["row"] = previous["row"]
+                    self._pending[key] = entry
+            adopted.append(path)
+
+        self._last_saved_at = max((self._saved_at(e["row"]) for e in self._pending.values()), default=0)
+        if self._pending:
+            logger.info("Nhận lại %d dòng chưa ghi từ %d file spool", len(self._pending), len(adopted))
+            self._compact_spool(adopted)
+            self._wakeup.set()
+        else:
+            for path in adopted:
+                path.unlink(missing_ok=True)
+
+    def _saved_at(self, row):
+        value = row.get(self.version_column) if self.version_column else None
+        return value if isinstance(value, int) else -1
+
+
+def spool_order(path):
+    """Thứ tự đọc spool: theo mtime, rồi theo số segment trong cùng process."""
+    parts = path.stem.split("-")
+    number = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else -1
+    return path.stat().st_mtime, number
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,4 @@
+"""Điểm vào WSGI cho production: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import app
+
+__all__ = ["app"]